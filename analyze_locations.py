@@ -1,93 +1,128 @@
-import csv
-import folium
-from geopy.distance import geodesic
+import argparse
 import statistics
+from collections import Counter
+import numpy as np
+from distance import nearest_km
+import instrumentation
+import warehouse_io
+from map_rendering import US_VIEW, add_markers, new_map, save_map
 
 AMAZON_FILE = "amazon_warehouses_filled.csv"
 WALMART_FILE = "walmart_warehouses.csv"
 OUTPUT_MAP = "warehouse_map.html"
 OVERLAP_RADIUS_KM = 20
 
-def load_warehouses(filename, source):
+def load_warehouses(filename, source, rejects=None):
     warehouses = []
-    with open(filename, 'r') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            try:
-                lat = float(row['Latitude'])
-                lon = float(row['Longitude'])
-                warehouses.append({
-                    'name': row['Name'],
-                    'lat': lat,
-                    'lon': lon,
-                    'city': row['City'],
-                    'state': row['State'],
-                    'source': source
-                })
-            except ValueError:
-                continue # Skip if lat/lon missing or invalid
+    # Rows with missing or invalid lat/lon are skipped and reported by warehouse_io
+    rows, _ = warehouse_io.load_records(filename, rejects=rejects)
+    for row in rows:
+        warehouses.append({
+            'name': row['Name'],
+            'lat': row['Latitude'],
+            'lon': row['Longitude'],
+            'city': row['City'],
+            'state': row['State'],
+            'source': source,
+            'Precision': row['Precision']
+        })
     return warehouses
 
+def build_map(amazon_wh, walmart_wh, density=False):
+    # Center map on US roughly
+    m = new_map(US_VIEW)
+
+    for items, name, color, radius in ((amazon_wh, "Amazon", "orange", 5), (walmart_wh, "Walmart", "blue", 7)):
+        lats = [wh['lat'] for wh in items]
+        lons = [wh['lon'] for wh in items]
+        if density:
+            # Hex-bin layers per zoom level instead of one marker per warehouse
+            from density import add_density_layers
+            add_density_layers(m, lats, lons, name, color)
+        else:
+            # Walmart markers slightly bigger to distinguish
+            columns = {'name': [wh['name'] for wh in items], 'city': [wh['city'] for wh in items],
+                       'state': [wh['state'] for wh in items]}
+            add_markers(m, lats, lons, columns, "{name}<br>{city}, {state}", color, radius=radius)
+    return m
+
+def render_map(output_map=OUTPUT_MAP, density=False):
+    # Map only, without the overlap analysis (see map_rendering.py)
+    m = build_map(load_warehouses(AMAZON_FILE, 'Amazon'), load_warehouses(WALMART_FILE, 'Walmart'), density)
+    save_map(m, output_map)
+    print(f"Map saved to {output_map}")
+
+def nearest_amazon_distances(walmart_wh, amazon_wh, road_network=None):
+    table = None
+    if road_network:
+        from road_network import load_road_network, build_distance_table
+        graph = load_road_network(road_network)
+        table = build_distance_table(graph, [a['lat'] for a in amazon_wh], [a['lon'] for a in amazon_wh])
+
+    amazon_lats = np.array([a['lat'] for a in amazon_wh])
+    amazon_lons = np.array([a['lon'] for a in amazon_wh])
+    distances = []
+    for w_wh in walmart_wh:
+        if table is not None:
+            # Table lookup; falls through to straight-line when off the road network
+            min_dist, _ = table.lookup(w_wh['lat'], w_wh['lon'])
+            if min_dist != float('inf'):
+                distances.append(min_dist)
+                continue
+
+        # Exact geodesic distance; haversine bounds rule out all but the closest few
+        _, min_dist = nearest_km(w_wh['lat'], w_wh['lon'], amazon_lats, amazon_lons)
+        distances.append(min_dist)
+    return distances
+
 def main():
-    amazon_wh = load_warehouses(AMAZON_FILE, 'Amazon')
-    walmart_wh = load_warehouses(WALMART_FILE, 'Walmart')
+    parser = argparse.ArgumentParser(description="US Amazon vs Walmart overlap analysis")
+    parser.add_argument("--road-network", help="Local road network file (.osm or edge-list .csv) for road distances")
+    parser.add_argument("--min-precision", choices=warehouse_io.PRECISION_LEVELS, default="city",
+                        help="Exclude warehouses geocoded more coarsely than this (default: keep all)")
+    parser.add_argument("--precision-weighting", action="store_true",
+                        help="Weight Walmart warehouses by geocoding precision in the overlap share")
+    parser.add_argument("--density", action="store_true", help="Draw hex-bin density layers instead of individual markers")
+    parser.add_argument("--rejects", metavar="FILE", help="Write every row rejected while loading to this CSV")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    with instrumentation.session("analyze_locations", args):
+        run(args)
+
+def run(args):
+    with instrumentation.timer("load"), warehouse_io.open_rejects(args.rejects) as rejects:
+        amazon_wh = load_warehouses(AMAZON_FILE, 'Amazon', rejects)
+        walmart_wh = load_warehouses(WALMART_FILE, 'Walmart', rejects)
     
-    print(f"Loaded {len(amazon_wh)} Amazon warehouses.")
-    print(f"Loaded {len(walmart_wh)} Walmart warehouses.")
+    for label, items in (("Amazon", amazon_wh), ("Walmart", walmart_wh)):
+        levels = Counter(wh['Precision'] for wh in items)
+        breakdown = ", ".join(f"{levels[p]} {p}" for p in warehouse_io.PRECISION_LEVELS if levels[p])
+        print(f"Loaded {len(items)} {label} warehouses ({breakdown}).")
+
+    if args.min_precision != "city":
+        amazon_wh = [wh for wh in amazon_wh if warehouse_io.meets_precision(wh, args.min_precision)]
+        walmart_wh = [wh for wh in walmart_wh if warehouse_io.meets_precision(wh, args.min_precision)]
+        print(f"Keeping {len(amazon_wh)} Amazon / {len(walmart_wh)} Walmart warehouses at {args.min_precision} precision or better.")
     
     # 1. Create Map
-    # Center map on US roughly
-    m = folium.Map(location=[39.8283, -98.5795], zoom_start=4)
-    
-    # Add Amazon markers
-    for wh in amazon_wh:
-        folium.CircleMarker(
-            location=[wh['lat'], wh['lon']],
-            radius=5,
-            popup=f"{wh['name']}<br>{wh['city']}, {wh['state']}",
-            color='orange',
-            fill=True,
-            fill_color='orange'
-        ).add_to(m)
-        
-    # Add Walmart markers
-    for wh in walmart_wh:
-        folium.CircleMarker(
-            location=[wh['lat'], wh['lon']],
-            radius=7, # Slightly bigger to distinguish
-            popup=f"{wh['name']}<br>{wh['city']}, {wh['state']}",
-            color='blue',
-            fill=True,
-            fill_color='blue'
-        ).add_to(m)
-        
-    m.save(OUTPUT_MAP)
+    with instrumentation.timer("map"):
+        m = build_map(amazon_wh, walmart_wh, density=args.density)
+        save_map(m, OUTPUT_MAP)
     print(f"Map saved to {OUTPUT_MAP}")
     
     # 2. Analysis
     print("\n--- Analysis ---")
-    print(f"Overlap Radius: {OVERLAP_RADIUS_KM} km")
+    print(f"Overlap Radius: {OVERLAP_RADIUS_KM} km ({'road' if args.road_network else 'straight-line'} distance)")
     
-    overlap_count = 0
-    distances = []
-    
-    for w_wh in walmart_wh:
-        w_loc = (w_wh['lat'], w_wh['lon'])
-        min_dist = float('inf')
-        nearest_amazon = None
-        
-        for a_wh in amazon_wh:
-            a_loc = (a_wh['lat'], a_wh['lon'])
-            dist = geodesic(w_loc, a_loc).km
-            if dist < min_dist:
-                min_dist = dist
-                nearest_amazon = a_wh
-        
-        distances.append(min_dist)
-        
-        if min_dist <= OVERLAP_RADIUS_KM:
-            overlap_count += 1
-            # print(f"  Overlap: {w_wh['name']} is {min_dist:.2f} km from {nearest_amazon['name']}")
+    with instrumentation.timer("overlap_scan"):
+        distances = nearest_amazon_distances(walmart_wh, amazon_wh, args.road_network)
+    overlap_count = sum(1 for d in distances if d <= OVERLAP_RADIUS_KM)
+    if args.precision_weighting:
+        # Share of total precision weight rather than of the raw count
+        weights = [warehouse_io.precision_weight(wh) for wh in walmart_wh]
+        overlap_weight = sum(w for w, d in zip(weights, distances) if d <= OVERLAP_RADIUS_KM)
+        print(f"Precision-weighted overlap: {overlap_weight / sum(weights) * 100:.1f}%")
             
     avg_dist = statistics.mean(distances)
     median_dist = statistics.median(distances)
@@ -1,39 +1,25 @@
 import csv
 import time
-import urllib.request
-import urllib.parse
-import json
 import os
+from geocoding import GeocodeCache, QUALITY_FIELDS, RATE_LIMIT_SECONDS, geocode, quality_columns
 
 INPUT_FILE = "amazon_warehouses_1.csv"
 OUTPUT_FILE = "amazon_warehouses_filled.csv"
 
-def get_coordinates(query):
-    url = f"https://nominatim.openstreetmap.org/search?q={urllib.parse.quote(query)}&format=json&limit=1"
-    headers = {'User-Agent': 'AntigravityAgent/1.0 (internal-project)'}
-    req = urllib.request.Request(url, headers=headers)
-    try:
-        with urllib.request.urlopen(req) as response:
-            data = json.loads(response.read().decode())
-            if data:
-                return data[0]['lat'], data[0]['lon']
-    except Exception as e:
-        print(f"Error fetching {query}: {e}")
-    return None, None
-
-def main():
-    if not os.path.exists(INPUT_FILE):
-        print(f"Error: {INPUT_FILE} not found.")
+def main(input_file=INPUT_FILE, output_file=OUTPUT_FILE):
+    if not os.path.exists(input_file):
+        print(f"Error: {input_file} not found.")
         return
 
     rows = []
-    with open(INPUT_FILE, 'r') as f:
+    with open(input_file, 'r') as f:
         reader = csv.DictReader(f)
         fieldnames = reader.fieldnames
         for row in reader:
             rows.append(row)
 
     # 1. Build Cache from existing data
+    # Coordinates that came with the source list are taken as building-level
     city_cache = {}
     for row in rows:
         city = row['City']
@@ -51,10 +37,14 @@ def main():
     print(f"Initial cache size: {len(city_cache)} cities.")
 
     # 2. Fill missing data
+    # Filled rows only get a city-level position; the Precision column says so
+    geocode_cache = GeocodeCache()
+    if not any(field in fieldnames for field in QUALITY_FIELDS):
+        fieldnames = fieldnames + QUALITY_FIELDS
     updated_rows = []
     total = len(rows)
     
-    with open(OUTPUT_FILE, 'w', newline='') as f:
+    with open(output_file, 'w', newline='') as f:
         writer = csv.DictWriter(f, fieldnames=fieldnames)
         writer.writeheader()
         
@@ -65,32 +55,38 @@ def main():
             lat = row['Latitude']
             lon = row['Longitude']
             
-            if not lat or not lon:
+            if lat and lon:
+                if not row.get('Precision'):
+                    row.update({'Precision': "address", 'Provider': "source", 'Confidence': ''})
+            else:
                 key = (city, state)
                 if key in city_cache:
-                    # Cache Hit
+                    # Cache Hit: another warehouse in the same city
                     row['Latitude'], row['Longitude'] = city_cache[key]
+                    row.update({'Precision': "city", 'Provider': "city_cache", 'Confidence': ''})
                     print(f"[{i+1}/{total}] {name}: Used cache for {city}, {state}")
                 else:
-                    # Cache Miss - Fetch from API
+                    # Cache Miss - persistent geocode cache, then the API
                     query = f"{city}, {state}"
-                    print(f"[{i+1}/{total}] {name}: Fetching '{query}'...")
-                    new_lat, new_lon = get_coordinates(query)
+                    print(f"[{i+1}/{total}] {name}: Looking up '{query}'...")
+                    result, fetched = geocode(query, "city", geocode_cache)
                     
-                    if new_lat and new_lon:
-                        row['Latitude'] = new_lat
-                        row['Longitude'] = new_lon
-                        city_cache[key] = (new_lat, new_lon)
-                        print(f"  -> Found: {new_lat}, {new_lon}")
+                    if result:
+                        row['Latitude'] = result['lat']
+                        row['Longitude'] = result['lon']
+                        city_cache[key] = (result['lat'], result['lon'])
+                        print(f"  -> Found: {result['lat']}, {result['lon']}")
                     else:
                         print(f"  -> Not found.")
+                    row.update(quality_columns(result))
                     
-                    time.sleep(1.1) # Rate limit
+                    if fetched:
+                        time.sleep(RATE_LIMIT_SECONDS) # Rate limit
             
             writer.writerow(row)
             updated_rows.append(row)
 
-    print(f"Done. Saved to {OUTPUT_FILE}")
+    print(f"Done. Saved to {output_file}")
 
 if __name__ == "__main__":
     main()
@@ -1,7 +1,15 @@
 import csv
 import glob
 import os
-from geopy.distance import geodesic
+import sys
+import numpy as np
+
+# Shared modules (distance.py) live in the project root
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from distance import within_km
 
 GLOBAL_DATA_DIR = "global_data"
 US_FILE = "amazon_warehouses_filled.csv"
@@ -58,23 +66,21 @@ def load_warehouses():
 def filter_warehouses(warehouses):
     kept = []
     skipped_count = 0
+    # Coordinates of the kept warehouses, filled in order
+    kept_lats = np.empty(len(warehouses))
+    kept_lons = np.empty(len(warehouses))
     
     print(f"Total warehouses before filtering: {len(warehouses)}")
     
     for i, wh in enumerate(warehouses):
-        wh_loc = (wh['Latitude'], wh['Longitude'])
-        is_too_close = False
-        
-        for kept_wh in kept:
-            kept_loc = (kept_wh['Latitude'], kept_wh['Longitude'])
-            distance = geodesic(wh_loc, kept_loc).km
-            
-            if distance <= FILTER_RADIUS_KM:
-                is_too_close = True
-                # print(f"Skipping {wh['Name']} (too close to {kept_wh['Name']}, {distance:.2f}km)")
-                break
+        # Exact geodesic test; only pairs close to the radius need the slow exact distance
+        n = len(kept)
+        is_too_close = n > 0 and within_km(wh['Latitude'], wh['Longitude'], kept_lats[:n], kept_lons[:n],
+                                           FILTER_RADIUS_KM).any()
         
         if not is_too_close:
+            kept_lats[n] = wh['Latitude']
+            kept_lons[n] = wh['Longitude']
             kept.append(wh)
         else:
             skipped_count += 1
@@ -83,13 +89,13 @@ def filter_warehouses(warehouses):
     print(f"Remaining warehouses: {len(kept)}")
     return kept
 
-def save_filtered(warehouses):
-    with open(OUTPUT_FILE, 'w', newline='') as f:
+def save_filtered(warehouses, output_file=OUTPUT_FILE):
+    with open(output_file, 'w', newline='') as f:
         fieldnames = ['Name', 'Latitude', 'Longitude', 'City', 'State', 'Country', 'Region']
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction='ignore')
         writer.writeheader()
         writer.writerows(warehouses)
-    print(f"Saved filtered list to {OUTPUT_FILE}")
+    print(f"Saved filtered list to {output_file}")
 
 def main():
     all_wh = load_warehouses()
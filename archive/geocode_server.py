@@ -0,0 +1,245 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from geocoding import CACHE_FILE, CITY_TYPES
+
+# Local stand-in for the geocoding providers, for offline runs and load tests.
+# Answers Nominatim (/search, json and jsonv2), ArcGIS findAddressCandidates
+# and Open-Meteo (/v1/search) requests in each provider's response format
+# from a fixture file of query -> place. Latency, HTTP 429 rate limiting and
+# HTTP 500 errors can be injected. Every random decision is derived from a
+# hash of (seed, query, attempt number) rather than a shared RNG, so a run
+# sees the same latencies and failures whatever the thread interleaving.
+#
+#   python3 archive/geocode_server.py --port 8765 --latency-ms 50 --error-rate 0.05
+#   NOMINATIM_URL=http://127.0.0.1:8765 GEOCODE_RATE_LIMIT=0 python3 archive/geocode_walmart.py
+
+FIXTURE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "geocode_fixture.json")
+DEFAULT_PORT = 8765
+ARCGIS_PATH = "/arcgis/rest/services/World/GeocodeServer/findAddressCandidates"
+
+# Precision stored in the geocode cache -> Nominatim addresstype
+ADDRESS_TYPES = {"address": "building", "postcode": "postcode", "city": "city"}
+
+def normalize_query(query):
+    return re.sub(r"\s+", " ", query).strip().lower()
+
+def load_fixture(filename):
+    # {query: place or None}; a None entry is a known miss
+    with open(filename, 'r') as f:
+        places = json.load(f)
+    return {normalize_query(q): place for q, place in places.items()}
+
+def fixture_from_cache(cache_file=CACHE_FILE):
+    # Replays recorded lookups: every query the real providers answered (or missed)
+    places = {}
+    with open(cache_file, 'r') as f:
+        for line in f:
+            entry = json.loads(line)
+            result = entry['result']
+            if result is None:
+                places[normalize_query(entry['query'])] = None
+                continue
+            places[normalize_query(entry['query'])] = {
+                'lat': float(result['lat']), 'lon': float(result['lon']),
+                'addresstype': ADDRESS_TYPES.get(result.get('precision'), "building"),
+                'importance': result.get('confidence', 0.5),
+                'display_name': entry['query'],
+            }
+    return places
+
+def _fraction(seed, *parts):
+    # Deterministic value in [0, 1) for this combination of inputs
+    h = hashlib.sha256(repr((seed,) + parts).encode()).digest()
+    return int.from_bytes(h[:8], 'big') / 2.0 ** 64
+
+def synthetic_place(query, seed):
+    # Stable made-up coordinate for queries missing from the fixture
+    return {'lat': round(-60.0 + 130.0 * _fraction(seed, "lat", query), 6),
+            'lon': round(-180.0 + 360.0 * _fraction(seed, "lon", query), 6),
+            'addresstype': "city", 'importance': 0.3, 'display_name': query}
+
+class StandIn:
+    def __init__(self, places, latency_ms=0.0, jitter_ms=0.0, rate_limit=0.0, burst=1,
+                 error_rate=0.0, unknown="empty", seed=0):
+        self.places = places
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rate_limit = rate_limit  # Requests per second over all clients; 0 = unlimited
+        self.burst = max(1, burst)
+        self.error_rate = error_rate
+        self.unknown = unknown        # "empty" (no match) or "synthetic"
+        self.seed = seed
+        self.lock = threading.Lock()
+        self.attempts = {}            # (provider, query) -> requests seen
+        self.tokens = float(self.burst)
+        self.refilled = time.monotonic()
+        self.stats = {'requests': 0, 'found': 0, 'not_found': 0, 'rate_limited': 0, 'errors': 0}
+
+    def _take_token(self):
+        # Token bucket; returns seconds until a token is available (0 if one was taken)
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.refilled) * self.rate_limit)
+        self.refilled = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return 0.0
+        return (1.0 - self.tokens) / self.rate_limit
+
+    def plan(self, provider, query):
+        # (status, delay seconds, retry_after) for one request
+        key = normalize_query(query)
+        with self.lock:
+            self.stats['requests'] += 1
+            attempt = self.attempts.get((provider, key), 0)
+            self.attempts[(provider, key)] = attempt + 1
+            wait = self._take_token() if self.rate_limit > 0 else 0.0
+            if wait > 0:
+                self.stats['rate_limited'] += 1
+                return 429, 0.0, max(1, int(wait + 0.999))
+            failed = _fraction(self.seed, "error", provider, key, attempt) < self.error_rate
+            if failed:
+                self.stats['errors'] += 1
+        delay = (self.latency_ms + self.jitter_ms * _fraction(self.seed, "latency", provider, key, attempt)) / 1000.0
+        return (500 if failed else 200), delay, None
+
+    def find(self, query):
+        key = normalize_query(query)
+        place = self.places.get(key)
+        if place is None and key not in self.places and self.unknown == "synthetic":
+            place = synthetic_place(key, self.seed)
+        with self.lock:
+            self.stats['found' if place else 'not_found'] += 1
+        return place
+
+def nominatim_response(place, params):
+    if not place:
+        return []
+    kind = place.get('addresstype', "building")
+    hit = {'lat': str(place['lat']), 'lon': str(place['lon']), 'display_name': place.get('display_name', ''),
+           'type': kind, 'importance': place.get('importance', 0.5)}
+    if params.get('format') == "jsonv2":
+        hit['addresstype'] = kind
+        hit['category'] = "place" if kind in CITY_TYPES else "building"
+    else:
+        hit['class'] = "place" if kind in CITY_TYPES else "building"
+    return [hit]
+
+def arcgis_response(place):
+    candidates = []
+    if place:
+        candidates.append({'address': place.get('display_name', ''),
+                           'location': {'x': place['lon'], 'y': place['lat']},
+                           'score': round(100.0 * place.get('importance', 0.5), 2), 'attributes': {}})
+    return {'spatialReference': {'wkid': 4326, 'latestWkid': 4326}, 'candidates': candidates}
+
+def open_meteo_response(place, query):
+    # Open-Meteo leaves out "results" entirely when nothing matches
+    if not place:
+        return {'generationtime_ms': 0.1}
+    return {'results': [{'id': int(_fraction(0, "id", normalize_query(query)) * 1e7),
+                         'name': place.get('display_name', query).split(',')[0],
+                         'latitude': place['lat'], 'longitude': place['lon']}],
+            'generationtime_ms': 0.1}
+
+def make_handler(stand_in):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send(self, status, body, retry_after=None):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', "application/json; charset=utf-8")
+            self.send_header('Content-Length', str(len(data)))
+            if retry_after is not None:
+                self.send_header('Retry-After', str(retry_after))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            url = urllib.parse.urlsplit(self.path)
+            params = {k: v[0] for k, v in urllib.parse.parse_qs(url.query).items()}
+            if url.path == "/stats":
+                with stand_in.lock:
+                    self._send(200, dict(stand_in.stats))
+                return
+            if url.path == "/search":
+                provider, query = "nominatim", params.get('q', '')
+            elif url.path == ARCGIS_PATH:
+                provider, query = "arcgis", params.get('SingleLine', '')
+            elif url.path == "/v1/search":
+                provider, query = "open_meteo", params.get('name', '')
+            else:
+                self._send(404, {'error': f"unknown endpoint {url.path}"})
+                return
+
+            status, delay, retry_after = stand_in.plan(provider, query)
+            if status == 429:
+                self._send(429, {'error': "Too Many Requests"}, retry_after)
+                return
+            if delay > 0:
+                time.sleep(delay)
+            if status != 200:
+                self._send(status, {'error': "Injected failure"})
+                return
+            place = stand_in.find(query)
+            if provider == "nominatim":
+                self._send(200, nominatim_response(place, params))
+            elif provider == "arcgis":
+                self._send(200, arcgis_response(place))
+            else:
+                self._send(200, open_meteo_response(place, query))
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+def start_server(stand_in, host="127.0.0.1", port=0):
+    # Serves in a background thread; port 0 picks a free port (see server.server_address)
+    server = ThreadingHTTPServer((host, port), make_handler(stand_in))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Nominatim, ArcGIS and Open-Meteo geocoders")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--fixture", default=FIXTURE_FILE, help="JSON file of query -> place (null = known miss)")
+    parser.add_argument("--from-cache", nargs="?", const=CACHE_FILE, metavar="CACHE",
+                        help="Answer from a recorded geocode cache instead of the fixture")
+    parser.add_argument("--unknown", choices=["empty", "synthetic"], default="empty",
+                        help="Reply to queries missing from the fixture with no match or a stable made-up place")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Fixed delay per answered request")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Extra delay, uniform in [0, jitter)")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="Requests per second before HTTP 429 (0 = off)")
+    parser.add_argument("--burst", type=int, default=1, help="Requests allowed back to back under --rate-limit")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with HTTP 500")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    places = fixture_from_cache(args.from_cache) if args.from_cache else load_fixture(args.fixture)
+    stand_in = StandIn(places, args.latency_ms, args.jitter_ms, args.rate_limit, args.burst,
+                       args.error_rate, args.unknown, args.seed)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(stand_in))
+    server.daemon_threads = True
+    base = f"http://{args.host}:{server.server_address[1]}"
+    print(f"Serving {len(places)} places on {base} (stats at {base}/stats)")
+    print(f"  NOMINATIM_URL={base} ARCGIS_URL={base} OPEN_METEO_URL={base} GEOCODE_RATE_LIMIT=0")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(stand_in.stats))
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,12 @@
 import csv
 import time
-import urllib.request
-import urllib.parse
-import json
 import os
 import re
+from geocoding import GeocodeCache, QUALITY_FIELDS, RATE_LIMIT_SECONDS, geocode, quality_columns
 
 INPUT_FILE = "walmart_warehouses.txt"
 OUTPUT_FILE = "walmart_warehouses.csv"
 
-def get_coordinates(query):
-    url = f"https://nominatim.openstreetmap.org/search?q={urllib.parse.quote(query)}&format=json&limit=1"
-    headers = {'User-Agent': 'AntigravityAgent/1.0 (internal-project)'}
-    req = urllib.request.Request(url, headers=headers)
-    try:
-        with urllib.request.urlopen(req) as response:
-            data = json.loads(response.read().decode())
-            if data:
-                return data[0]['lat'], data[0]['lon']
-    except Exception as e:
-        print(f"Error fetching {query}: {e}")
-    return None, None
-
 def parse_walmart_data(filename):
     warehouses = []
     with open(filename, 'r') as f:
@@ -93,14 +78,14 @@ def parse_walmart_data(filename):
         })
     return warehouses
 
-def main():
-    warehouses = parse_walmart_data(INPUT_FILE)
+def main(input_file=INPUT_FILE, output_file=OUTPUT_FILE):
+    warehouses = parse_walmart_data(input_file)
     
-    # City cache for fallback
-    city_cache = {}
+    # Persistent cache: every query (including the city fallback) is fetched at most once
+    cache = GeocodeCache()
     
-    with open(OUTPUT_FILE, 'w', newline='') as f:
-        fieldnames = ['Name', 'Latitude', 'Longitude', 'City', 'State', 'Code', 'Address', 'Zip']
+    with open(output_file, 'w', newline='') as f:
+        fieldnames = ['Name', 'Latitude', 'Longitude', 'City', 'State', 'Code', 'Address', 'Zip'] + QUALITY_FIELDS
         writer = csv.DictWriter(f, fieldnames=fieldnames)
         writer.writeheader()
         
@@ -108,69 +93,53 @@ def main():
         for i, w in enumerate(warehouses):
             print(f"Processing {i+1}/{total}: {w['Name']}")
             
-            lat, lon = None, None
-            
             # Strategy 1: Full Address
             query = f"{w['Address']}, {w['City']}, {w['State']} {w['Zip']}".strip()
             # Clean up double spaces or commas
             query = re.sub(r'\s+', ' ', query).strip(', ')
             
             print(f"  Query 1: {query}")
-            lat, lon = get_coordinates(query)
+            result, fetched = geocode(query, "address", cache)
+            if fetched:
+                time.sleep(RATE_LIMIT_SECONDS)
             
             # Strategy 2: Address + City + State (No Zip)
-            if not lat and w['Zip']:
+            if not result and w['Zip']:
                 query = f"{w['Address']}, {w['City']}, {w['State']}".strip()
                 print(f"  Query 2: {query}")
-                lat, lon = get_coordinates(query)
-                time.sleep(1.1)
+                result, fetched = geocode(query, "address", cache)
+                if fetched:
+                    time.sleep(RATE_LIMIT_SECONDS)
 
-            # Strategy 3: City + State (Cacheable)
-            if not lat:
-                # Check cache
-                key = (w['City'], w['State'])
-                if key in city_cache:
-                    lat, lon = city_cache[key]
-                    print(f"  Used cache for {w['City']}, {w['State']}")
+            # Strategy 3: City + State (city centroid)
+            if not result:
+                if not w['City'] or not w['State']:
+                    # Fallback for messy lines: Try extracting from address if possible or just skip
+                    pass
                 else:
                     query = f"{w['City']}, {w['State']}"
-                    if not w['City'] or not w['State']:
-                         # Fallback for messy lines: Try extracting from address if possible or just skip
-                         pass
-                    else:
-                        print(f"  Query 3: {query}")
-                        lat, lon = get_coordinates(query)
-                        if lat:
-                            city_cache[key] = (lat, lon)
-                        time.sleep(1.1)
+                    print(f"  Query 3: {query}")
+                    result, fetched = geocode(query, "city", cache)
+                    if fetched:
+                        time.sleep(RATE_LIMIT_SECONDS)
             
-            if lat:
-                print(f"  -> Found: {lat}, {lon}")
-                writer.writerow({
-                    'Name': w['Name'],
-                    'Latitude': lat,
-                    'Longitude': lon,
-                    'City': w['City'],
-                    'State': w['State'],
-                    'Code': w['Code'],
-                    'Address': w['Address'],
-                    'Zip': w['Zip']
-                })
+            row = {
+                'Name': w['Name'],
+                'Latitude': result['lat'] if result else '',
+                'Longitude': result['lon'] if result else '',
+                'City': w['City'],
+                'State': w['State'],
+                'Code': w['Code'],
+                'Address': w['Address'],
+                'Zip': w['Zip']
+            }
+            row.update(quality_columns(result))
+            if result:
+                print(f"  -> Found: {result['lat']}, {result['lon']} ({result['precision']})")
             else:
                 print(f"  -> Not found.")
-                writer.writerow({
-                    'Name': w['Name'],
-                    'Latitude': '',
-                    'Longitude': '',
-                    'City': w['City'],
-                    'State': w['State'],
-                    'Code': w['Code'],
-                    'Address': w['Address'],
-                    'Zip': w['Zip']
-                })
-            
+            writer.writerow(row)
             f.flush()
-            time.sleep(1.1)
 
 if __name__ == "__main__":
     main()
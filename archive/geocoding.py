@@ -0,0 +1,108 @@
+import json
+import os
+import time
+import urllib.error
+import urllib.request
+import urllib.parse
+
+# Shared Nominatim lookup for the geocoding scripts.
+# Every result carries its quality: the precision actually achieved
+# (address / postcode / city), the provider that produced it and the
+# provider's confidence. Lookups, including misses, are kept in a persistent
+# cache so reruns and the city-level fallbacks never hit the network twice.
+# The provider base URLs and the rate limit can be overridden from the
+# environment, e.g. to point everything at geocode_server.py, the local
+# stand-in used for offline runs and load tests.
+
+CACHE_FILE = os.path.join(".cache", "geocode_cache.jsonl")
+USER_AGENT = 'AntigravityAgent/1.0 (internal-project)'
+RATE_LIMIT_SECONDS = float(os.environ.get("GEOCODE_RATE_LIMIT", "1.1"))
+MAX_RETRIES = 3           # Attempts after an HTTP 429 before giving up on a query
+MAX_RETRY_SECONDS = 60.0  # Cap on a provider's Retry-After
+
+NOMINATIM_URL = os.environ.get("NOMINATIM_URL", "https://nominatim.openstreetmap.org").rstrip("/")
+ARCGIS_URL = os.environ.get("ARCGIS_URL", "https://geocode.arcgis.com").rstrip("/")
+OPEN_METEO_URL = os.environ.get("OPEN_METEO_URL", "https://geocoding-api.open-meteo.com").rstrip("/")
+
+# Best to worst; output CSVs store these in the Precision column
+PRECISION_LEVELS = ["address", "postcode", "city"]
+QUALITY_FIELDS = ["Precision", "Provider", "Confidence"]
+
+# Nominatim addresstype values that mean the match is an area, not a building
+CITY_TYPES = {"city", "town", "village", "hamlet", "municipality", "suburb", "quarter", "neighbourhood",
+              "county", "state", "region", "province", "country", "district", "city_district"}
+POSTCODE_TYPES = {"postcode"}
+
+def coarser(a, b):
+    return a if PRECISION_LEVELS.index(a) >= PRECISION_LEVELS.index(b) else b
+
+class GeocodeCache:
+    def __init__(self, filename=CACHE_FILE):
+        self.filename = filename
+        self.entries = {}
+        if os.path.exists(filename):
+            with open(filename, 'r') as f:
+                for line in f:
+                    entry = json.loads(line)
+                    self.entries[entry['query']] = entry['result']
+
+    def __contains__(self, query):
+        return query in self.entries
+
+    def get(self, query):
+        return self.entries.get(query)
+
+    def put(self, query, result):
+        self.entries[query] = result
+        os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+        with open(self.filename, 'a') as f:
+            f.write(json.dumps({'query': query, 'result': result}) + "\n")
+
+def fetch_json(url, retries=MAX_RETRIES):
+    # HTTP 429 is retried after the provider's Retry-After; other errors are raised
+    for attempt in range(retries + 1):
+        req = urllib.request.Request(url, headers={'User-Agent': USER_AGENT})
+        try:
+            with urllib.request.urlopen(req) as response:
+                return json.loads(response.read().decode())
+        except urllib.error.HTTPError as e:
+            if e.code != 429 or attempt == retries:
+                raise
+            retry_after = e.headers.get('Retry-After', '')
+            wait = float(retry_after) if retry_after.replace('.', '', 1).isdigit() else RATE_LIMIT_SECONDS * 2 ** attempt
+            time.sleep(min(wait, MAX_RETRY_SECONDS))
+
+def nominatim_search(query, level):
+    # Returns a result dict or None; the precision is never better than what was asked for
+    url = f"{NOMINATIM_URL}/search?q={urllib.parse.quote(query)}&format=jsonv2&limit=1"
+    data = fetch_json(url)
+    if not data:
+        return None
+    hit = data[0]
+    kind = hit.get('addresstype') or hit.get('type', '')
+    found = "city" if kind in CITY_TYPES else "postcode" if kind in POSTCODE_TYPES else "address"
+    return {
+        'lat': hit['lat'],
+        'lon': hit['lon'],
+        'precision': coarser(level, found),
+        'provider': "nominatim",
+        'confidence': round(float(hit.get('importance') or 0.0), 3)
+    }
+
+def geocode(query, level, cache):
+    # (result or None, fetched) -- fetched tells the caller to respect the rate limit
+    if query in cache:
+        return cache.get(query), False
+    try:
+        result = nominatim_search(query, level)
+    except Exception as e:
+        # Network errors are not cached so the next run retries
+        print(f"Error fetching {query}: {e}")
+        return None, True
+    cache.put(query, result)
+    return result, True
+
+def quality_columns(result):
+    if not result:
+        return {'Precision': '', 'Provider': '', 'Confidence': ''}
+    return {'Precision': result['precision'], 'Provider': result['provider'], 'Confidence': result['confidence']}
@@ -1,90 +1,44 @@
-import csv
-import folium
+import argparse
 import os
 import glob
+import sys
+
+# Shared modules (map_rendering.py, density.py) live in the project root
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from map_rendering import WORLD_VIEW, add_markers, load_points, new_map, region_color, save_map
 
 INPUT_DIR = "global_data"
+US_FILE = "amazon_warehouses_filled.csv"
 OUTPUT_MAP = "amazon_global_map.html"
 
-def main():
-    # Create map centered on Europe/Africa view to start, zoom out
-    m = folium.Map(location=[20, 0], zoom_start=2)
-    
-    # Colors for different regions/groups
-    colors = {
-        "canada": "red",
-        "mexico": "green",
-        "europe": "blue",
-        "china": "purple",
-        "japan": "orange",
-        "india": "darkred",
-        "australia": "darkblue",
-        "brazil": "darkgreen",
-        "egypt": "black",
-        "saudi_arabia": "gray",
-        "united_arab_emirates": "gray",
-        "singapore": "pink",
-        "pakistan": "lightgreen"
-    }
-    
-    csv_files = glob.glob(os.path.join(INPUT_DIR, "*.csv"))
-    
-    for filename in csv_files:
+def main(output_map=OUTPUT_MAP, density=False):
+    # Centered on Europe/Africa, zoomed out
+    m = new_map(WORLD_VIEW)
+
+    groups = []  # (group, file, popup)
+    for filename in sorted(glob.glob(os.path.join(INPUT_DIR, "*.csv"))):
         group_name = os.path.basename(filename).replace("amazon_", "").replace(".csv", "")
-        color = colors.get(group_name, "cadetblue")
-        
+        groups.append((group_name, filename, "<b>{Name}</b><br>{City}, {Country}"))
+    if os.path.exists(US_FILE):
+        groups.append(("usa", US_FILE, "<b>{Name}</b><br>{City}, {State}, USA"))
+
+    for group_name, filename, popup in groups:
+        color = region_color(group_name)
         print(f"Adding {group_name} ({color})...")
-        
-        with open(filename, 'r') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                try:
-                    lat = float(row['Latitude'])
-                    lon = float(row['Longitude'])
-                    name = row['Name']
-                    city = row['City']
-                    country = row['Country']
-                    
-                    folium.CircleMarker(
-                        location=[lat, lon],
-                        radius=5,
-                        popup=f"<b>{name}</b><br>{city}, {country}",
-                        color=color,
-                        fill=True,
-                        fill_color=color,
-                        fill_opacity=0.7
-                    ).add_to(m)
-                except ValueError:
-                    continue
-                    
-    # Add US Amazon Warehouses
-    us_file = "amazon_warehouses_filled.csv"
-    if os.path.exists(us_file):
-        print(f"Adding United States (orange)...")
-        with open(us_file, 'r') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                try:
-                    lat = float(row['Latitude'])
-                    lon = float(row['Longitude'])
-                    name = row['Name']
-                    city = row['City']
-                    state = row['State']
-                    
-                    folium.CircleMarker(
-                        location=[lat, lon],
-                        radius=5,
-                        popup=f"<b>{name}</b><br>{city}, {state}, USA",
-                        color="orange",
-                        fill=True,
-                        fill_color="orange",
-                        fill_opacity=0.7
-                    ).add_to(m)
-                except ValueError:
-                    continue
+        lats, lons, columns = load_points(filename, ['Name', 'City', 'Country', 'State'])
+        if density:
+            from density import add_density_layers
+            add_density_layers(m, lats, lons, group_name, color)
+        else:
+            add_markers(m, lats, lons, columns, popup, color, fill_opacity=0.7)
 
-    m.save(OUTPUT_MAP)
-    print(f"Map saved to {OUTPUT_MAP}")
+    save_map(m, output_map)
+    print(f"Map saved to {output_map}")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Map all global Amazon warehouses")
+    parser.add_argument("--density", action="store_true", help="Draw hex-bin density layers instead of individual markers")
+    main(density=parser.parse_args().density)
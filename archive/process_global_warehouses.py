@@ -1,10 +1,8 @@
 import csv
 import re
 import time
-import urllib.request
-import urllib.parse
-import json
 import os
+from geocoding import GeocodeCache, QUALITY_FIELDS, RATE_LIMIT_SECONDS, geocode, quality_columns
 
 INPUT_FILE = "amazon_global_raw.txt"
 OUTPUT_DIR = "global_data"
@@ -25,19 +23,6 @@ EUROPE_COUNTRIES = [
 # So "England" is a sub-header of UK.
 # But UK is in Europe. So it goes to Europe CSV.
 
-def get_coordinates(query):
-    url = f"https://nominatim.openstreetmap.org/search?q={urllib.parse.quote(query)}&format=json&limit=1"
-    headers = {'User-Agent': 'AntigravityAgent/1.0 (internal-project)'}
-    req = urllib.request.Request(url, headers=headers)
-    try:
-        with urllib.request.urlopen(req) as response:
-            data = json.loads(response.read().decode())
-            if data:
-                return data[0]['lat'], data[0]['lon']
-    except Exception as e:
-        print(f"Error fetching {query}: {e}")
-    return None, None
-
 def parse_global_data(filename):
     with open(filename, 'r') as f:
         lines = f.readlines()
@@ -275,45 +260,45 @@ def process_and_save(data):
     if not os.path.exists(OUTPUT_DIR):
         os.makedirs(OUTPUT_DIR)
         
-    # Cache
-    cache = {}
+    # Persistent cache; queries are city-level ("City, State, Country")
+    cache = GeocodeCache()
     
     for group, items in data.items():
         filename = f"{OUTPUT_DIR}/amazon_{group.lower().replace(' ', '_')}.csv"
         print(f"Processing group: {group} ({len(items)} locations) -> {filename}")
         
         with open(filename, 'w', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=["Name", "Latitude", "Longitude", "City", "State", "Country", "Code"])
+            writer = csv.DictWriter(f, fieldnames=["Name", "Latitude", "Longitude", "City", "State", "Country", "Code"] + QUALITY_FIELDS)
             writer.writeheader()
             
             for item in items:
                 query = item['Query']
                 
-                # Check cache
-                if query in cache:
-                    lat, lon = cache[query]
-                    print(f"  [Cache] {item['Name']}: {lat}, {lon}")
+                print(f"  {item['Name']} ({query})...")
+                result, fetched = geocode(query, "city", cache)
+                if fetched:
+                    time.sleep(RATE_LIMIT_SECONDS)
+                if result:
+                    print(f"    -> Found: {result['lat']}, {result['lon']}")
                 else:
-                    print(f"  Fetching {item['Name']} ({query})...")
-                    lat, lon = get_coordinates(query)
-                    time.sleep(1.1)
-                    if lat:
-                        cache[query] = (lat, lon)
-                        print(f"    -> Found: {lat}, {lon}")
-                    else:
-                        print(f"    -> Not found")
+                    print(f"    -> Not found")
                 
-                writer.writerow({
+                row = {
                     "Name": item['Name'],
-                    "Latitude": lat if lat else "",
-                    "Longitude": lon if lon else "",
+                    "Latitude": result['lat'] if result else "",
+                    "Longitude": result['lon'] if result else "",
                     "City": item['City'],
                     "State": item['State'],
                     "Country": item['Country'],
                     "Code": item['Code']
-                })
+                }
+                row.update(quality_columns(result))
+                writer.writerow(row)
                 f.flush()
 
-if __name__ == "__main__":
-    data = parse_global_data(INPUT_FILE)
+def main(input_file=INPUT_FILE):
+    data = parse_global_data(input_file)
     process_and_save(data)
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,11 @@
 import urllib.request
 import urllib.parse
 import json
+from geocoding import ARCGIS_URL
 
 def test_arcgis(query):
     # ArcGIS REST API
-    url = f"https://geocode.arcgis.com/arcgis/rest/services/World/GeocodeServer/findAddressCandidates?SingleLine={urllib.parse.quote(query)}&f=json&maxLocations=1"
+    url = f"{ARCGIS_URL}/arcgis/rest/services/World/GeocodeServer/findAddressCandidates?SingleLine={urllib.parse.quote(query)}&f=json&maxLocations=1"
     print(f"Testing: {query}")
     try:
         with urllib.request.urlopen(url) as response:
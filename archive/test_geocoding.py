@@ -1,10 +1,11 @@
 import urllib.request
 import urllib.parse
 import json
+from geocoding import NOMINATIM_URL
 
 def test_geocoding():
     query = "Amazon BHM1 Bessemer Alabama"
-    url = f"https://nominatim.openstreetmap.org/search?q={urllib.parse.quote(query)}&format=json"
+    url = f"{NOMINATIM_URL}/search?q={urllib.parse.quote(query)}&format=json"
     headers = {'User-Agent': 'AntigravityAgent/1.0 (internal-test)'}
     
     req = urllib.request.Request(url, headers=headers)
@@ -1,9 +1,10 @@
 import urllib.request
 import urllib.parse
 import json
+from geocoding import OPEN_METEO_URL
 
 def test_open_meteo(query):
-    url = f"https://geocoding-api.open-meteo.com/v1/search?name={urllib.parse.quote(query)}&count=1&format=json"
+    url = f"{OPEN_METEO_URL}/v1/search?name={urllib.parse.quote(query)}&count=1&format=json"
     print(f"Testing: {query}")
     try:
         with urllib.request.urlopen(url) as response:
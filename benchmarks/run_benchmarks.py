@@ -0,0 +1,340 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "archive"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic import generate_warehouses
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+
+SIZES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+DEFAULT_SIZES = ["1k", "10k"]
+
+# A benchmark regresses when it is this many times slower than its baseline,
+# and by more than REGRESSION_FLOOR_SECONDS (millisecond timings are mostly noise)
+REGRESSION_TOLERANCE = 1.5
+REGRESSION_FLOOR_SECONDS = 0.005
+CONFIRM_RUNS = 2  # A suspected regression is re-timed this many times before it is reported
+
+# Timing: one untimed warm-up call (imports, caches, allocator), then at least `repeat`
+# timed calls and MIN_TIMED_SECONDS of them in total; the best call is reported.
+# A warm-up slower than LONG_RUN_SECONDS is dominated by the work itself and counts as a call.
+MIN_TIMED_SECONDS = 1.0
+LONG_RUN_SECONDS = 2.0
+MAX_CALLS = 100
+
+# Registry: name -> (setup(warehouses) -> callable or (callable, cleanup), largest size it is run at,
+# repeats). Quadratic benchmarks are capped so a 1M run stays feasible.
+BENCHMARKS = {}
+
+def benchmark(name, max_n, repeat=3):
+    def register(setup):
+        BENCHMARKS[name] = (setup, max_n, repeat)
+        return setup
+    return register
+
+def _coords(warehouses):
+    return [(w['Latitude'], w['Longitude']) for w in warehouses]
+
+def _cold(func):
+    # Every timed call recomputes the pairwise distances instead of reusing the process memo
+    from pairwise import clear_memo
+    def call():
+        clear_memo()
+        return func()
+    return call
+
+@benchmark("kmeans_fit", max_n=100_000)
+def bench_kmeans_fit(warehouses):
+    from select_strategic_locations import SimpleKMeans
+    data = _coords(warehouses)
+    return lambda: SimpleKMeans(7, random_state=0).fit(data)
+
+@benchmark("kmeans_fit_spherical", max_n=1_000_000)
+def bench_kmeans_fit_spherical(warehouses):
+    from select_strategic_locations import SimpleKMeans
+    data = _coords(warehouses)
+    return lambda: SimpleKMeans(7, metric="spherical", random_state=0).fit(data)
+
+@benchmark("kmeans_fit_weighted", max_n=100_000)
+def bench_kmeans_fit_weighted(warehouses):
+    from select_strategic_locations import SimpleKMeans
+    data = _coords(warehouses)
+    weights = [1.0 + (i % 10) for i in range(len(data))]
+    return lambda: SimpleKMeans(7, random_state=0).fit(data, weights)
+
+@benchmark("silhouette", max_n=1_000, repeat=1)
+def bench_silhouette(warehouses):
+    from select_strategic_locations import SimpleKMeans, calculate_silhouette_score
+    data = _coords(warehouses)
+    kmeans = SimpleKMeans(7, random_state=0)
+    kmeans.fit(data)
+    return _cold(lambda: calculate_silhouette_score(data, kmeans.clusters, kmeans.centroids))
+
+@benchmark("silhouette_spherical", max_n=1_000)
+def bench_silhouette_spherical(warehouses):
+    from select_strategic_locations import SimpleKMeans, calculate_silhouette_score
+    data = _coords(warehouses)
+    kmeans = SimpleKMeans(7, metric="spherical", random_state=0)
+    kmeans.fit(data)
+    return _cold(lambda: calculate_silhouette_score(data, kmeans.clusters, kmeans.centroids, metric="spherical"))
+
+@benchmark("silhouette_weighted", max_n=1_000)
+def bench_silhouette_weighted(warehouses):
+    from select_strategic_locations import SimpleKMeans, calculate_silhouette_score
+    data = _coords(warehouses)
+    weights = [1.0 + (i % 10) for i in range(len(data))]
+    kmeans = SimpleKMeans(7, random_state=0)
+    kmeans.fit(data, weights)
+    return _cold(lambda: calculate_silhouette_score(data, kmeans.clusters, kmeans.centroids, sample_weight=weights))
+
+@benchmark("find_optimal_k", max_n=1_000, repeat=1)
+def bench_find_optimal_k(warehouses):
+    from select_strategic_locations import find_optimal_k
+    data = _coords(warehouses)
+    return _cold(lambda: find_optimal_k(data, min_k=4, max_k=7, random_state=0))
+
+@benchmark("find_optimal_k_fast", max_n=1_000_000, repeat=1)
+def bench_find_optimal_k_fast(warehouses):
+    # Same k search scored with the O(N*k) criteria instead of silhouette
+    from select_strategic_locations import find_optimal_k
+    data = _coords(warehouses)
+    return lambda: find_optimal_k(data, min_k=4, max_k=7, random_state=0, criterion="combined")
+
+@benchmark("coverage_select", max_n=100_000, repeat=1)
+def bench_coverage_select(warehouses):
+    from coverage_selection import select_sites
+    lats = [w['Latitude'] for w in warehouses]
+    lons = [w['Longitude'] for w in warehouses]
+    return lambda: select_sites(lats, lons, 7, radius_km=50)
+
+@benchmark("filter_warehouses", max_n=10_000, repeat=1)
+def bench_filter_warehouses(warehouses):
+    from filter_warehouses import filter_warehouses
+    return lambda: filter_warehouses(warehouses)
+
+@benchmark("overlap_scan", max_n=1_000_000, repeat=1)
+def bench_overlap_scan(warehouses):
+    # 50 "Walmart" sites against n "Amazon" sites, as in analyze_locations
+    from analyze_locations import nearest_amazon_distances
+    amazon = [{'lat': w['Latitude'], 'lon': w['Longitude']} for w in warehouses]
+    walmart = amazon[::max(1, len(amazon) // 50)][:50]
+    return lambda: nearest_amazon_distances(walmart, amazon)
+
+@benchmark("ooc_join", max_n=1_000_000, repeat=1)
+def bench_ooc_join(warehouses):
+    # n query points against n/10 targets, both spilled from CSV
+    import tempfile
+    from ooc_join import ooc_nearest_join
+    from synthetic import write_csv
+    tmp = tempfile.mkdtemp()
+    query_file = os.path.join(tmp, "query.csv")
+    target_file = os.path.join(tmp, "target.csv")
+    write_csv(warehouses, query_file)
+    write_csv(generate_warehouses(max(1, len(warehouses) // 10), seed=1), target_file)
+    return lambda: ooc_nearest_join(query_file, target_file, memory_mb=64, jobs=4)
+
+@benchmark("demand_coverage", max_n=1_000_000, repeat=1)
+def bench_demand_coverage(warehouses):
+    # n demand points streamed from CSV against two networks of n/100 and n/1000 sites
+    import tempfile
+    from demand_coverage import FacilityNetwork, analyze_demand
+    from synthetic import write_csv
+    demand_file = os.path.join(tempfile.mkdtemp(), "demand.csv")
+    write_csv(warehouses, demand_file)
+    sites = generate_warehouses(max(1, len(warehouses) // 100), seed=1)
+    networks = lambda: [FacilityNetwork("A", sites), FacilityNetwork("B", sites[::10])]
+    return lambda: analyze_demand(demand_file, networks())
+
+@benchmark("density_geojson", max_n=1_000_000)
+def bench_density_geojson(warehouses):
+    # Hex layers for every density zoom level, as drawn by --density maps
+    import numpy as np
+    from density import DENSITY_ZOOMS, density_geojson
+    lats = np.array([w['Latitude'] for w in warehouses])
+    lons = np.array([w['Longitude'] for w in warehouses])
+    return lambda: [density_geojson(lats, lons, zoom) for zoom in DENSITY_ZOOMS]
+
+@benchmark("map_render", max_n=10_000, repeat=1)
+def bench_map_render(warehouses):
+    from analyze_locations import build_map
+    points = [{'lat': w['Latitude'], 'lon': w['Longitude'], 'name': w['Name'],
+               'city': w['City'], 'state': w['State']} for w in warehouses]
+    half = len(points) // 2
+    return lambda: build_map(points[:half], points[half:]).get_root().render()
+
+@benchmark("geocode_throughput", max_n=1_000, repeat=1)
+def bench_geocode_throughput(warehouses):
+    # n uncached geocode() lookups against the local stand-in server, 5% injected 500s
+    import tempfile
+    import geocoding
+    from geocode_server import StandIn, start_server
+    server = start_server(StandIn({}, unknown="synthetic", error_rate=0.05, seed=0))
+    url = geocoding.NOMINATIM_URL
+    geocoding.NOMINATIM_URL = f"http://127.0.0.1:{server.server_address[1]}"
+    queries = [f"{w['City']}, {w['State']} {i}" for i, w in enumerate(warehouses)]
+    tmp = tempfile.mkdtemp()
+
+    def run_queries():
+        cache = geocoding.GeocodeCache(os.path.join(tmp, f"cache_{time.perf_counter_ns()}.jsonl"))
+        for query in queries:
+            geocoding.geocode(query, "city", cache)
+
+    def cleanup():
+        server.shutdown()
+        server.server_close()
+        geocoding.NOMINATIM_URL = url
+    return run_queries, cleanup
+
+@benchmark("proximity_stream", max_n=1_000_000, repeat=1)
+def bench_proximity_stream(warehouses):
+    # n points streamed as NDJSON to /nearest of an in-process service with n/100 and n/1000 sites
+    import asyncio
+    import http.client
+    import tempfile
+    import threading
+    from proximity_service import ProximityService
+    from synthetic import write_csv
+    tmp = tempfile.mkdtemp()
+    sites = generate_warehouses(max(1, len(warehouses) // 100), seed=1)
+    specs = [("A", os.path.join(tmp, "a.csv")), ("B", os.path.join(tmp, "b.csv"))]
+    write_csv(sites, specs[0][1])
+    write_csv(sites[::10], specs[1][1])
+    service = ProximityService(specs, reload_interval=0)
+    loop = asyncio.new_event_loop()
+    server = loop.run_until_complete(asyncio.start_server(service.handle, "127.0.0.1", 0))
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    port = server.sockets[0].getsockname()[1]
+    body = "".join(f"[{w['Latitude']},{w['Longitude']}]\n" for w in warehouses).encode()
+
+    def stream():
+        # Upload from a thread while the answers are read, as a streaming client would
+        conn = http.client.HTTPConnection("127.0.0.1", port)
+        conn.putrequest("POST", "/nearest")
+        conn.putheader("Content-Type", "application/x-ndjson")
+        conn.putheader("Content-Length", str(len(body)))
+        conn.endheaders()
+        sender = threading.Thread(target=conn.send, args=(body,))
+        sender.start()
+        conn.getresponse().read()
+        sender.join()
+        conn.close()
+
+    def cleanup():
+        async def close():
+            server.close()
+            await server.wait_closed()
+        asyncio.run_coroutine_threadsafe(close(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+        service.compute.shutdown()
+    return stream, cleanup
+
+def time_call(func, repeat):
+    start = time.perf_counter()
+    func()
+    warmup = time.perf_counter() - start
+    times = [warmup] if warmup >= LONG_RUN_SECONDS else []
+    while len(times) < MAX_CALLS and (len(times) < repeat or sum(times) < MIN_TIMED_SECONDS):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def run(sizes, names):
+    results = {}
+    for size_label in sizes:
+        n = SIZES[size_label]
+        warehouses = None
+        for name in names:
+            setup, max_n, repeat = BENCHMARKS[name]
+            if n > max_n:
+                continue
+            if warehouses is None:
+                warehouses = generate_warehouses(n, seed=0)
+            # Benchmarked code prints progress; keep the report readable
+            stdout = sys.stdout
+            sys.stdout = open(os.devnull, 'w')
+            try:
+                prepared = setup(warehouses)
+                func, cleanup = prepared if isinstance(prepared, tuple) else (prepared, None)
+                try:
+                    seconds = time_call(func, repeat)
+                finally:
+                    if cleanup:
+                        cleanup()
+            finally:
+                sys.stdout.close()
+                sys.stdout = stdout
+            key = f"{name}[{size_label}]"
+            results[key] = seconds
+            print(f"  {key:32s} {seconds * 1000:12.2f} ms")
+    return results
+
+def compare(results, baselines, tolerance):
+    regressions = []
+    for key, seconds in results.items():
+        base = baselines.get(key)
+        if base is None:
+            continue
+        ratio = seconds / base if base > 0 else float('inf')
+        regressed = ratio > tolerance and seconds - base > REGRESSION_FLOOR_SECONDS
+        print(f"  {key:32s} {ratio:6.2f}x baseline  {'REGRESSION' if regressed else 'ok'}")
+        if regressed:
+            regressions.append(key)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the warehouse analysis pipeline on synthetic data")
+    parser.add_argument("--sizes", default=",".join(DEFAULT_SIZES), help=f"Comma-separated subset of {', '.join(SIZES)}")
+    parser.add_argument("--only", help="Comma-separated benchmark names")
+    parser.add_argument("--save-baseline", action="store_true", help=f"Store results in {BASELINE_FILE}")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE)
+    args = parser.parse_args()
+
+    sizes = [s.strip().lower() for s in args.sizes.split(",") if s.strip()]
+    names = args.only.split(",") if args.only else list(BENCHMARKS)
+
+    print("Benchmarks (best of repeats):")
+    results = run(sizes, names)
+
+    baselines = {}
+    if os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE, 'r') as f:
+            baselines = json.load(f)
+
+    if args.save_baseline:
+        baselines.setdefault("results", {}).update(results)
+        baselines["machine"] = f"{platform.platform()} / Python {platform.python_version()}"
+        with open(BASELINE_FILE, 'w') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+        print(f"Saved baseline to {BASELINE_FILE}")
+        return
+
+    if baselines.get("results"):
+        print(f"\nCompared with baseline ({baselines.get('machine', 'unknown machine')}):")
+        regressions = compare(results, baselines["results"], args.tolerance)
+        for _ in range(CONFIRM_RUNS):
+            if not regressions:
+                break
+            # A noisy neighbour can slow one run down; only a repeatable slowdown counts
+            print(f"\nRe-timing {len(regressions)} suspected regression(s):")
+            for key in regressions:
+                name, size_label = key[:-1].split("[")
+                results[key] = min(results[key], run([size_label], [name])[key])
+            regressions = compare({key: results[key] for key in regressions}, baselines["results"], args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import csv
+import numpy as np
+
+# Synthetic warehouse networks for benchmarking.
+# Warehouses cluster around metro areas whose sizes follow a Zipf-like law,
+# metros sit inside rough land boxes of the regions we actually cover, and a
+# share of points is stacked exactly on the metro centre the way city-level
+# geocoding fallbacks produce them.
+
+# (region, lat_min, lat_max, lon_min, lon_max, share of metros)
+LAND_BOXES = [
+    ("usa", 26.0, 48.0, -123.0, -71.0, 0.40),
+    ("europe", 37.0, 58.0, -9.0, 25.0, 0.25),
+    ("india", 9.0, 30.0, 70.0, 88.0, 0.10),
+    ("japan", 31.0, 43.0, 130.0, 145.0, 0.05),
+    ("australia", -38.0, -27.0, 115.0, 153.0, 0.05),
+    ("brazil", -30.0, -5.0, -55.0, -35.0, 0.05),
+    ("canada", 43.0, 54.0, -123.0, -63.0, 0.05),
+    ("china", 22.0, 41.0, 103.0, 122.0, 0.05),
+]
+
+METRO_SPREAD_DEG = 0.25
+CENTROID_SHARE = 0.1
+
+def generate_warehouses(n, seed=0, n_metros=None):
+    rng = np.random.default_rng(seed)
+    if n_metros is None:
+        n_metros = max(10, int(np.sqrt(n) * 2))
+
+    shares = np.array([box[5] for box in LAND_BOXES])
+    box_idx = rng.choice(len(LAND_BOXES), size=n_metros, p=shares / shares.sum())
+    boxes = np.array([box[1:5] for box in LAND_BOXES])[box_idx]
+    metro_lat = rng.uniform(boxes[:, 0], boxes[:, 1])
+    metro_lon = rng.uniform(boxes[:, 2], boxes[:, 3])
+
+    sizes = 1.0 / np.arange(1, n_metros + 1) ** 0.8
+    metro = rng.choice(n_metros, size=n, p=sizes / sizes.sum())
+    lats = metro_lat[metro] + rng.normal(0, METRO_SPREAD_DEG, size=n)
+    lons = metro_lon[metro] + rng.normal(0, METRO_SPREAD_DEG, size=n)
+
+    stacked = rng.random(n) < CENTROID_SHARE
+    lats[stacked] = metro_lat[metro[stacked]]
+    lons[stacked] = metro_lon[metro[stacked]]
+    lats = np.clip(lats, -89.9, 89.9)
+    lons = (lons + 180.0) % 360.0 - 180.0
+
+    warehouses = []
+    for i in range(n):
+        region = LAND_BOXES[box_idx[metro[i]]][0]
+        warehouses.append({
+            'Name': f"Synthetic_{i}",
+            'Latitude': float(lats[i]),
+            'Longitude': float(lons[i]),
+            'City': f"Metro{metro[i]}",
+            'State': "",
+            'Country': region,
+            'Region': region
+        })
+    return warehouses
+
+def write_csv(warehouses, filename):
+    fieldnames = ['Name', 'Latitude', 'Longitude', 'City', 'State', 'Country', 'Region']
+    with open(filename, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(warehouses)
@@ -0,0 +1,64 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cumulative import time allowed per entry-point module (python -X importtime)
+IMPORT_BUDGET_MS = 400
+
+ENTRY_MODULES = [
+    "analyze_locations",
+    "select_strategic_locations",
+    "select_hierarchical_locations",
+    "map_strategic_locations",
+    "warehouse_analysis",
+]
+
+# Must only be imported by the code paths that use them
+LAZY_MODULES = ["folium", "geopy", "geographiclib"]
+
+def import_profile(module):
+    # Returns {module name: cumulative microseconds} for a fresh interpreter importing `module`
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = [p.strip() for p in line[len("import time:"):].split("|")]
+        if parts[1].isdigit():
+            times[parts[2].strip()] = int(parts[1])
+    return times
+
+def check_imports():
+    # [(module, cumulative ms, problem or None)] for every entry-point module
+    results = []
+    for module in ENTRY_MODULES:
+        times = import_profile(module)
+        total_ms = times.get(module, 0) / 1000
+        eager = [name for name in LAZY_MODULES if name in times]
+        problem = None
+        if total_ms > IMPORT_BUDGET_MS:
+            problem = f"over budget ({IMPORT_BUDGET_MS} ms)"
+        if eager:
+            problem = f"imports {', '.join(eager)} eagerly"
+        results.append((module, total_ms, problem))
+    return results
+
+def test_import_budget():
+    failures = [f"{module}: {total_ms:.1f} ms, {problem}" for module, total_ms, problem in check_imports() if problem]
+    assert not failures, "; ".join(failures)
+
+def main():
+    results = check_imports()
+    for module, total_ms, problem in results:
+        print(f"  {module:34s} {total_ms:8.1f} ms  {problem or 'ok'}")
+
+    failures = [module for module, _, problem in results if problem]
+    if failures:
+        print(f"{len(failures)} import-time check(s) failed")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+import hashlib
+import os
+
+CACHE_DIR = ".cache"
+
+def file_digest(filename):
+    h = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def digest(*parts):
+    # Stable key for any mix of strings, numbers and (nested) lists/tuples
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(repr(part).encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+def cache_path(namespace, key, suffix):
+    directory = os.path.join(CACHE_DIR, namespace)
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"{key[:32]}{suffix}")
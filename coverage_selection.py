@@ -0,0 +1,124 @@
+import heapq
+import numpy as np
+
+from spatial_index import GridIndex, KM_PER_DEG, haversine_km
+
+# Coverage-driven site selection over the actual warehouse candidates.
+# "coverage": maximize the number of sites within radius_km of a chosen site.
+# "median":   p-median with distances truncated at radius_km, i.e. minimize the
+#             sum of min(distance to nearest chosen site, radius_km).
+# Both objectives are submodular, so the lazy greedy below (stale upper bounds
+# kept in a priority queue, re-evaluated only when they reach the top) returns
+# exactly the same picks as plain greedy while evaluating far fewer gains.
+# Once no candidate adds anything (every site covered, duplicate sites, zero
+# weights), the remaining picks go to the site farthest from all chosen ones,
+# so k sites are always returned.
+
+COVERAGE_RADIUS_KM = 100.0
+
+class NeighborMatrix:
+    # Sparse CSR matrix: row i lists every site within radius_km of candidate i
+    def __init__(self, lats, lons, radius_km):
+        self.radius_km = radius_km
+        self.n = len(lats)
+        cell_deg = max(radius_km / KM_PER_DEG, 0.01)
+        index = GridIndex(lats, lons, cell_deg=cell_deg)
+
+        indptr = np.zeros(self.n + 1, dtype=np.int64)
+        rows_idx = []
+        rows_dist = []
+        for i in range(self.n):
+            idx, dist = index.query_radius(lats[i], lons[i], radius_km)
+            rows_idx.append(idx.astype(np.int32))
+            rows_dist.append(dist.astype(np.float32))
+            indptr[i + 1] = indptr[i] + len(idx)
+        self.indptr = indptr
+        self.indices = np.concatenate(rows_idx) if rows_idx else np.empty(0, dtype=np.int32)
+        self.distances = np.concatenate(rows_dist) if rows_dist else np.empty(0, dtype=np.float32)
+
+    def row(self, i):
+        start, end = self.indptr[i], self.indptr[i + 1]
+        return self.indices[start:end], self.distances[start:end]
+
+def farthest_fill(lats, lons, selected, count):
+    # Greedy farthest-point picks: each new site maximizes its distance to the nearest chosen one
+    # (lowest index on ties, so a region without picks starts at site 0)
+    nearest = np.full(len(lats), np.inf)
+    for i in selected:
+        nearest = np.minimum(nearest, haversine_km(lats[i], lons[i], lats, lons))
+    nearest[selected] = -1.0
+    picks = []
+    for _ in range(count):
+        i = int(np.argmax(nearest))
+        picks.append(i)
+        nearest = np.minimum(nearest, haversine_km(lats[i], lons[i], lats, lons))
+        nearest[i] = -1.0
+    return picks
+
+def select_sites(lats, lons, k, radius_km=COVERAGE_RADIUS_KM, objective="coverage", weights=None, neighbors=None):
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    n = len(lats)
+    if n == 0 or k <= 0:
+        return [], {"score": 0.0, "evaluations": 0}
+    if weights is None:
+        weights = np.ones(n)
+    weights = np.asarray(weights, dtype=np.float64)
+    if neighbors is None:
+        neighbors = NeighborMatrix(lats, lons, radius_km)
+
+    if objective == "coverage":
+        covered = np.zeros(n, dtype=bool)
+
+        def gain(i):
+            idx, _ = neighbors.row(i)
+            return float(weights[idx][~covered[idx]].sum())
+
+        def commit(i):
+            idx, _ = neighbors.row(i)
+            covered[idx] = True
+    elif objective == "median":
+        # Current (truncated) distance of every site to its nearest chosen site
+        current = np.full(n, float(radius_km))
+
+        def gain(i):
+            idx, dist = neighbors.row(i)
+            return float((weights[idx] * np.maximum(current[idx] - dist, 0.0)).sum())
+
+        def commit(i):
+            idx, dist = neighbors.row(i)
+            current[idx] = np.minimum(current[idx], dist)
+    else:
+        raise ValueError(f"Unknown objective: {objective}")
+
+    # Heap of (-gain, index, round in which the gain was computed)
+    heap = [(-gain(i), i, 0) for i in range(n)]
+    heapq.heapify(heap)
+    evaluations = n
+    selected = []
+
+    while heap and len(selected) < min(k, n):
+        neg_gain, i, stamp = heapq.heappop(heap)
+        if stamp == len(selected):
+            if neg_gain == 0:
+                break  # Nothing left to gain; the rest is filled below
+            selected.append(i)
+            commit(i)
+        else:
+            heapq.heappush(heap, (-gain(i), i, len(selected)))
+            evaluations += 1
+
+    filled = farthest_fill(lats, lons, selected, min(k, n) - len(selected))
+    for i in filled:
+        selected.append(i)
+        commit(i)
+
+    # Covered weight share for "coverage", weighted mean truncated distance for "median"
+    # (unweighted when every weight is zero)
+    if weights.sum() <= 0:
+        weights = np.ones(n)
+    if objective == "coverage":
+        score = float(weights[covered].sum() / weights.sum())
+    else:
+        score = float((weights * current).sum() / weights.sum())
+    return selected, {"score": score, "evaluations": evaluations, "filled": len(filled)}
@@ -0,0 +1,175 @@
+import argparse
+import csv
+import glob
+import os
+import re
+import unicodedata
+from difflib import SequenceMatcher
+import numpy as np
+from spatial_index import GridIndex
+import instrumentation
+import warehouse_io
+
+# Duplicate detection for warehouse records.
+# The same facility shows up under several codes in the raw lists, and the
+# geocoders' city-centroid fallback stacks many facilities on one coordinate.
+# Exact matches are found by hashing (rounded coordinates, normalized codes);
+# fuzzy matches only compare records in nearby grid cells, so the whole pass
+# is close to linear in the number of records.
+
+GLOBAL_DATA_DIR = "global_data"
+DEFAULT_FILES = ["amazon_warehouses_filled.csv", "walmart_warehouses.csv"]
+REPORT_FILE = "duplicates_report.csv"
+
+COORD_DECIMALS = 5         # ~1 m; equal rounded coordinates count as the same point
+NEAR_DUPLICATE_KM = 0.2    # Different records this close are assumed to be one site
+NAME_MATCH_KM = 5.0        # Similar names within this distance are flagged as well
+NAME_SIMILARITY = 0.85     # difflib ratio on normalized names/codes
+BRAND_PREFIXES = ("amazon", "walmart")
+
+def normalize_key(text):
+    # Lowercase ASCII alphanumerics only: "Amazon_SDF8 " -> "amazonsdf8"
+    text = unicodedata.normalize('NFKD', text or '').encode('ascii', 'ignore').decode('ascii').lower()
+    return re.sub(r'[^a-z0-9]', '', text)
+
+def record_key(record, name_key='Name', code_key='Code'):
+    # (brand, code): Amazon_SMF1 and Walmart_SMF1 are different facilities
+    name = normalize_key(record.get(name_key, ''))
+    brand = next((p for p in BRAND_PREFIXES if name.startswith(p)), '')
+    code = normalize_key(record.get(code_key, '')) or name[len(brand):]
+    return (brand, code) if code else None
+
+class _UnionFind:
+    def __init__(self, n):
+        self.parent = list(range(n))
+
+    def find(self, i):
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, i, j):
+        ri, rj = self.find(i), self.find(j)
+        if ri != rj:
+            self.parent[max(ri, rj)] = min(ri, rj)
+
+def find_duplicates(records, lat_key='Latitude', lon_key='Longitude', name_key='Name', code_key='Code',
+                    near_km=NEAR_DUPLICATE_KM, name_match_km=NAME_MATCH_KM, similarity=NAME_SIMILARITY,
+                    source_key='Source'):
+    # Returns duplicate groups as [{'members': [record indices], 'kinds': set of match kinds}],
+    # members in input order so the first one can be kept as the representative.
+    # Coordinate and proximity matches only link records of the same brand or the same
+    # source file: an Amazon and a Walmart site next door are competitors, not duplicates.
+    n = len(records)
+    if n == 0:
+        return []
+    lats = np.array([r[lat_key] for r in records], dtype=np.float64)
+    lons = np.array([r[lon_key] for r in records], dtype=np.float64)
+    keys = [record_key(r, name_key, code_key) for r in records]
+    brands = [key[0] if key else '' for key in keys]
+    sources = [r.get(source_key, '') for r in records]
+    uf = _UnionFind(n)
+    pair_kinds = []  # (i, j, kind)
+
+    def link(buckets, kind):
+        for members in buckets.values():
+            for j in members[1:]:
+                pair_kinds.append((members[0], j, kind))
+                uf.union(members[0], j)
+
+    # Exact collisions by hashing
+    by_coord = {}
+    for i, point in enumerate(zip(np.round(lats, COORD_DECIMALS), np.round(lons, COORD_DECIMALS))):
+        by_coord.setdefault((point, 'source', sources[i]), []).append(i)
+        if brands[i]:
+            by_coord.setdefault((point, 'brand', brands[i]), []).append(i)
+    link(by_coord, "exact_coordinates")
+
+    by_key = {}
+    for i, key in enumerate(keys):
+        if key:
+            by_key.setdefault(key, []).append(i)
+    link(by_key, "same_code")
+
+    # Fuzzy matches among grid neighbours only
+    index = GridIndex(lats, lons, cell_deg=max(name_match_km, near_km) / 111.0 * 2)
+    for i in range(n):
+        idx, dist = index.query_radius(lats[i], lons[i], max(name_match_km, near_km))
+        instrumentation.incr("dedup_candidates", len(idx))
+        for j, d in zip(idx.tolist(), dist.tolist()):
+            if j <= i or uf.find(i) == uf.find(j):
+                continue
+            if d <= near_km and (sources[i] == sources[j] or (brands[i] and brands[i] == brands[j])):
+                kind = "near_duplicate"
+            elif (keys[i] and keys[j] and keys[i][0] == keys[j][0]
+                  and SequenceMatcher(None, keys[i][1], keys[j][1]).ratio() >= similarity):
+                kind = "similar_name"
+            else:
+                continue
+            pair_kinds.append((i, j, kind))
+            uf.union(i, j)
+
+    groups = {}
+    for i, j, kind in pair_kinds:
+        group = groups.setdefault(uf.find(i), {'members': set(), 'kinds': set()})
+        group['members'].update((i, j))
+        group['kinds'].add(kind)
+    result = [{'members': sorted(g['members']), 'kinds': g['kinds']} for g in groups.values()]
+    result.sort(key=lambda g: g['members'][0])
+    return result
+
+def dedupe(records, groups):
+    # Keep the first record of each duplicate group
+    dropped = {i for g in groups for i in g['members'][1:]}
+    return [r for i, r in enumerate(records) if i not in dropped]
+
+def write_report(records, groups, filename, lat_key='Latitude', lon_key='Longitude', name_key='Name'):
+    with open(filename, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Group', 'Kinds', 'Keep', 'Name', 'City', 'Latitude', 'Longitude', 'Source'])
+        for group_id, group in enumerate(groups, 1):
+            kinds = ";".join(sorted(group['kinds']))
+            for n, i in enumerate(group['members']):
+                r = records[i]
+                writer.writerow([group_id, kinds, 'yes' if n == 0 else 'no', r.get(name_key, ''),
+                                 r.get('City', ''), r[lat_key], r[lon_key], r.get('Source', '')])
+
+def summarize(groups):
+    counts = {}
+    for group in groups:
+        for kind in group['kinds']:
+            counts[kind] = counts.get(kind, 0) + 1
+    redundant = sum(len(g['members']) - 1 for g in groups)
+    return counts, redundant
+
+def main():
+    parser = argparse.ArgumentParser(description="Find exact and near-duplicate warehouse records")
+    parser.add_argument("files", nargs="*", help=f"Warehouse CSVs (default: {', '.join(DEFAULT_FILES)} and {GLOBAL_DATA_DIR}/*.csv)")
+    parser.add_argument("--report", default=REPORT_FILE, help="CSV listing every duplicate group")
+    parser.add_argument("--near-km", type=float, default=NEAR_DUPLICATE_KM, help="Records closer than this are one site")
+    parser.add_argument("--name-km", type=float, default=NAME_MATCH_KM, help="Search radius for similar names/codes")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    files = args.files or [f for f in DEFAULT_FILES if os.path.exists(f)] + sorted(glob.glob(os.path.join(GLOBAL_DATA_DIR, "*.csv")))
+    with instrumentation.session("dedup", args):
+        records = []
+        for filename in files:
+            rows, _ = warehouse_io.load_records(filename)
+            for row in rows:
+                row['Source'] = filename
+            records.extend(rows)
+
+        with instrumentation.timer("find_duplicates"):
+            groups = find_duplicates(records, near_km=args.near_km, name_match_km=args.name_km)
+        counts, redundant = summarize(groups)
+        write_report(records, groups, args.report)
+
+        print(f"{len(records)} records, {len(groups)} duplicate groups, {redundant} redundant records")
+        for kind, count in sorted(counts.items()):
+            print(f"  {kind}: {count} groups")
+        print(f"Report saved to {args.report}")
+
+if __name__ == "__main__":
+    main()
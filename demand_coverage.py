@@ -0,0 +1,267 @@
+import argparse
+import csv
+import numpy as np
+from spatial_index import KM_PER_DEG, haversine_km
+from ooc_join import BYTES_PER_PAIR, MEMORY_MB
+import instrumentation
+import warehouse_io
+
+# Customer-demand coverage: what share of demand (population, orders, ...)
+# lies within X km of each warehouse network, and which facility is nearest
+# to every demand point. The demand file is streamed in chunks, so tens of
+# millions of points never have to be in memory at once. Each network keeps a
+# cell index over its facilities: for every grid cell that holds demand, the
+# facilities that can be nearest to some point of the cell. Demand points of a
+# chunk are matched in vectorized blocks against their cell's candidates
+# only. Candidate lists depend only on the cell, so they are built once (for
+# all new cells of a chunk together) and reused.
+
+NETWORKS = {
+    "Amazon": "amazon_warehouses_filled.csv",
+    "Walmart": "walmart_warehouses.csv",
+}
+OUTPUT_FILE = "demand_coverage.csv"
+RADII_KM = [20.0, 50.0, 100.0]
+WEIGHT_COLUMN = "Weight"
+
+DEMAND_CELL_DEG = 0.5  # Demand points are matched one cell of this size at a time
+
+class FacilityNetwork:
+    def __init__(self, name, records, cell_deg=DEMAND_CELL_DEG, memory_mb=MEMORY_MB):
+        self.name = name
+        self.records = records
+        self.lats = np.array([r['Latitude'] for r in records], dtype=np.float64)
+        self.lons = np.array([r['Longitude'] for r in records], dtype=np.float64)
+        self.cell_deg = cell_deg
+        self.n_cols = int(round(360.0 / cell_deg))
+        self.memory_mb = memory_mb
+        self._candidates = {}  # cell key -> ascending indices of the facilities that can be nearest
+
+    def __len__(self):
+        return len(self.records)
+
+    def cell_keys(self, lats, lons):
+        rows = np.floor((lats + 90.0) / self.cell_deg).astype(np.int64)
+        cols = np.floor((lons + 180.0) / self.cell_deg).astype(np.int64) % self.n_cols
+        return rows * self.n_cols + cols
+
+    def _add_candidates(self, keys):
+        # Every point of a cell is within h of its centre, so its nearest facility is
+        # within d0 + h of it and within d0 + 2h of the centre (d0: centre -> nearest).
+        # Centres of all new cells are measured against the facilities in one pass.
+        rows, cols = np.divmod(keys, self.n_cols)
+        lat = np.minimum(-90.0 + (rows + 0.5) * self.cell_deg, 90.0)
+        lon = -180.0 + (cols + 0.5) * self.cell_deg
+        h = self.cell_deg * KM_PER_DEG  # half a cell north-south plus half a cell east-west, at worst
+        q_block = max(1, int(self.memory_mb * 1024 * 1024 // BYTES_PER_PAIR) // len(self.lats))
+        for qs in range(0, len(keys), q_block):
+            qe = qs + q_block
+            dist = haversine_km(lat[qs:qe, None], lon[qs:qe, None], self.lats[None, :], self.lons[None, :])
+            limit = dist.min(axis=1) + 2 * h
+            for key, row_dist, lim in zip(keys[qs:qe].tolist(), dist, limit.tolist()):
+                cand = np.flatnonzero(row_dist <= lim)
+                self._candidates[key] = cand
+                instrumentation.incr("demand_cell_candidates", len(cand))
+        instrumentation.incr("demand_cells", len(keys))
+
+    def nearest(self, lats, lons):
+        # (facility index, distance km) per point; ties -> lowest facility index.
+        # Cells are bucketed by candidate count (rounded up to a power of two) and
+        # each bucket is one padded points x candidates block, so a chunk costs a
+        # few numpy passes however many cells it touches.
+        best_dist = np.full(len(lats), np.inf)
+        best_idx = np.full(len(lats), -1, dtype=np.int64)
+        if len(self.records) == 0 or len(lats) == 0:
+            return best_idx, best_dist
+        keys = self.cell_keys(lats, lons)
+        uniq, inverse = np.unique(keys, return_inverse=True)
+        new = np.array([k for k in uniq.tolist() if k not in self._candidates], dtype=np.int64)
+        if len(new):
+            self._add_candidates(new)
+        cands = [self._candidates[k] for k in uniq.tolist()]
+        widths = 1 << np.ceil(np.log2([len(c) for c in cands])).astype(np.int64)
+        pairs = max(1, int(self.memory_mb * 1024 * 1024 // BYTES_PER_PAIR))
+
+        for width in np.unique(widths).tolist():
+            cells = np.flatnonzero(widths == width)
+            padded = np.full((len(cells), width), -1, dtype=np.int64)
+            for row, cell in enumerate(cells.tolist()):
+                padded[row, :len(cands[cell])] = cands[cell]
+            position = np.full(len(uniq), -1, dtype=np.int64)
+            position[cells] = np.arange(len(cells))
+            points = np.flatnonzero(position[inverse] >= 0)
+            block = max(1, pairs // width)
+            for start in range(0, len(points), block):
+                p = points[start:start + block]
+                cand = padded[position[inverse[p]]]
+                dist = haversine_km(lats[p, None], lons[p, None], self.lats[cand], self.lons[cand])
+                dist[cand < 0] = np.inf
+                # Candidates are ascending with padding last, so argmin's first hit is the lowest index
+                col = np.argmin(dist, axis=1)
+                rows = np.arange(len(p))
+                best_dist[p] = dist[rows, col]
+                best_idx[p] = cand[rows, col]
+            instrumentation.incr("demand_blocks", -(-len(points) // block))
+        return best_idx, best_dist
+
+class CoverageTotals:
+    # Running sums for one network (or for the best of all networks when facilities is 0)
+    def __init__(self, name, radii, n_facilities=0):
+        self.name = name
+        self.radii = radii
+        self.points = 0
+        self.weight = 0.0
+        self.covered = np.zeros(len(radii))
+        self.distance_sum = 0.0  # weighted, over points that have a facility at all
+        self.matched_weight = 0.0
+        self.facility_points = np.zeros(n_facilities, dtype=np.int64)
+        self.facility_weight = np.zeros(n_facilities)
+        self.facility_distance = np.zeros(n_facilities)
+
+    def add(self, dist, weights, nearest=None):
+        self.points += len(dist)
+        self.weight += float(weights.sum())
+        for k, radius in enumerate(self.radii):
+            self.covered[k] += float(weights[dist <= radius].sum())
+        matched = np.isfinite(dist)
+        self.distance_sum += float((dist[matched] * weights[matched]).sum())
+        self.matched_weight += float(weights[matched].sum())
+        if nearest is not None and len(self.facility_weight):
+            idx = nearest[matched]
+            n = len(self.facility_weight)
+            self.facility_points += np.bincount(idx, minlength=n)
+            self.facility_weight += np.bincount(idx, weights=weights[matched], minlength=n)
+            self.facility_distance += np.bincount(idx, weights=dist[matched] * weights[matched], minlength=n)
+
+    def shares(self):
+        return self.covered / self.weight if self.weight > 0 else np.zeros(len(self.radii))
+
+    def mean_distance(self):
+        return self.distance_sum / self.matched_weight if self.matched_weight > 0 else float('nan')
+
+def chunk_weights(chunk, weight_column):
+    # Rows without the column (or with a bad value) count as 1.0
+    values = chunk.columns.get(weight_column)
+    if values is None:
+        return np.ones(len(chunk)), 0
+    return warehouse_io.parse_weights(values)
+
+def analyze_demand(demand_file, networks, radii=RADII_KM, weight_column=WEIGHT_COLUMN,
+                   chunk_size=warehouse_io.CHUNK_SIZE, assignments_file=None):
+    # Returns ({network name: CoverageTotals}, CoverageTotals over all networks, LoadReport)
+    report = warehouse_io.LoadReport(demand_file)
+    totals = {n.name: CoverageTotals(n.name, radii, len(n)) for n in networks}
+    combined = CoverageTotals("Any", radii)
+    invalid_weights = 0
+
+    out = open(assignments_file, 'w', newline='') if assignments_file else None
+    try:
+        if out:
+            writer = csv.writer(out)
+            header = ['Row', 'Weight']
+            for network in networks:
+                header += [f'{network.name}Nearest', f'{network.name}DistanceKm']
+            writer.writerow(header)
+
+        for chunk in warehouse_io.iter_chunks(demand_file, chunk_size, report=report):
+            weights, invalid = chunk_weights(chunk, weight_column)
+            invalid_weights += invalid
+            best = np.full(len(chunk), np.inf)
+            columns = [chunk.row_numbers.tolist(), weights.tolist()]
+            with instrumentation.timer("nearest_facility"):
+                for network in networks:
+                    nearest, dist = network.nearest(chunk.lat, chunk.lon)
+                    totals[network.name].add(dist, weights, nearest)
+                    np.minimum(best, dist, out=best)
+                    if out:
+                        names = [network.records[i].get('Name', '') if i >= 0 else '' for i in nearest.tolist()]
+                        columns += [names, [f"{d:.6f}" for d in dist.tolist()]]
+            combined.add(best, weights)
+            instrumentation.incr("demand_points", len(chunk))
+            if out:
+                writer.writerows(zip(*columns))
+    finally:
+        if out:
+            out.close()
+
+    if report.rejected:
+        print(f"  Warning: {report.summary()}")
+    if invalid_weights:
+        print(f"  Warning: {demand_file}: {invalid_weights} rows with a missing or invalid '{weight_column}' weighted 1.0")
+    return totals, combined, report
+
+def load_networks(specs, min_precision="city"):
+    networks = []
+    for name, filename in specs:
+        records, _ = warehouse_io.load_records(filename)
+        records = [r for r in records if warehouse_io.meets_precision(r, min_precision)]
+        networks.append(FacilityNetwork(name, records))
+    return networks
+
+def parse_network(spec):
+    name, sep, filename = spec.partition("=")
+    if not sep or not name or not filename:
+        raise argparse.ArgumentTypeError(f"expected NAME=FILE, got '{spec}'")
+    return name, filename
+
+def save_facility_report(networks, totals, filename):
+    with open(filename, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Network', 'Name', 'City', 'Latitude', 'Longitude', 'Points', 'Demand', 'DemandShare', 'MeanDistanceKm'])
+        for network in networks:
+            t = totals[network.name]
+            for i, r in enumerate(network.records):
+                demand = t.facility_weight[i]
+                writer.writerow([network.name, r.get('Name', ''), r.get('City', ''), r['Latitude'], r['Longitude'],
+                                 int(t.facility_points[i]), round(float(demand), 6),
+                                 round(float(demand / t.weight), 6) if t.weight > 0 else 0.0,
+                                 round(float(t.facility_distance[i] / demand), 3) if demand > 0 else ''])
+
+def print_summary(networks, totals, combined, radii):
+    print(f"\n{combined.points} demand points, total weight {combined.weight:,.1f}")
+    header = f"{'Network':<10} {'Sites':>6} " + " ".join(f"{f'<= {r:g} km':>11}" for r in radii) + f" {'Mean km':>9}"
+    print(header)
+    rows = [(n.name, len(n), totals[n.name]) for n in networks]
+    if len(networks) > 1:
+        rows.append((combined.name, sum(len(n) for n in networks), combined))
+    for name, sites, t in rows:
+        shares = " ".join(f"{share:>10.1%} " for share in t.shares())
+        print(f"{name:<10} {sites:>6} {shares}{t.mean_distance():>9.2f}")
+
+def run(args):
+    radii = sorted(args.radius)
+    specs = args.network or list(NETWORKS.items())
+    with instrumentation.timer("load_facilities"):
+        networks = load_networks(specs, args.min_precision)
+    for network in networks:
+        print(f"{network.name}: {len(network)} facilities")
+
+    with instrumentation.timer("demand_coverage"):
+        totals, combined, _ = analyze_demand(args.demand_file, networks, radii, args.weight_column,
+                                             args.chunk_size, args.assignments)
+    print_summary(networks, totals, combined, radii)
+    save_facility_report(networks, totals, args.output)
+    print(f"\nPer-facility demand saved to {args.output}")
+    if args.assignments:
+        print(f"Nearest-facility assignments saved to {args.assignments}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Weighted share of demand points within X km of each warehouse network")
+    parser.add_argument("demand_file", help="CSV with Latitude, Longitude and an optional weight column")
+    parser.add_argument("--network", action="append", type=parse_network, metavar="NAME=FILE",
+                        help="Facility network (repeatable; default: Amazon and Walmart US files)")
+    parser.add_argument("--radius", type=float, nargs="+", default=RADII_KM, help="Coverage radii in km")
+    parser.add_argument("--weight-column", default=WEIGHT_COLUMN, help="Demand weight column (missing -> 1.0 per point)")
+    parser.add_argument("--min-precision", choices=warehouse_io.PRECISION_LEVELS, default="city",
+                        help="Ignore facilities geocoded more coarsely than this")
+    parser.add_argument("--output", default=OUTPUT_FILE, help="Per-facility assigned demand CSV")
+    parser.add_argument("--assignments", help="Also write every demand point's nearest facility per network to this CSV")
+    parser.add_argument("--chunk-size", type=int, default=warehouse_io.CHUNK_SIZE, help="Demand rows per chunk")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    with instrumentation.session("demand_coverage", args):
+        run(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import math
+import numpy as np
+
+# Hex-bin density layers for the folium maps.
+# Points are projected to Web Mercator (the projection the maps are drawn in)
+# and binned into pointy-top hexagons whose size is a fixed number of screen
+# pixels at a given zoom level, so every zoom level gets its own binning. The
+# binning is vectorized: cube-rounding of axial coordinates for all points at
+# once, then np.unique over the hex ids. Only the occupied hexagons end up in
+# the HTML, one small GeoJSON layer per zoom level, and a script on the map
+# shows the layer that matches the current zoom.
+
+HEX_PIXELS = 24              # Hexagon radius in screen pixels
+TILE_PIXELS = 256            # Web Mercator world width in pixels at zoom 0
+DENSITY_ZOOMS = [2, 4, 6, 8] # Each layer is shown from its zoom up to the next one
+MAX_ZOOM = 19
+MAX_MERCATOR_LAT = 85.05112878
+SQRT3 = math.sqrt(3.0)
+KEY_OFFSET = 1 << 30  # Keeps packed hex ids non-negative
+
+def to_mercator(lats, lons):
+    # Unit square: x east from the antimeridian, y south from the top edge
+    lat = np.radians(np.clip(np.asarray(lats, dtype=np.float64), -MAX_MERCATOR_LAT, MAX_MERCATOR_LAT))
+    x = (np.asarray(lons, dtype=np.float64) + 180.0) / 360.0
+    y = (1.0 - np.log(np.tan(lat) + 1.0 / np.cos(lat)) / math.pi) / 2.0
+    return x, y
+
+def from_mercator(x, y):
+    lat = np.degrees(np.arctan(np.sinh(math.pi * (1.0 - 2.0 * np.asarray(y)))))
+    lon = np.asarray(x) * 360.0 - 180.0
+    return lat, lon
+
+def hex_size(zoom, hex_pixels=HEX_PIXELS):
+    # Hexagon radius in unit-square coordinates
+    return hex_pixels / (TILE_PIXELS * 2.0 ** zoom)
+
+def hex_ids(lats, lons, size):
+    # Axial (q, r) of the hexagon containing each point
+    x, y = to_mercator(lats, lons)
+    q = (SQRT3 / 3.0 * x - y / 3.0) / size
+    r = (2.0 / 3.0 * y) / size
+    s = -q - r
+    rq, rr, rs = np.round(q), np.round(r), np.round(s)
+    dq, dr, ds = np.abs(rq - q), np.abs(rr - r), np.abs(rs - s)
+    # Cube rounding: fix the coordinate with the largest rounding error
+    fix_q = (dq > dr) & (dq > ds)
+    fix_r = ~fix_q & (dr > ds)
+    rq = np.where(fix_q, -rr - rs, rq)
+    rr = np.where(fix_r, -rq - rs, rr)
+    return rq.astype(np.int64), rr.astype(np.int64)
+
+def hex_bin(lats, lons, zoom, weights=None, hex_pixels=HEX_PIXELS):
+    # Occupied hexagons at one zoom level: (q, r, point count, summed weight)
+    if len(lats) == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty, np.empty(0)
+    q, r = hex_ids(lats, lons, hex_size(zoom, hex_pixels))
+    # Pack (q, r) into one int64 so np.unique works on a flat array
+    keys = ((q + KEY_OFFSET) << 32) | (r + KEY_OFFSET)
+    uniq, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    totals = np.bincount(inverse, weights=weights, minlength=len(uniq)) if weights is not None else counts.astype(np.float64)
+    return (uniq >> 32) - KEY_OFFSET, (uniq & 0xFFFFFFFF) - KEY_OFFSET, counts, totals
+
+def hex_polygons(q, r, size):
+    # (N, 7, 2) closed rings of [lon, lat] for each hexagon
+    cx = size * SQRT3 * (q + r / 2.0)
+    cy = size * 1.5 * r
+    angles = np.radians(30.0 + 60.0 * np.arange(7))
+    x = cx[:, None] + size * np.cos(angles)[None, :]
+    y = cy[:, None] + size * np.sin(angles)[None, :]
+    lat, lon = from_mercator(x, y)
+    return np.stack((lon, lat), axis=2)
+
+def density_geojson(lats, lons, zoom, weights=None, hex_pixels=HEX_PIXELS):
+    q, r, counts, totals = hex_bin(lats, lons, zoom, weights, hex_pixels)
+    rings = np.round(hex_polygons(q, r, hex_size(zoom, hex_pixels)), 4)
+    peak = float(totals.max()) if len(totals) else 1.0
+    features = []
+    for ring, count, total in zip(rings.tolist(), counts.tolist(), totals.tolist()):
+        features.append({
+            'type': "Feature",
+            'properties': {'count': count, 'weight': round(total, 3),
+                           # log scale so a few dense metros don't wash out everything else
+                           'level': round(math.log1p(total) / math.log1p(peak), 3) if peak > 0 else 0.0},
+            'geometry': {'type': "Polygon", 'coordinates': [ring]},
+        })
+    return {'type': "FeatureCollection", 'features': features}
+
+def _zoom_switch():
+    from branca.element import MacroElement
+    from jinja2 import Template
+
+    class ZoomSwitch(MacroElement):
+        # Shows exactly the layers whose [min_zoom, max_zoom) range contains the map zoom
+        _template = Template("""
+            {% macro script(this, kwargs) %}
+            (function() {
+                var map = {{ this._parent.get_name() }};
+                var layers = [{% for lo, hi, layer in this.layers %}[{{ lo }}, {{ hi }}, {{ layer.get_name() }}],{% endfor %}];
+                function update() {
+                    var z = map.getZoom();
+                    layers.forEach(function(entry) {
+                        var show = z >= entry[0] && z < entry[1];
+                        if (show && !map.hasLayer(entry[2])) { map.addLayer(entry[2]); }
+                        if (!show && map.hasLayer(entry[2])) { map.removeLayer(entry[2]); }
+                    });
+                }
+                map.on('zoomend', update);
+                update();
+            })();
+            {% endmacro %}
+        """)
+
+        def __init__(self, layers):
+            super().__init__()
+            self._name = "ZoomSwitch"
+            self.layers = layers
+
+    return ZoomSwitch
+
+def add_density_layers(m, lats, lons, name, color, weights=None, zooms=DENSITY_ZOOMS, hex_pixels=HEX_PIXELS):
+    # One hex layer per zoom level, switched by the map's zoom; replaces per-point markers
+    import folium
+
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    zooms = sorted(zooms)
+    ranges = [(z, zooms[i + 1] if i + 1 < len(zooms) else MAX_ZOOM + 1) for i, z in enumerate(zooms)]
+    # The coarsest layer also covers zooms below it
+    ranges[0] = (0, ranges[0][1])
+    layers = []
+    for (lo, hi), zoom in zip(ranges, zooms):
+        layer = folium.GeoJson(
+            density_geojson(lats, lons, zoom, weights, hex_pixels),
+            name=f"{name} density (zoom {zoom})",
+            style_function=lambda feature, color=color: {
+                'fillColor': color, 'color': color, 'weight': 1,
+                'fillOpacity': 0.15 + 0.7 * feature['properties']['level']},
+            tooltip=folium.GeoJsonTooltip(fields=['count'], aliases=[f"{name} warehouses"]),
+            control=False,
+        )
+        layer.add_to(m)
+        layers.append((lo, hi, layer))
+    _zoom_switch()(layers).add_to(m)
+    return m
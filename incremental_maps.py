@@ -0,0 +1,220 @@
+import argparse
+import glob
+import json
+import os
+from string import Template
+from cache_utils import digest
+import instrumentation
+from map_rendering import WORLD_VIEW, load_points, region_color
+
+# Incremental maps: a static HTML shell plus one GeoJSON file per region.
+# The shell never changes; it reads manifest.json and fetches a region's
+# GeoJSON only when that region is switched on and in view. Each region's
+# file is keyed by a hash of its rows, colour and popup template, so a
+# rerun rewrites only the regions whose data changed (plus the manifest).
+# Browsers do not allow fetch() from file:// pages, so serve the map
+# directory over HTTP (python3 -m http.server) to view it.
+
+MAPS_DIR = "maps"
+GLOBAL_DATA_DIR = "global_data"
+US_FILE = "amazon_warehouses_filled.csv"
+STRATEGIC_FILE = "amazon_strategic_locations.csv"
+COORD_DECIMALS = 6
+
+SHELL = Template("""<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8"/>
+    <meta name="viewport" content="width=device-width, initial-scale=1.0"/>
+    <title>$title</title>
+    <link rel="stylesheet" href="https://cdn.jsdelivr.net/npm/leaflet@1.9.3/dist/leaflet.css"/>
+    <link rel="stylesheet" href="https://netdna.bootstrapcdn.com/bootstrap/3.0.0/css/bootstrap-glyphicons.css"/>
+    <link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/Leaflet.awesome-markers/2.0.2/leaflet.awesome-markers.css"/>
+    <script src="https://cdn.jsdelivr.net/npm/leaflet@1.9.3/dist/leaflet.js"></script>
+    <script src="https://cdnjs.cloudflare.com/ajax/libs/Leaflet.awesome-markers/2.0.2/leaflet.awesome-markers.js"></script>
+    <style>html, body, #map { width: 100%; height: 100%; margin: 0; padding: 0; }</style>
+</head>
+<body>
+<div id="map"></div>
+<script>
+var map = L.map('map');
+L.tileLayer('https://tile.openstreetmap.org/{z}/{x}/{y}.png', {
+    maxZoom: 19, attribution: '&copy; <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors'
+}).addTo(map);
+var control = L.control.layers(null, {}, {collapsed: false}).addTo(map);
+
+function escape(value) {
+    return String(value).replace(/[&<>"']/g, function(c) { return '&#' + c.charCodeAt(0) + ';'; });
+}
+
+fetch('manifest.json', {cache: 'no-cache'}).then(function(r) { return r.json(); }).then(function(manifest) {
+    map.setView(manifest.view.location, manifest.view.zoom_start);
+    var regions = Object.keys(manifest.regions).map(function(name) {
+        var region = manifest.regions[name];
+        region.layer = L.featureGroup().addTo(map);
+        control.addOverlay(region.layer, name + ' (' + region.count + ')');
+        return region;
+    });
+
+    function marker(region, latlng) {
+        if (manifest.icon) {
+            return L.marker(latlng, {icon: L.AwesomeMarkers.icon({
+                markerColor: region.color, iconColor: 'white', icon: manifest.icon, prefix: 'glyphicon'})});
+        }
+        return L.circleMarker(latlng, {radius: 5, color: region.color, fill: true, fillColor: region.color, fillOpacity: 0.7});
+    }
+
+    function popup(region, properties) {
+        return region.popup.replace(/\\{(\\w+)\\}/g, function(_, field) { return escape(properties[field] || ''); });
+    }
+
+    // Fetch a region the first time it is switched on and overlaps the view
+    function loadVisible() {
+        var view = map.getBounds();
+        regions.forEach(function(region) {
+            if (region.loaded || !map.hasLayer(region.layer) || !view.intersects(L.latLngBounds(region.bounds))) {
+                return;
+            }
+            region.loaded = true;
+            fetch(region.file + '?v=' + region.hash).then(function(r) { return r.json(); }).then(function(data) {
+                L.geoJSON(data, {
+                    pointToLayer: function(feature, latlng) { return marker(region, latlng); },
+                    onEachFeature: function(feature, layer) {
+                        layer.bindPopup(function() { return popup(region, feature.properties); });
+                    }
+                }).addTo(region.layer);
+            });
+        });
+    }
+    map.on('moveend overlayadd', loadVisible);
+    loadVisible();
+});
+</script>
+</body>
+</html>
+""")
+
+def global_regions():
+    # region -> (lats, lons, columns, popup), one region per global_data file plus the US file
+    regions = {}
+    for filename in sorted(glob.glob(os.path.join(GLOBAL_DATA_DIR, "*.csv"))):
+        region = os.path.basename(filename).replace("amazon_", "").replace(".csv", "")
+        lats, lons, columns = load_points(filename, ['Name', 'City', 'Country'])
+        regions[region] = (lats, lons, columns, "<b>{Name}</b><br>{City}, {Country}")
+    if os.path.exists(US_FILE):
+        lats, lons, columns = load_points(US_FILE, ['Name', 'City', 'State'])
+        regions["usa"] = (lats, lons, columns, "<b>{Name}</b><br>{City}, {State}, USA")
+    return regions
+
+def strategic_regions():
+    lats, lons, columns = load_points(STRATEGIC_FILE, ['Name', 'City', 'Country', 'Region'])
+    regions = {}
+    for i, region in enumerate(columns['Region']):
+        entry = regions.setdefault(region, ([], [], {'Name': [], 'City': [], 'Country': []},
+                                            "<b>{Name}</b><br>{City}, {Country}<br><i>Strategic Location</i>"))
+        entry[0].append(lats[i])
+        entry[1].append(lons[i])
+        for field in entry[2]:
+            entry[2][field].append(columns[field][i])
+    return regions
+
+# name -> (title, region loader, marker icon or None for circle markers)
+MAPS = {
+    "global": ("Amazon warehouses", global_regions, None),
+    "strategic": ("Strategic locations", strategic_regions, "star"),
+}
+
+def region_geojson(lats, lons, columns):
+    fields = list(columns)
+    features = []
+    for i, (lat, lon) in enumerate(zip(lats, lons)):
+        features.append({
+            'type': "Feature",
+            'properties': {f: columns[f][i] for f in fields},
+            'geometry': {'type': "Point", 'coordinates': [round(lon, COORD_DECIMALS), round(lat, COORD_DECIMALS)]},
+        })
+    return {'type': "FeatureCollection", 'features': features}
+
+def _write_if_changed(filename, text):
+    # Atomic replace so a browser never reads a half-written file; unchanged files keep their mtime
+    if os.path.exists(filename):
+        with open(filename, 'r', encoding='utf-8') as f:
+            if f.read() == text:
+                return False
+    tmp = filename + ".tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp, filename)
+    return True
+
+def _region_file(region):
+    return f"regions/{region}.geojson"
+
+def update_map(name, maps_dir=MAPS_DIR):
+    # Returns {region: "added" | "updated" | "unchanged" | "removed"}
+    title, load_regions, icon = MAPS[name]
+    out_dir = os.path.join(maps_dir, name)
+    os.makedirs(os.path.join(out_dir, "regions"), exist_ok=True)
+    manifest_file = os.path.join(out_dir, "manifest.json")
+    old = {}
+    if os.path.exists(manifest_file):
+        with open(manifest_file, 'r') as f:
+            old = json.load(f).get('regions', {})
+
+    _write_if_changed(os.path.join(out_dir, "index.html"), SHELL.substitute(title=title))
+
+    status = {}
+    entries = {}
+    for region, (lats, lons, columns, popup) in load_regions().items():
+        if not lats:
+            continue
+        color = region_color(region)
+        key = digest("region", [round(v, COORD_DECIMALS) for v in lats], [round(v, COORD_DECIMALS) for v in lons],
+                     sorted(columns.items()), popup, color)[:16]
+        path = os.path.join(out_dir, _region_file(region))
+        if region in old and old[region]['hash'] == key and os.path.exists(path):
+            status[region] = "unchanged"
+        else:
+            with instrumentation.timer("write_region"):
+                text = json.dumps(region_geojson(lats, lons, columns), separators=(',', ':'))
+                _write_if_changed(path, text)
+            status[region] = "updated" if region in old else "added"
+            instrumentation.incr("regions_written")
+        entries[region] = {
+            'file': _region_file(region), 'hash': key, 'count': len(lats), 'color': color, 'popup': popup,
+            'bounds': [[min(lats), min(lons)], [max(lats), max(lons)]],
+        }
+
+    for region in old:
+        if region not in entries:
+            path = os.path.join(out_dir, _region_file(region))
+            if os.path.exists(path):
+                os.remove(path)
+            status[region] = "removed"
+
+    manifest = {'view': WORLD_VIEW, 'icon': icon, 'regions': entries}
+    _write_if_changed(manifest_file, json.dumps(manifest, indent=1, sort_keys=True))
+    return status
+
+def main():
+    parser = argparse.ArgumentParser(description="Write maps as a static shell plus per-region GeoJSON, updating only changed regions")
+    parser.add_argument("maps", nargs="*", help=f"Maps to update (default: {', '.join(MAPS)})")
+    parser.add_argument("--maps-dir", default=MAPS_DIR, help="Output directory (one subdirectory per map)")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    names = args.maps or list(MAPS)
+    unknown = [name for name in names if name not in MAPS]
+    if unknown:
+        parser.error(f"unknown map(s): {', '.join(unknown)}")
+
+    with instrumentation.session("incremental_maps", args):
+        for name in names:
+            status = update_map(name, args.maps_dir)
+            changed = sorted(region for region, s in status.items() if s != "unchanged")
+            print(f"{name}: {len(changed)} of {len(status)} regions changed"
+                  + (f" ({', '.join(f'{r} {status[r]}' for r in changed)})" if changed else ""))
+        print(f"Serve with: python3 -m http.server --directory {args.maps_dir}")
+
+if __name__ == "__main__":
+    main()
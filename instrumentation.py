@@ -0,0 +1,99 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Lightweight run instrumentation shared by the entry-point scripts.
+# timer()/incr() are cheap enough for inner loops; session() wraps a script's
+# main body, optionally under cProfile, and emits one JSON record per run.
+# Updates take a lock, since pipeline stages run in threads.
+
+RUN_LOG = os.path.join(".cache", "run_metrics.jsonl")
+PROFILE_TOP = 30
+
+_timers = {}    # name -> [calls, total seconds]
+_counters = {}  # name -> count
+_lock = threading.Lock()
+
+def incr(name, n=1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+@contextmanager
+def timer(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        with _lock:
+            entry = _timers.setdefault(name, [0, 0.0])
+            entry[0] += 1
+            entry[1] += elapsed
+
+def merge(record):
+    # Adds a snapshot() taken elsewhere (e.g. in a worker process) into this process's metrics
+    with _lock:
+        for name, entry in record['timers'].items():
+            total = _timers.setdefault(name, [0, 0.0])
+            total[0] += entry['calls']
+            total[1] += entry['seconds']
+        for name, n in record['counters'].items():
+            _counters[name] = _counters.get(name, 0) + n
+
+def reset():
+    with _lock:
+        _timers.clear()
+        _counters.clear()
+
+def snapshot():
+    with _lock:
+        return {
+            'timers': {name: {'calls': calls, 'seconds': round(total, 6)} for name, (calls, total) in sorted(_timers.items())},
+            'counters': dict(sorted(_counters.items()))
+        }
+
+def add_arguments(parser):
+    parser.add_argument("--profile", action="store_true", help="Run under cProfile and write <script>.prof plus a text report")
+    parser.add_argument("--metrics", help=f"Also write this run's metrics JSON to this file (always appended to {RUN_LOG})")
+
+@contextmanager
+def session(script, args):
+    reset()
+    profiler = cProfile.Profile() if getattr(args, 'profile', False) else None
+    started = time.time()
+    if profiler:
+        profiler.enable()
+    try:
+        with timer("total"):
+            yield
+    finally:
+        if profiler:
+            profiler.disable()
+            _write_profile(script, profiler)
+
+        record = {'script': script, 'started': round(started, 3), 'argv': sys.argv[1:]}
+        record.update(snapshot())
+        os.makedirs(os.path.dirname(RUN_LOG), exist_ok=True)
+        with open(RUN_LOG, 'a') as f:
+            f.write(json.dumps(record) + "\n")
+        if getattr(args, 'metrics', None):
+            with open(args.metrics, 'w') as f:
+                json.dump(record, f, indent=2)
+            print(f"Run metrics written to {args.metrics}")
+
+def _write_profile(script, profiler):
+    prof_file = f"{script}.prof"
+    report_file = f"{script}_profile.txt"
+    profiler.dump_stats(prof_file)
+    buffer = io.StringIO()
+    stats = pstats.Stats(profiler, stream=buffer)
+    stats.sort_stats('cumulative').print_stats(PROFILE_TOP)
+    with open(report_file, 'w') as f:
+        f.write(buffer.getvalue())
+    print(f"Profile saved to {prof_file} (top {PROFILE_TOP} by cumulative time in {report_file})")
@@ -0,0 +1,131 @@
+import math
+import numpy as np
+from spatial_index import to_unit_vectors
+
+# Criteria for choosing k from a range of fitted clusterings.
+# Silhouette (in select_strategic_locations) needs all pairwise distances; the
+# criteria here only need per-cluster statistics -- member weight, mean and
+# scatter around the mean -- so each costs O(N*k) on top of the fits:
+#
+#   elbow              knee of the within-cluster sum of squares curve: the k
+#                      furthest below the chord from the first to the last k
+#   calinski_harabasz  between- / within-cluster dispersion, each per degree of
+#                      freedom (higher is better)
+#   davies_bouldin     mean over clusters of the worst (s_i + s_j) / d(c_i, c_j),
+#                      s = mean distance to the centre (lower is better)
+#   bic                Bayesian information criterion of a spherical Gaussian
+#                      mixture with one shared variance, as in X-means
+#   combined           mean rank over the four criteria above
+#
+# Statistics are taken in the space K-Means clusters in: the lat/lon plane for
+# the euclidean metric, 3-D unit vectors for the spherical one. Every score is
+# oriented so that higher is better; ties go to the smaller k.
+
+FAST_CRITERIA = ["elbow", "calinski_harabasz", "davies_bouldin", "bic"]
+K_CRITERIA = ["silhouette"] + FAST_CRITERIA + ["combined"]
+MIN_VARIANCE = 1e-12  # Keeps BIC finite when every cluster is a stack of identical points
+
+def embed(data, metric="euclidean"):
+    if metric == "spherical":
+        return to_unit_vectors([p[0] for p in data], [p[1] for p in data])
+    return np.asarray(data, dtype=np.float64)
+
+class ClusterStats:
+    def __init__(self, points, labels, k, weights=None):
+        labels = np.asarray(labels)
+        weights = np.ones(len(points)) if weights is None else np.asarray(weights, dtype=np.float64)
+        self.k = k
+        self.dims = points.shape[1]
+        self.sizes = np.bincount(labels, weights=weights, minlength=k)
+        self.total = float(self.sizes.sum())
+        sums = np.zeros((k, self.dims))
+        np.add.at(sums, labels, points * weights[:, None])
+        filled = self.sizes > 0
+        self.centers = np.zeros((k, self.dims))
+        self.centers[filled] = sums[filled] / self.sizes[filled, None]
+        self.mean = sums.sum(axis=0) / self.total
+
+        offset = points - self.centers[labels]
+        sq = (offset ** 2).sum(axis=1)
+        self.within = np.bincount(labels, weights=sq * weights, minlength=k)  # Per-cluster sum of squares
+        spread = np.bincount(labels, weights=np.sqrt(sq) * weights, minlength=k)
+        self.scatter = np.where(filled, spread / np.where(filled, self.sizes, 1.0), 0.0)
+        self.total_ss = float((((points - self.mean) ** 2).sum(axis=1) * weights).sum())
+        self.filled = filled
+
+    def wss(self):
+        return float(self.within.sum())
+
+def calinski_harabasz(stats):
+    k = int(stats.filled.sum())
+    wss = stats.wss()
+    if k < 2 or stats.total <= k:
+        return 0.0
+    if wss <= 0:
+        return math.inf
+    return ((stats.total_ss - wss) / (k - 1)) / (wss / (stats.total - k))
+
+def davies_bouldin(stats):
+    # Returned negated so that higher is better, like the other criteria
+    centers = stats.centers[stats.filled]
+    scatter = stats.scatter[stats.filled]
+    if len(centers) < 2:
+        return -math.inf
+    gap = np.sqrt(((centers[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2))
+    ratio = (scatter[:, None] + scatter[None, :]) / np.where(gap > 0, gap, np.nan)
+    np.fill_diagonal(ratio, -np.inf)
+    ratio = np.where(np.isnan(ratio), np.inf, ratio)
+    return -float(ratio.max(axis=1).mean())
+
+def bic(stats):
+    n = stats.total
+    sizes = stats.sizes[stats.filled]
+    k = len(sizes)
+    d = stats.dims
+    if n <= k:
+        return -math.inf
+    variance = max(stats.wss() / ((n - k) * d), MIN_VARIANCE)
+    log_likelihood = float((sizes * np.log(sizes) - sizes * math.log(n)
+                            - sizes * d / 2.0 * math.log(2.0 * math.pi * variance)
+                            - (sizes - 1) * d / 2.0).sum())
+    return log_likelihood - 0.5 * k * (d + 1) * math.log(n)
+
+def elbow_scores(ks, wss):
+    # Height of each point below the chord joining the first and last k, on normalized axes
+    ks = np.asarray(ks, dtype=np.float64)
+    wss = np.asarray(wss, dtype=np.float64)
+    if len(ks) < 3 or wss.max() == wss.min():
+        return [0.0] * len(ks)
+    x = (ks - ks[0]) / (ks[-1] - ks[0])
+    y = (wss - wss.min()) / (wss.max() - wss.min())
+    chord = y[0] + (y[-1] - y[0]) * x
+    return (chord - y).tolist()
+
+def rank_scores(ks, scores):
+    # Rank of each k (1 = best); equal scores share the better rank
+    order = sorted(range(len(ks)), key=lambda i: (-scores[i], ks[i]))
+    ranks = [0] * len(ks)
+    for position, i in enumerate(order):
+        previous = order[position - 1] if position else None
+        ranks[i] = ranks[previous] if previous is not None and scores[previous] == scores[i] else position + 1
+    return ranks
+
+def score_criteria(ks, stats_by_k):
+    # {criterion: [score per k]} for FAST_CRITERIA plus "combined" (negated mean rank)
+    scores = {
+        "elbow": elbow_scores(ks, [stats_by_k[k].wss() for k in ks]),
+        "calinski_harabasz": [calinski_harabasz(stats_by_k[k]) for k in ks],
+        "davies_bouldin": [davies_bouldin(stats_by_k[k]) for k in ks],
+        "bic": [bic(stats_by_k[k]) for k in ks],
+    }
+    ranks = [rank_scores(ks, scores[c]) for c in FAST_CRITERIA]
+    scores["combined"] = [-sum(r[i] for r in ranks) / len(ranks) for i in range(len(ks))]
+    return scores
+
+def best_k(ks, scores):
+    # Highest score; the smallest k wins ties
+    best = 0
+    for i in range(1, len(ks)):
+        if scores[i] > scores[best]:
+            best = i
+    return ks[best]
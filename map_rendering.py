@@ -0,0 +1,200 @@
+import argparse
+import json
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import instrumentation
+import warehouse_io
+from warehouse_paths import FILTERED_FILE, FILTERED_MAP, GLOBAL_MAP
+
+# Shared folium rendering for the warehouse maps.
+# Instead of one folium object (and one block of generated JavaScript) per
+# marker, every layer is written as a single JSON array of rows plus one
+# popup template; a short script on the page builds the markers from it.
+# This keeps the HTML small and the Python side cheap, since no per-marker
+# objects are created or rendered. Several maps can be rendered in parallel
+# worker processes.
+
+ARCHIVE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "archive")
+
+# Marker colours per region (file name without "amazon_" / ".csv")
+REGION_COLORS = {
+    "canada": "red",
+    "mexico": "green",
+    "europe": "blue",
+    "china": "purple",
+    "japan": "orange",
+    "india": "darkred",
+    "australia": "darkblue",
+    "brazil": "darkgreen",
+    "egypt": "black",
+    "saudi_arabia": "gray",
+    "united_arab_emirates": "gray",
+    "singapore": "pink",
+    "pakistan": "lightgreen",
+    "usa": "orange"
+}
+DEFAULT_COLOR = "cadetblue"
+
+WORLD_VIEW = {'location': [20, 0], 'zoom_start': 2}
+US_VIEW = {'location': [39.8283, -98.5795], 'zoom_start': 4}
+
+COORD_DECIMALS = 6
+POPUP_FIELD = re.compile(r"\{(\w+)\}")
+
+def region_color(region):
+    return REGION_COLORS.get(region, DEFAULT_COLOR)
+
+def new_map(view=WORLD_VIEW):
+    import folium
+    return folium.Map(**view)
+
+def load_points(filename, fields):
+    # (lats, lons, {field: values}) for the valid rows of a CSV; rejects are reported
+    report = warehouse_io.LoadReport(filename)
+    lats, lons = [], []
+    columns = {field: [] for field in fields}
+    for chunk in warehouse_io.iter_chunks(filename, report=report):
+        lats.extend(chunk.lat.tolist())
+        lons.extend(chunk.lon.tolist())
+        for field in fields:
+            columns[field].extend(chunk.columns.get(field, [''] * len(chunk)))
+    if report.rejected:
+        print(f"  Warning: {report.summary()}")
+        instrumentation.incr("rows_skipped", report.rejected)
+    return lats, lons, columns
+
+def _popup_parts(template, fields):
+    # "<b>{Name}</b>" -> ["<b>", 0, "</b>"]: literal HTML and indices into the row's fields
+    parts = []
+    for i, piece in enumerate(POPUP_FIELD.split(template)):
+        if i % 2:
+            parts.append(fields.index(piece))
+        elif piece:
+            parts.append(piece)
+    return parts
+
+def _marker_layer():
+    from branca.element import MacroElement
+    from jinja2 import Template
+
+    class MarkerLayer(MacroElement):
+        # Rows are [lat, lon, field values...]; popups are built only when opened
+        _template = Template("""
+            {% macro script(this, kwargs) %}
+            (function() {
+                var parts = {{ this.parts }};
+                var rows = {{ this.rows }};
+                var layer = L.featureGroup().addTo({{ this._parent.get_name() }});
+                function escape(value) {
+                    return String(value).replace(/[&<>"']/g, function(c) { return '&#' + c.charCodeAt(0) + ';'; });
+                }
+                function popup(row) {
+                    return parts.map(function(p) { return typeof p === 'number' ? escape(row[p + 2]) : p; }).join('');
+                }
+                rows.forEach(function(row) {
+                    {% if this.icon %}
+                    var marker = L.marker([row[0], row[1]], {icon: L.AwesomeMarkers.icon({{ this.icon }})});
+                    {% else %}
+                    var marker = L.circleMarker([row[0], row[1]], {{ this.style }});
+                    {% endif %}
+                    marker.bindPopup(function() { return popup(row); }, {maxWidth: '100%'}).addTo(layer);
+                });
+            })();
+            {% endmacro %}
+        """)
+
+        def __init__(self, rows, parts, style=None, icon=None):
+            super().__init__()
+            self._name = "MarkerLayer"
+            self.rows = json.dumps(rows, separators=(',', ':'))
+            self.parts = json.dumps(parts)
+            self.style = json.dumps(style) if style else None
+            self.icon = json.dumps(icon) if icon else None
+
+    return MarkerLayer
+
+def add_markers(m, lats, lons, columns, popup, color, radius=5, fill_opacity=None, icon=None):
+    # One layer of circle markers (or awesome-marker icons when icon is set) from arrays;
+    # popup is an HTML template with {Field} placeholders filled from columns
+    fields = list(columns)
+    values = [columns[f] for f in fields]
+    rows = [[round(float(lat), COORD_DECIMALS), round(float(lon), COORD_DECIMALS), *row]
+            for lat, lon, *row in zip(lats, lons, *values)]
+    style = None
+    marker_icon = None
+    if icon:
+        marker_icon = {'markerColor': color, 'iconColor': "white", 'icon': icon, 'prefix': "glyphicon"}
+    else:
+        style = {'radius': radius, 'color': color, 'fill': True, 'fillColor': color}
+        if fill_opacity is not None:
+            style['fillOpacity'] = fill_opacity
+    _marker_layer()(rows, _popup_parts(popup, fields), style=style, icon=marker_icon).add_to(m)
+    instrumentation.incr("markers", len(rows))
+    return m
+
+def add_region_markers(m, lats, lons, columns, popup, region_field='Region', **options):
+    # One layer per region, coloured from REGION_COLORS
+    groups = {}
+    for i, region in enumerate(columns[region_field]):
+        groups.setdefault(region, []).append(i)
+    for region, idx in groups.items():
+        add_markers(m, [lats[i] for i in idx], [lons[i] for i in idx],
+                    {f: [v[i] for i in idx] for f, v in columns.items()}, popup, region_color(region), **options)
+    return m
+
+def save_map(m, output_map):
+    with instrumentation.timer("save"):
+        m.save(output_map)
+    return output_map
+
+def _render(task):
+    # Worker entry point: (module name, function name, kwargs) -> None, or the error for a missing input
+    module_name, function_name, kwargs = task
+    if ARCHIVE_DIR not in sys.path:
+        sys.path.insert(0, ARCHIVE_DIR)
+    module = __import__(module_name)
+    try:
+        getattr(module, function_name)(**kwargs)
+    except FileNotFoundError as e:
+        return f"missing input {e.filename}"
+    return None
+
+def render_parallel(tasks, jobs=None):
+    # tasks: [(module name, function name, kwargs)]; each map is built and saved in its own process
+    if jobs == 1 or len(tasks) <= 1:
+        return [_render(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(_render, tasks))
+
+# Standard maps: name -> (module, render function, kwargs); paths as in the warehouse_analysis.py pipeline
+MAPS = {
+    "global": ("map_global_warehouses", "main", {'output_map': GLOBAL_MAP}),
+    "filtered": ("map_filtered_warehouses", "main", {'input_file': FILTERED_FILE, 'output_map': FILTERED_MAP}),
+    "strategic": ("map_strategic_locations", "render_map", {}),
+    "us": ("analyze_locations", "render_map", {}),
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="Render several warehouse maps in parallel")
+    parser.add_argument("maps", nargs="*", help=f"Maps to render (default: all of {', '.join(MAPS)})")
+    parser.add_argument("--jobs", type=int, default=0, help="Worker processes (0 = one per map)")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    names = args.maps or list(MAPS)
+    unknown = [name for name in names if name not in MAPS]
+    if unknown:
+        parser.error(f"unknown map(s): {', '.join(unknown)}")
+    with instrumentation.session("map_rendering", args):
+        with instrumentation.timer("render"):
+            errors = render_parallel([MAPS[name] for name in names], args.jobs or len(names))
+        rendered = [name for name, error in zip(names, errors) if error is None]
+        print(f"Rendered {len(rendered)} maps: {', '.join(rendered)}")
+        for name, error in zip(names, errors):
+            if error is not None:
+                print(f"  Skipped {name}: {error}")
+
+if __name__ == "__main__":
+    main()
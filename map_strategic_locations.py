@@ -1,60 +1,37 @@
-import csv
-import folium
+import argparse
+import instrumentation
+from map_rendering import WORLD_VIEW, add_region_markers, load_points, new_map, save_map
 
 INPUT_FILE = "amazon_strategic_locations.csv"
 OUTPUT_MAP = "amazon_strategic_map.html"
 
 def main():
-    # Create map centered on Europe/Africa view to start, zoom out
-    m = folium.Map(location=[20, 0], zoom_start=2)
-    
-    # Colors for different regions/groups
-    colors = {
-        "canada": "red",
-        "mexico": "green",
-        "europe": "blue",
-        "china": "purple",
-        "japan": "orange",
-        "india": "darkred",
-        "australia": "darkblue",
-        "brazil": "darkgreen",
-        "egypt": "black",
-        "saudi_arabia": "gray",
-        "united_arab_emirates": "gray",
-        "singapore": "pink",
-        "pakistan": "lightgreen",
-        "usa": "orange"
-    }
-    
+    parser = argparse.ArgumentParser(description="Render the strategic locations map")
+    parser.add_argument("--service-areas", action="store_true", help="Overlay every warehouse's service area (see service_areas.py)")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    with instrumentation.session("map_strategic_locations", args):
+        render_map(service_areas=args.service_areas)
+
+def render_map(service_areas=False):
+    # Centered on Europe/Africa, zoomed out
+    m = new_map(WORLD_VIEW)
+
     print(f"Reading {INPUT_FILE}...")
-    
-    with open(INPUT_FILE, 'r') as f:
-        reader = csv.DictReader(f)
-        count = 0
-        for row in reader:
-            try:
-                lat = float(row['Latitude'])
-                lon = float(row['Longitude'])
-                name = row['Name']
-                city = row['City']
-                country = row['Country']
-                region = row['Region']
-                
-                color = colors.get(region, "cadetblue")
-                
-                # Make markers bigger and more distinct
-                folium.Marker(
-                    location=[lat, lon],
-                    popup=f"<b>{name}</b><br>{city}, {country}<br><i>Strategic Location</i>",
-                    icon=folium.Icon(color=color, icon='star')
-                ).add_to(m)
-                
-                count += 1
-            except ValueError:
-                continue
-                
-    m.save(OUTPUT_MAP)
-    print(f"Map saved to {OUTPUT_MAP} with {count} strategic locations.")
+    lats, lons, columns = load_points(INPUT_FILE, ['Name', 'City', 'Country', 'Region'])
+
+    # Star icons so strategic sites stand out from the circle markers of the other maps
+    add_region_markers(m, lats, lons, columns,
+                       "<b>{Name}</b><br>{City}, {Country}<br><i>Strategic Location</i>", icon='star')
+
+    if service_areas:
+        from service_areas import add_overlay, load_service_areas
+        with instrumentation.timer("service_areas"):
+            add_overlay(m, load_service_areas().to_geojson())
+
+    save_map(m, OUTPUT_MAP)
+    print(f"Map saved to {OUTPUT_MAP} with {len(lats)} strategic locations.")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,278 @@
+import argparse
+import csv
+import math
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from spatial_index import KM_PER_DEG, EARTH_RADIUS_KM, haversine_km
+import instrumentation
+import warehouse_io
+
+# Out-of-core nearest-neighbour join: for every query point (e.g. customers or
+# Walmart sites) find the nearest target point (e.g. Amazon warehouses).
+# Both inputs are streamed in chunks and spilled to per-cell shard files on
+# disk. Each query shard is then joined in a worker process against target
+# shards in growing rings of cells around it, until every query point's best
+# distance is closer than anything outside the ring can be. A dense query
+# shard is read and joined in slices, and the slices' per-point arrays and the
+# distance blocks each get half of memory_mb, so a worker never holds more
+# than memory_mb of working arrays.
+# Ties go to the lowest target index, as in the in-memory join, so both give
+# identical output.
+
+SHARD_DEG = 2.0
+MEMORY_MB = 256
+OUTPUT_FILE = "nearest_join.csv"
+SPILL_PARENT = os.path.join(".cache", "ooc_join")
+
+SPILL_DTYPE = np.dtype([('idx', '<i8'), ('lat', '<f8'), ('lon', '<f8')])
+BYTES_PER_PAIR = 8 * 8  # float64 temporaries per (query, target) pair inside haversine_km
+BYTES_PER_QUERY = 160   # Spilled record, coordinates, running best, active set and ring-bound temporaries
+
+def _query_slices(n_query, memory_mb):
+    # (start, stop) record ranges of a query shard whose per-point arrays fit in half the budget
+    size = max(1, int(memory_mb * 1024 * 1024 // 2 // BYTES_PER_QUERY))
+    return [(start, min(start + size, n_query)) for start in range(0, n_query, size)]
+
+def _block_sizes(n_query, memory_mb):
+    # Query rows x target rows per distance block within the memory budget
+    pairs = max(1, int(memory_mb * 1024 * 1024 // BYTES_PER_PAIR))
+    q_block = max(1, min(n_query, int(math.sqrt(pairs))))
+    return q_block, max(1, pairs // q_block)
+
+def _update_best(best_dist, best_idx, q_lat, q_lon, t_idx, t_lat, t_lon, memory_mb):
+    # In-place running minimum over one set of targets; ties -> lowest target index
+    q_block, t_block = _block_sizes(len(q_lat), memory_mb)
+    for qs in range(0, len(q_lat), q_block):
+        qe = qs + q_block
+        for ts in range(0, len(t_lat), t_block):
+            te = ts + t_block
+            dist = haversine_km(q_lat[qs:qe, None], q_lon[qs:qe, None], t_lat[None, ts:te], t_lon[None, ts:te])
+            col = np.argmin(dist, axis=1)
+            rows = np.arange(len(col))
+            d = dist[rows, col]
+            i = t_idx[ts:te][col]
+            # argmin picks the first of equal distances; t_idx is ascending within a block
+            cur_d = best_dist[qs:qe]
+            cur_i = best_idx[qs:qe]
+            better = (d < cur_d) | ((d == cur_d) & (i < cur_i))
+            cur_d[better] = d[better]
+            cur_i[better] = i[better]
+
+def nearest_join(q_lat, q_lon, t_lat, t_lon, memory_mb=MEMORY_MB):
+    # In-memory reference join: (nearest target index, distance km) per query point
+    q_lat = np.asarray(q_lat, dtype=np.float64)
+    q_lon = np.asarray(q_lon, dtype=np.float64)
+    best_dist = np.full(len(q_lat), np.inf)
+    best_idx = np.full(len(q_lat), -1, dtype=np.int64)
+    t_idx = np.arange(len(t_lat), dtype=np.int64)
+    _update_best(best_dist, best_idx, q_lat, q_lon, t_idx,
+                 np.asarray(t_lat, dtype=np.float64), np.asarray(t_lon, dtype=np.float64), memory_mb)
+    return best_idx, best_dist
+
+class ShardGrid:
+    # Cells are shrunk slightly if needed so whole numbers of them span 180 and 360 degrees
+    def __init__(self, shard_deg=SHARD_DEG):
+        self.n_rows = max(1, int(round(180.0 / shard_deg)))
+        self.n_cols = max(1, int(round(360.0 / shard_deg)))
+        self.row_deg = 180.0 / self.n_rows
+        self.col_deg = 360.0 / self.n_cols
+
+    def cells(self, lats, lons):
+        rows = np.clip(np.floor((lats + 90.0) / self.row_deg).astype(np.int64), 0, self.n_rows - 1)
+        cols = np.floor((lons + 180.0) / self.col_deg).astype(np.int64) % self.n_cols
+        return rows, cols
+
+    def ring_distance(self, row, col, cells):
+        # Chebyshev distance in cells from (row, col) to each of `cells` (longitude wraps)
+        cells = np.asarray(cells, dtype=np.int64).reshape(-1, 2)
+        dr = np.abs(cells[:, 0] - row)
+        dc = np.abs(cells[:, 1] - col)
+        return np.maximum(dr, np.minimum(dc, self.n_cols - dc))
+
+    def outside_bound_km(self, lats, lons, row, col, k):
+        # Lower bound on the distance from each point to anything more than k cells away
+        bound = np.full(len(lats), np.inf)
+        if row - k > 0:
+            south = -90.0 + (row - k) * self.row_deg
+            bound = np.minimum(bound, (lats - south) * KM_PER_DEG)
+        if row + k < self.n_rows - 1:
+            north = -90.0 + (row + k + 1) * self.row_deg
+            bound = np.minimum(bound, (north - lats) * KM_PER_DEG)
+        if 2 * k + 1 < self.n_cols:
+            # Distance to the great circle through the nearest block edge meridian
+            # (past 90 degrees the nearest point of that meridian is the pole, same bound as at 90)
+            west = -180.0 + (col - k) * self.col_deg
+            east = -180.0 + (col + k + 1) * self.col_deg
+            local = (lons + 180.0) % 360.0 - 180.0
+            dlon = np.minimum(local - west, east - local)
+            sin_d = np.sin(np.radians(np.minimum(dlon, 90.0)))
+            ratio = np.clip(np.cos(np.radians(lats)) * sin_d, 0.0, 1.0)
+            bound = np.minimum(bound, EARTH_RADIUS_KM * np.arcsin(ratio))
+        return bound
+
+def _shard_path(spill_dir, side, row, col):
+    return os.path.join(spill_dir, f"{side}_{row}_{col}.bin")
+
+def spill(filename, side, grid, spill_dir, chunk_size=warehouse_io.CHUNK_SIZE):
+    # Streams a CSV into per-cell shard files; returns (point count, data row number per point)
+    count = 0
+    row_numbers = []
+    for chunk in warehouse_io.iter_chunks(filename, chunk_size):
+        rows, cols = grid.cells(chunk.lat, chunk.lon)
+        records = np.empty(len(chunk), dtype=SPILL_DTYPE)
+        records['idx'] = np.arange(count, count + len(chunk))
+        records['lat'] = chunk.lat
+        records['lon'] = chunk.lon
+        keys = rows * grid.n_cols + cols
+        order = np.argsort(keys, kind='stable')
+        uniq, starts = np.unique(keys[order], return_index=True)
+        ends = list(starts[1:]) + [len(order)]
+        for key, start, end in zip(uniq.tolist(), starts.tolist(), ends):
+            with open(_shard_path(spill_dir, side, key // grid.n_cols, key % grid.n_cols), 'ab') as f:
+                records[order[start:end]].tofile(f)
+        row_numbers.append(chunk.row_numbers)
+        count += len(chunk)
+        instrumentation.incr(f"ooc_rows.{side}", len(chunk))
+    numbers = np.concatenate(row_numbers) if row_numbers else np.empty(0, dtype=np.int64)
+    return count, numbers
+
+def _join_shard(args):
+    spill_dir, shard_deg, row, col, start, stop, target_cells, memory_mb = args
+    grid = ShardGrid(shard_deg)
+    query = np.fromfile(_shard_path(spill_dir, "q", row, col), dtype=SPILL_DTYPE, count=stop - start,
+                        offset=start * SPILL_DTYPE.itemsize)
+    memory_mb = memory_mb / 2.0  # The other half holds this slice's per-point arrays
+    q_lat = query['lat'].copy()
+    q_lon = query['lon'].copy()
+    best_dist = np.full(len(query), np.inf)
+    best_idx = np.full(len(query), -1, dtype=np.int64)
+    active = np.arange(len(query))
+    shards_read = 0
+
+    # Target shards by ring distance; empty rings cost nothing
+    rings = grid.ring_distance(row, col, target_cells)
+    order = np.argsort(rings, kind='stable')
+    ring = 0
+    for pos in order.tolist():
+        k = int(rings[pos])
+        if k > ring:
+            # Everything within k - 1 rings is done: points strictly closer than the
+            # rest of the world are final (ties have to look further for a lower index)
+            bound = grid.outside_bound_km(q_lat[active], q_lon[active], row, col, k - 1)
+            active = active[~(best_dist[active] < bound)]
+            ring = k
+        if not len(active):
+            break
+        # Shards are read-only memory maps, so only the block in use is resident
+        targets = np.memmap(_shard_path(spill_dir, "t", *target_cells[pos]), dtype=SPILL_DTYPE, mode='r')
+        a_dist = best_dist[active]
+        a_idx = best_idx[active]
+        _update_best(a_dist, a_idx, q_lat[active], q_lon[active], np.asarray(targets['idx']),
+                     np.asarray(targets['lat']), np.asarray(targets['lon']), memory_mb)
+        best_dist[active] = a_dist
+        best_idx[active] = a_idx
+        shards_read += 1
+        del targets
+    return query['idx'], best_idx, best_dist, shards_read, ring
+
+def ooc_nearest_join(query_file, target_file, memory_mb=MEMORY_MB, shard_deg=SHARD_DEG, jobs=1,
+                     chunk_size=warehouse_io.CHUNK_SIZE):
+    # Returns (nearest target index, distance km, query row numbers, target row numbers)
+    grid = ShardGrid(shard_deg)
+    os.makedirs(SPILL_PARENT, exist_ok=True)
+    spill_dir = tempfile.mkdtemp(dir=SPILL_PARENT)
+    try:
+        with instrumentation.timer("ooc_spill"):
+            n_query, query_rows = spill(query_file, "q", grid, spill_dir, chunk_size)
+            n_target, target_rows = spill(target_file, "t", grid, spill_dir, chunk_size)
+
+        best_idx = np.full(n_query, -1, dtype=np.int64)
+        best_dist = np.full(n_query, np.inf)
+        if n_query == 0 or n_target == 0:
+            return best_idx, best_dist, query_rows, target_rows
+
+        cells = {"q": set(), "t": set()}
+        for name in os.listdir(spill_dir):
+            side, r, c = name[:-len(".bin")].split("_")
+            cells[side].add((int(r), int(c)))
+        target_cells = sorted(cells["t"])
+        tasks = []
+        for r, c in sorted(cells["q"]):
+            n_shard = os.path.getsize(_shard_path(spill_dir, "q", r, c)) // SPILL_DTYPE.itemsize
+            for start, stop in _query_slices(n_shard, memory_mb):
+                tasks.append((spill_dir, shard_deg, r, c, start, stop, target_cells, memory_mb))
+
+        with instrumentation.timer("ooc_join"):
+            if jobs == 1:
+                results = map(_join_shard, tasks)
+                executor = None
+            else:
+                executor = ProcessPoolExecutor(max_workers=jobs)
+                results = executor.map(_join_shard, tasks)
+            try:
+                for idx, nearest, dist, shards_read, rings in results:
+                    best_idx[idx] = nearest
+                    best_dist[idx] = dist
+                    instrumentation.incr("ooc_query_slices")
+                    instrumentation.incr("ooc_target_shard_reads", shards_read)
+                    instrumentation.incr("ooc_rings_searched", rings)
+            finally:
+                if executor:
+                    executor.shutdown()
+        return best_idx, best_dist, query_rows, target_rows
+    finally:
+        shutil.rmtree(spill_dir, ignore_errors=True)
+
+def write_results(query_file, nearest, distances, query_rows, target_rows, output_file,
+                  chunk_size=warehouse_io.CHUNK_SIZE):
+    # Streams the query file again so names are never all held in memory
+    with open(output_file, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Row', 'Name', 'Latitude', 'Longitude', 'NearestRow', 'DistanceKm'])
+        start = 0
+        for chunk in warehouse_io.iter_chunks(query_file, chunk_size):
+            names = chunk.columns.get('Name', [''] * len(chunk))
+            end = start + len(chunk)
+            for i, pos in enumerate(range(start, end)):
+                target = int(nearest[pos])
+                writer.writerow([int(query_rows[pos]), names[i], chunk.lat[i], chunk.lon[i],
+                                 int(target_rows[target]) if target >= 0 else '', f"{distances[pos]:.6f}"])
+            start = end
+
+def main():
+    parser = argparse.ArgumentParser(description="Nearest-target join for query points that do not fit in memory")
+    parser.add_argument("query_file", help="CSV of points to match (e.g. walmart_warehouses.csv)")
+    parser.add_argument("target_file", help="CSV of candidate nearest points (e.g. amazon_warehouses_filled.csv)")
+    parser.add_argument("--output", default=OUTPUT_FILE, help="Result CSV (Row/NearestRow are data row numbers in the inputs)")
+    parser.add_argument("--memory-mb", type=float, default=MEMORY_MB, help="Working memory per worker (query slice + distance blocks)")
+    parser.add_argument("--shard-deg", type=float, default=SHARD_DEG, help="Shard cell size in degrees")
+    parser.add_argument("--jobs", type=int, default=1, help="Worker processes (0 = all CPUs)")
+    parser.add_argument("--verify", action="store_true", help="Also run the in-memory join and check the results match")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    with instrumentation.session("ooc_join", args):
+        nearest, distances, query_rows, target_rows = ooc_nearest_join(
+            args.query_file, args.target_file, memory_mb=args.memory_mb, shard_deg=args.shard_deg,
+            jobs=args.jobs or None)
+        write_results(args.query_file, nearest, distances, query_rows, target_rows, args.output)
+        print(f"Joined {len(nearest)} points against {len(target_rows)} targets; saved to {args.output}")
+
+        if args.verify:
+            query = [c for c in warehouse_io.iter_chunks(args.query_file)]
+            target = [c for c in warehouse_io.iter_chunks(args.target_file)]
+            q_lat = np.concatenate([c.lat for c in query]) if query else np.empty(0)
+            q_lon = np.concatenate([c.lon for c in query]) if query else np.empty(0)
+            t_lat = np.concatenate([c.lat for c in target]) if target else np.empty(0)
+            t_lon = np.concatenate([c.lon for c in target]) if target else np.empty(0)
+            ref_idx, ref_dist = nearest_join(q_lat, q_lon, t_lat, t_lon, args.memory_mb)
+            same = np.array_equal(ref_idx, nearest) and np.array_equal(ref_dist, distances)
+            print(f"In-memory join {'matches' if same else 'DIFFERS'}")
+            if not same:
+                raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
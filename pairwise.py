@@ -0,0 +1,113 @@
+import os
+from collections import OrderedDict
+import numpy as np
+from cache_utils import cache_path, digest
+from spatial_index import great_circle_matrix_km, to_unit_vectors
+import instrumentation
+
+# Pairwise distance cache for silhouette scoring.
+# The distances between all points of a region are stored once, as the
+# condensed upper triangle (n*(n-1)/2 float32 values, pair (i, j) with i < j at
+# i*n - i*(i+1)/2 + j - i - 1). Every silhouette evaluation of the k search then
+# only aggregates those distances by the candidate labels: per-point sums to
+# each cluster come from two dense matrix products per block of rows. Matrices
+# that would take more than MEMMAP_MB are written to .cache/pairwise/ and
+# memory-mapped, which also lets a rerun on the same points reuse them.
+
+MEMMAP_MB = 128
+ROWS_PER_BLOCK = 512
+MEMO_SIZE = 4  # Matrices kept in memory per process (the k search only needs the current region's)
+
+_memo = OrderedDict()
+
+def condensed_size(n):
+    return n * (n - 1) // 2
+
+def _row_starts(n):
+    i = np.arange(n, dtype=np.int64)
+    return i * n - i * (i + 1) // 2
+
+class PairwiseDistances:
+    def __init__(self, n, metric, values):
+        self.n = n
+        self.metric = metric
+        self.values = values  # Condensed float32 array (np.memmap for large matrices)
+
+    @classmethod
+    def compute(cls, data, metric="euclidean", out=None):
+        # data: [(lat, lon)]; euclidean = degrees on the raw lat/lon plane, spherical = great-circle km
+        n = len(data)
+        values = np.empty(condensed_size(n), dtype=np.float32) if out is None else out
+        lats = np.array([p[0] for p in data], dtype=np.float64)
+        lons = np.array([p[1] for p in data], dtype=np.float64)
+        vectors = to_unit_vectors(lats, lons) if metric == "spherical" else None
+        starts = _row_starts(n)
+        for i0 in range(0, n, ROWS_PER_BLOCK):
+            i1 = min(i0 + ROWS_PER_BLOCK, n)
+            # Only the columns right of the block's first row are needed
+            if metric == "spherical":
+                block = great_circle_matrix_km(vectors[i0:i1], vectors[i0:])
+            else:
+                block = np.sqrt((lats[i0:i1, None] - lats[None, i0:]) ** 2 + (lons[i0:i1, None] - lons[None, i0:]) ** 2)
+            for i in range(i0, i1):
+                values[starts[i]:starts[i] + n - i - 1] = block[i - i0, i - i0 + 1:]
+        instrumentation.incr("pairwise_distances", len(values))
+        return cls(n, metric, values)
+
+    def upper_rows(self, i0, i1):
+        # (i1 - i0, n - i0) block of the upper triangle: entry (r, c) is d(i0 + r, i0 + c) for c > r, else 0
+        block = np.zeros((i1 - i0, self.n - i0))
+        starts = _row_starts(self.n)
+        for i in range(i0, i1):
+            block[i - i0, i - i0 + 1:] = self.values[starts[i]:starts[i] + self.n - i - 1]
+        return block
+
+    def cluster_sums(self, labels, k, weights=None):
+        # (n, k): summed (weighted) distance from every point to the members of each cluster.
+        # Each stored pair is used twice, once per direction, so the triangle is read only once.
+        labels = np.asarray(labels)
+        members = np.zeros((self.n, k))
+        members[np.arange(self.n), labels] = 1.0 if weights is None else np.asarray(weights, dtype=np.float64)
+        sums = np.zeros((self.n, k))
+        for i0 in range(0, self.n, ROWS_PER_BLOCK):
+            i1 = min(i0 + ROWS_PER_BLOCK, self.n)
+            block = self.upper_rows(i0, i1)
+            sums[i0:i1] += block @ members[i0:]
+            sums[i0:] += block.T @ members[i0:i1]
+        return sums
+
+def clear_memo():
+    _memo.clear()
+
+def pairwise_distances(data, metric="euclidean", memmap_mb=MEMMAP_MB):
+    # Distances for this exact point list, computed once per process; large ones live on disk
+    key = digest("pairwise", metric, [tuple(p) for p in data])
+    if key in _memo:
+        _memo.move_to_end(key)
+        instrumentation.incr("cache_hits.pairwise")
+        return _memo[key]
+
+    n = len(data)
+    if condensed_size(n) * 4 > memmap_mb * 1024 * 1024:
+        path = cache_path("pairwise", key, ".f32")
+        if os.path.exists(path) and os.path.getsize(path) == condensed_size(n) * 4:
+            instrumentation.incr("cache_hits.pairwise")
+            distances = PairwiseDistances(n, metric, np.memmap(path, dtype=np.float32, mode='r', shape=(condensed_size(n),)))
+        else:
+            instrumentation.incr("cache_misses.pairwise")
+            out = np.memmap(path + ".tmp", dtype=np.float32, mode='w+', shape=(condensed_size(n),))
+            with instrumentation.timer("pairwise_distances"):
+                PairwiseDistances.compute(data, metric, out)
+            out.flush()
+            del out
+            os.replace(path + ".tmp", path)
+            distances = PairwiseDistances(n, metric, np.memmap(path, dtype=np.float32, mode='r', shape=(condensed_size(n),)))
+    else:
+        instrumentation.incr("cache_misses.pairwise")
+        with instrumentation.timer("pairwise_distances"):
+            distances = PairwiseDistances.compute(data, metric)
+
+    _memo[key] = distances
+    if len(_memo) > MEMO_SIZE:
+        _memo.popitem(last=False)
+    return distances
@@ -0,0 +1,172 @@
+import glob
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import instrumentation
+
+# Minimal DAG runner for the analysis pipeline.
+# A stage is skipped when all of its outputs exist and are newer than its
+# inputs (make-style) and none of its dependencies re-ran. Stages without
+# outputs hold in-memory data and only run when a stage that needs them runs.
+# A skipped stage can still hand its data downstream through its `load`
+# function, which reads the stage's outputs back from disk. Stages naming the
+# same `resource` (e.g. one rate-limited API) never run at the same time.
+
+class Stage:
+    def __init__(self, name, func, deps=(), inputs=(), outputs=(), load=None, resource=None):
+        self.name = name
+        self.func = func          # func(results) -> value, results maps dep name -> value
+        self.deps = list(deps)
+        self.inputs = list(inputs)   # Paths or glob patterns
+        self.outputs = list(outputs)
+        self.load = load          # load() -> value when the stage is skipped
+        self.resource = resource  # Stages sharing a resource run one after another
+
+def _expand(patterns):
+    paths = []
+    for pattern in patterns:
+        if any(ch in pattern for ch in "*?["):
+            paths.extend(sorted(glob.glob(pattern)))
+        else:
+            paths.append(pattern)
+    return paths
+
+def is_up_to_date(stage):
+    if not stage.outputs:
+        return False
+    outputs = _expand(stage.outputs)
+    if not outputs or not all(os.path.exists(p) for p in outputs):
+        return False
+    # Missing raw inputs (e.g. source lists not checked in) leave existing outputs as they are
+    inputs = [p for p in _expand(stage.inputs) if os.path.exists(p)]
+    if not inputs:
+        return True
+    return max(os.path.getmtime(p) for p in inputs) <= min(os.path.getmtime(p) for p in outputs)
+
+class Pipeline:
+    def __init__(self, stages):
+        self.stages = {s.name: s for s in stages}
+        for stage in stages:
+            for dep in stage.deps:
+                if dep not in self.stages:
+                    raise ValueError(f"Stage {stage.name} depends on unknown stage {dep}")
+        self.order = self._topological_order()
+
+    def _topological_order(self):
+        order = []
+        state = {}
+
+        def visit(name):
+            if state.get(name) == "done":
+                return
+            if state.get(name) == "visiting":
+                raise ValueError(f"Dependency cycle through stage {name}")
+            state[name] = "visiting"
+            for dep in self.stages[name].deps:
+                visit(dep)
+            state[name] = "done"
+            order.append(name)
+
+        for name in self.stages:
+            visit(name)
+        return order
+
+    def plan(self, targets=None, force=False):
+        # Returns (stages involved in topological order, set of stages that must execute)
+        wanted = set()
+
+        def collect(name):
+            if name not in wanted:
+                wanted.add(name)
+                for dep in self.stages[name].deps:
+                    collect(dep)
+
+        for name in (targets or self.order):
+            if name not in self.stages:
+                raise ValueError(f"Unknown stage: {name}")
+            collect(name)
+
+        # --force applies to the named targets only, so forcing a map does not re-geocode
+        forced = set(targets) if (force and targets) else (wanted if force else set())
+        stale = set()
+        for name in self.order:
+            if name not in wanted:
+                continue
+            stage = self.stages[name]
+            if not stage.outputs:
+                continue
+            if name in forced or not is_up_to_date(stage) or any(d in stale for d in self._output_deps(name)):
+                stale.add(name)
+
+        # In-memory stages run only if something that (transitively) needs them runs
+        to_run = set(stale)
+        for name in reversed(self.order):
+            if name in to_run:
+                for dep in self.stages[name].deps:
+                    if not self.stages[dep].outputs and dep in wanted:
+                        to_run.add(dep)
+        return [name for name in self.order if name in wanted], to_run
+
+    def _output_deps(self, name):
+        # Nearest upstream stages that write files (looking through in-memory stages)
+        found = []
+        for dep in self.stages[name].deps:
+            if self.stages[dep].outputs:
+                found.append(dep)
+            else:
+                found.extend(self._output_deps(dep))
+        return found
+
+    def run(self, targets=None, force=False, max_workers=4, dry_run=False):
+        wanted, to_run = self.plan(targets, force)
+        for name in wanted:
+            print(f"[pipeline] {name}: {'run' if name in to_run else 'up to date'}")
+        if dry_run:
+            return {}
+
+        results = {}
+        lock = threading.Lock()
+
+        def execute(name):
+            stage = self.stages[name]
+            with lock:
+                inputs = {dep: results.get(dep) for dep in stage.deps}
+            with instrumentation.timer(f"stage.{name}"):
+                value = stage.func(inputs)
+            with lock:
+                results[name] = value
+            return name
+
+        pending = list(wanted)
+        done = set()
+        running = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while pending or running:
+                for name in list(pending):
+                    stage = self.stages[name]
+                    if not all(dep in done for dep in stage.deps if dep in wanted):
+                        continue
+                    if name in to_run and stage.resource is not None and \
+                            any(self.stages[r].resource == stage.resource for r in running.values()):
+                        continue
+                    pending.remove(name)
+                    if name in to_run:
+                        running[executor.submit(execute, name)] = name
+                    else:
+                        # Skipped: hand downstream the on-disk result if anyone needs it
+                        if stage.load and any(name in self.stages[n].deps for n in to_run):
+                            value = stage.load()
+                            with lock:
+                                results[name] = value
+                        instrumentation.incr("stages_skipped")
+                        done.add(name)
+                if not running:
+                    continue
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    future.result()  # Re-raise stage errors
+                    instrumentation.incr("stages_run")
+                    done.add(name)
+        return results
@@ -0,0 +1,566 @@
+import argparse
+import asyncio
+import json
+import math
+import os
+import time
+import urllib.parse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from cache_utils import digest, file_digest
+from demand_coverage import NETWORKS, RADII_KM, CoverageTotals, load_networks, parse_network
+from spatial_index import EARTH_RADIUS_KM, to_unit_vectors
+import instrumentation
+import warehouse_io
+
+# Proximity queries over HTTP: nearest facility, facilities within a radius,
+# and demand coverage, for batches of points. The warehouse CSVs are loaded
+# and indexed once; the indexes are those of demand_coverage.py (nearest via
+# the per-cell candidate lists, coverage via CoverageTotals) plus unit vectors
+# for radius counts. A background task watches the CSVs and loads a changed
+# dataset next to the live one, then swaps the reference, so requests never
+# see a half-loaded index and the server never stops answering.
+#
+# Requests are JSON ({"points": [[lat, lon], ...], ...}) or NDJSON, one point
+# per line (Content-Type: application/x-ndjson, optionally chunked). NDJSON is
+# processed and answered in batches as it arrives, one result line per point,
+# so arbitrarily long streams run in constant memory as long as the client
+# reads while it sends (up to STREAM_BUFFER_MB of answers is buffered for
+# clients that don't). Computation runs on one worker thread, keeping the
+# event loop free for I/O.
+#
+#   curl -s localhost:8766/nearest -d '{"points": [[33.45, -112.07]], "networks": ["Amazon"]}'
+#   curl -s localhost:8766/within -d '{"points": [[33.45, -112.07]], "radius_km": 20, "ids": true}'
+#   curl -s localhost:8766/metrics
+
+DEFAULT_PORT = 8766
+RELOAD_INTERVAL = 5.0         # Seconds between checks of the CSVs' modification times
+STREAM_BATCH = 4096           # NDJSON points answered per batch
+STREAM_BUFFER_MB = 64         # Response buffered before a stream waits for the client to read
+MAX_JSON_POINTS = 1_000_000   # Larger requests should stream NDJSON
+MAX_LINE_BYTES = 1 << 16
+LATENCY_WINDOW = 10_000       # Recent requests per endpoint kept for percentiles
+WITHIN_BLOCK = 8192           # Points per matrix block in radius counts
+DEFAULT_RADIUS_KM = 20.0
+
+class Dataset:
+    # One immutable snapshot of the networks; replaced as a whole on reload
+    def __init__(self, specs, min_precision="city"):
+        self.specs = specs
+        self.files = [filename for _, filename in specs]
+        self.stamp = file_stamps(self.files)
+        self.networks = {network.name: network for network in load_networks(specs, min_precision)}
+        self.vectors = {name: to_unit_vectors(n.lats, n.lons) for name, n in self.networks.items()}
+        # Pre-encoded JSON for each facility, so a nearest row is a string format rather than a dict dump
+        self.fragments = {name: [facility_fragment(r) for r in n.records] for name, n in self.networks.items()}
+        self.version = digest("proximity", [(f, file_digest(f)) for f in self.files], min_precision)[:12]
+        self.loaded_at = time.time()
+
+def file_stamps(files):
+    stamps = []
+    for filename in files:
+        try:
+            st = os.stat(filename)
+            stamps.append((st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            stamps.append(None)
+    return stamps
+
+def facility_fragment(record):
+    fields = {'name': record.get('Name', ''), 'city': record.get('City', ''),
+              'lat': record['Latitude'], 'lon': record['Longitude']}
+    return json.dumps(fields, separators=(',', ':'))[:-1].replace("%", "%%") + ',"km":%.4f}'
+
+def encode(value):
+    return json.dumps(value, separators=(',', ':'))
+
+class QueryError(Exception):
+    pass
+
+class Query:
+    # One request. Each endpoint's subclass defines add(lats, lons, weights), which answers a batch of
+    # points as JSON-encoded rows; result() is the aggregate at the end (if any)
+    per_point = True
+
+    def __init__(self, dataset, params):
+        self.dataset = dataset
+        names = params.get('networks') or list(dataset.networks)
+        if isinstance(names, str):
+            names = names.split(",")
+        unknown = [n for n in names if n not in dataset.networks]
+        if unknown:
+            raise QueryError(f"unknown network(s): {', '.join(unknown)} (have {', '.join(dataset.networks)})")
+        self.networks = [dataset.networks[n] for n in names]
+
+    def result(self):
+        return None
+
+class NearestQuery(Query):
+    def add(self, lats, lons, weights):
+        columns = []
+        for network in self.networks:
+            nearest, dist = network.nearest(lats, lons)
+            fragments = self.dataset.fragments[network.name]
+            columns.append([fragments[i] % d if i >= 0 else "null" for i, d in zip(nearest.tolist(), dist.tolist())])
+        template = "{" + ",".join(encode(n.name) + ":%s" for n in self.networks) + "}"
+        return [template % values for values in zip(*columns)]
+
+class WithinQuery(Query):
+    def __init__(self, dataset, params):
+        super().__init__(dataset, params)
+        self.radius_km = float(params.get('radius_km', DEFAULT_RADIUS_KM))
+        if not self.radius_km >= 0:
+            raise QueryError("radius_km must be >= 0")
+        self.ids = str(params.get('ids', '')).lower() in ("1", "true")
+        # Within r km on the sphere <=> dot product of unit vectors >= cos(r / R)
+        self.min_dot = math.cos(min(self.radius_km / EARTH_RADIUS_KM, math.pi))
+
+    def add(self, lats, lons, weights):
+        points = to_unit_vectors(lats, lons)
+        counts_by_network = []
+        members_by_network = []
+        for network in self.networks:
+            vectors = self.dataset.vectors[network.name]
+            counts = np.zeros(len(lats), dtype=np.int64)
+            members = [None] * len(lats)
+            for start in range(0, len(lats), WITHIN_BLOCK):
+                inside = points[start:start + WITHIN_BLOCK] @ vectors.T >= self.min_dot
+                counts[start:start + len(inside)] = inside.sum(axis=1)
+                if self.ids:
+                    rows, cols = np.nonzero(inside)
+                    split = np.searchsorted(rows, np.arange(1, len(inside)))
+                    for offset, idx in enumerate(np.split(cols, split)):
+                        members[start + offset] = [network.records[i].get('Name', '') for i in idx.tolist()]
+            counts_by_network.append(counts.tolist())
+            members_by_network.append(members)
+        names = [n.name for n in self.networks]
+        if self.ids:
+            return [encode({name: {'count': c, 'names': m} for name, c, m in zip(names, counts, members)})
+                    for counts, members in zip(zip(*counts_by_network), zip(*members_by_network))]
+        template = "{" + ",".join(encode(name) + ":%d" for name in names) + "}"
+        return [template % counts for counts in zip(*counts_by_network)]
+
+class CoverageQuery(Query):
+    per_point = False
+
+    def __init__(self, dataset, params):
+        super().__init__(dataset, params)
+        radii = params.get('radii', RADII_KM)
+        if isinstance(radii, str):
+            radii = radii.split(",")
+        self.radii = [float(r) for r in radii]
+        self.totals = {n.name: CoverageTotals(n.name, self.radii) for n in self.networks}
+        self.combined = CoverageTotals("Any", self.radii)
+
+    def add(self, lats, lons, weights):
+        best = np.full(len(lats), np.inf)
+        for network in self.networks:
+            _, dist = network.nearest(lats, lons)
+            self.totals[network.name].add(dist, weights)
+            np.minimum(best, dist, out=best)
+        self.combined.add(best, weights)
+        return []
+
+    def result(self):
+        out = {}
+        for totals in list(self.totals.values()) + [self.combined]:
+            mean = totals.mean_distance()
+            out[totals.name] = {'points': totals.points, 'weight': round(totals.weight, 6),
+                                'shares': {f"{r:g}": round(float(s), 6) for r, s in zip(self.radii, totals.shares())},
+                                'mean_km': None if math.isnan(mean) else round(mean, 4)}
+        return out
+
+ENDPOINTS = {"/nearest": NearestQuery, "/within": WithinQuery, "/coverage": CoverageQuery}
+
+def parse_points(items, offset=0):
+    # [[lat, lon], [lat, lon, weight], {"lat":, "lon":, "weight":}, ...] -> arrays; bad rows raise
+    try:
+        array = np.array(items, dtype=np.float64)
+    except (TypeError, ValueError):
+        array = None
+    if array is not None and array.ndim == 2 and array.shape[1] in (2, 3) and len(array):
+        # Common case: a uniform list of [lat, lon] or [lat, lon, weight]
+        lats, lons = array[:, 0].copy(), array[:, 1].copy()
+        weights = array[:, 2].copy() if array.shape[1] == 3 else np.ones(len(array))
+        bad = ~((np.abs(lats) <= 90.0) & (np.abs(lons) <= 180.0))
+        if bad.any():
+            raise QueryError(f"point {offset + int(np.argmax(bad))}: coordinates out of range")
+        return lats, lons, weights
+    lats = np.empty(len(items))
+    lons = np.empty(len(items))
+    weights = np.ones(len(items))
+    for i, item in enumerate(items):
+        if isinstance(item, dict):
+            lat, lon, weight = item.get('lat'), item.get('lon'), item.get('weight', 1.0)
+        elif isinstance(item, (list, tuple)) and len(item) in (2, 3):
+            lat, lon, weight = item[0], item[1], item[2] if len(item) == 3 else 1.0
+        else:
+            raise QueryError(f"point {offset + i}: expected [lat, lon] or {{\"lat\", \"lon\"}}")
+        try:
+            lats[i], lons[i], weights[i] = float(lat), float(lon), float(weight)
+        except (TypeError, ValueError):
+            raise QueryError(f"point {offset + i}: non-numeric value")
+        if not (-90.0 <= lats[i] <= 90.0 and -180.0 <= lons[i] <= 180.0):
+            raise QueryError(f"point {offset + i}: coordinates out of range")
+    return lats, lons, weights
+
+class LatencyStats:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.points = 0
+        self.seconds = 0.0
+        self.recent = deque(maxlen=LATENCY_WINDOW)
+
+    def record(self, seconds, points, error=False):
+        self.requests += 1
+        self.errors += int(error)
+        self.points += points
+        self.seconds += seconds
+        self.recent.append(seconds)
+
+    def summary(self):
+        out = {'requests': self.requests, 'errors': self.errors, 'points': self.points,
+               'us_per_point': round(self.seconds / self.points * 1e6, 3) if self.points else None}
+        if self.recent:
+            p50, p95, p99 = np.percentile(np.array(self.recent) * 1000.0, [50, 95, 99]).tolist()
+            out.update({'p50_ms': round(p50, 3), 'p95_ms': round(p95, 3), 'p99_ms': round(p99, 3),
+                        'max_ms': round(max(self.recent) * 1000.0, 3)})
+        return out
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 411: "Length Required",
+           413: "Payload Too Large", 500: "Internal Server Error"}
+
+class Request:
+    def __init__(self, reader, method, target, headers):
+        self.reader = reader
+        self.method = method
+        url = urllib.parse.urlsplit(target)
+        self.path = url.path
+        self.params = {k: v[-1] for k, v in urllib.parse.parse_qs(url.query).items()}
+        self.headers = headers
+        self.chunked = 'chunked' in headers.get('transfer-encoding', '').lower()
+        self.remaining = int(headers.get('content-length', 0) or 0)
+        self._buffer = b""
+
+    async def _read_some(self):
+        # Next piece of the body, b"" at its end
+        if self.chunked:
+            size_line = await self.reader.readline()
+            size = int(size_line.split(b";")[0].strip() or b"0", 16)
+            if size == 0:
+                while (await self.reader.readline()).strip():
+                    pass
+                self.chunked = False
+                return b""
+            data = await self.reader.readexactly(size)
+            await self.reader.readexactly(2)
+            return data
+        if self.remaining <= 0:
+            return b""
+        data = await self.reader.read(min(self.remaining, 1 << 16))
+        if not data:
+            raise HttpError(400, "body shorter than Content-Length")
+        self.remaining -= len(data)
+        return data
+
+    async def body(self, limit):
+        parts = [self._buffer]
+        size = len(self._buffer)
+        while True:
+            data = await self._read_some()
+            if not data:
+                return b"".join(parts)
+            size += len(data)
+            if size > limit:
+                raise HttpError(413, f"body over {limit} bytes; stream large batches as NDJSON")
+            parts.append(data)
+
+    async def lines(self):
+        # Complete non-empty lines of the body, in lists of whatever has arrived
+        while True:
+            data = await self._read_some()
+            if not data:
+                if self._buffer.strip():
+                    yield [self._buffer]
+                self._buffer = b""
+                return
+            *complete, self._buffer = (self._buffer + data).split(b"\n")
+            if len(self._buffer) > MAX_LINE_BYTES:
+                raise HttpError(400, "NDJSON line too long")
+            complete = [line for line in complete if line.strip()]
+            if complete:
+                yield complete
+
+    async def drain(self):
+        # Discard an unread body so the connection can be reused
+        while await self._read_some():
+            pass
+
+class ProximityService:
+    def __init__(self, specs, min_precision="city", reload_interval=RELOAD_INTERVAL, max_points=MAX_JSON_POINTS):
+        self.specs = specs
+        self.min_precision = min_precision
+        self.reload_interval = reload_interval
+        self.max_points = max_points
+        self.dataset = Dataset(specs, min_precision)
+        self.compute = ThreadPoolExecutor(max_workers=1)
+        self.stats = {path: LatencyStats() for path in ENDPOINTS}
+        self.started = time.time()
+        self.reloads = 0
+        self.reload_errors = 0
+        self.last_reload_error = None
+        self._failed_stamp = None  # Files that failed to load are retried only once they change again
+        self._reload_lock = asyncio.Lock()
+
+    async def reload(self, force=False):
+        # Build the new dataset off the event loop, then swap; a failed load keeps the old one
+        async with self._reload_lock:
+            current = self.dataset
+            stamp = file_stamps(current.files)
+            if not force and stamp in (current.stamp, self._failed_stamp):
+                return False
+            try:
+                dataset = await asyncio.get_running_loop().run_in_executor(None, Dataset, self.specs, self.min_precision)
+            except Exception as e:
+                self._failed_stamp = stamp
+                self.reload_errors += 1
+                self.last_reload_error = f"{type(e).__name__}: {e}"
+                print(f"Reload failed, still serving {current.version}: {self.last_reload_error}")
+                return False
+            self.dataset = dataset
+            self.reloads += 1
+            instrumentation.incr("reloads")
+            print(f"Reloaded dataset {current.version} -> {dataset.version}")
+            return True
+
+    async def watch(self):
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            await self.reload()
+
+    def metrics(self):
+        dataset = self.dataset
+        return {'version': dataset.version, 'loaded_at': round(dataset.loaded_at, 3),
+                'uptime_s': round(time.time() - self.started, 3), 'reloads': self.reloads,
+                'reload_errors': self.reload_errors, 'last_reload_error': self.last_reload_error,
+                'networks': {name: len(n) for name, n in dataset.networks.items()},
+                'endpoints': {path: s.summary() for path, s in self.stats.items()}}
+
+    def new_query(self, query_class, params):
+        try:
+            return query_class(self.dataset, params)
+        except (TypeError, ValueError) as e:
+            raise QueryError(f"bad parameter: {e}")
+
+    async def run_batch(self, query, lats, lons, weights):
+        return await asyncio.get_running_loop().run_in_executor(self.compute, query.add, lats, lons, weights)
+
+    async def answer_json(self, request, query_class, writer):
+        body = await request.body(self.max_points * 64)
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError as e:
+            raise QueryError(f"invalid JSON: {e}")
+        if not isinstance(payload, dict):
+            raise QueryError("expected a JSON object")
+        params = dict(request.params, **{k: v for k, v in payload.items() if k != 'points'})
+        items = payload.get('points')
+        if items is None and 'lat' in params and 'lon' in params:
+            items = [[params['lat'], params['lon']]]
+        if not isinstance(items, list):
+            raise QueryError("missing 'points' list")
+        if len(items) > self.max_points:
+            raise HttpError(413, f"over {self.max_points} points; stream them as NDJSON")
+        query = self.new_query(query_class, params)
+        lats, lons, weights = parse_points(items)
+        rows = await self.run_batch(query, lats, lons, weights)
+        parts = ['{"version":', encode(query.dataset.version)]
+        if query.per_point:
+            parts += [',"results":[', ",".join(rows), "]"]
+        aggregate = query.result()
+        if aggregate is not None:
+            parts += [',"coverage":', encode(aggregate)]
+        await send_raw(writer, 200, ("".join(parts) + "}").encode())
+        return len(items)
+
+    async def answer_stream(self, request, query_class, writer):
+        # Chunked NDJSON out, one line per point, batch by batch as the input arrives
+        query = self.new_query(query_class, request.params)
+        # Clients that send the whole body before reading would otherwise deadlock against drain()
+        writer.transport.set_write_buffer_limits(high=STREAM_BUFFER_MB * 1024 * 1024)
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\nTransfer-Encoding: chunked\r\n"
+                     + f"X-Dataset-Version: {query.dataset.version}\r\n\r\n".encode())
+        count = 0
+        batch = []
+
+        async def flush():
+            try:
+                items = json.loads(b"[" + b",".join(batch) + b"]")
+            except ValueError:
+                items = []
+                for i, line in enumerate(batch):
+                    try:
+                        items.append(json.loads(line))
+                    except ValueError:
+                        raise QueryError(f"point {count + i}: invalid JSON")
+            lats, lons, weights = parse_points(items, count)
+            rows = await self.run_batch(query, lats, lons, weights)
+            if rows:
+                await send_chunk(writer, ("\n".join(rows) + "\n").encode())
+
+        try:
+            async for lines in request.lines():
+                batch.extend(lines)
+                while len(batch) >= STREAM_BATCH:
+                    pending, batch = batch[STREAM_BATCH:], batch[:STREAM_BATCH]
+                    await flush()
+                    count += len(batch)
+                    batch = pending
+            if batch:
+                await flush()
+                count += len(batch)
+            aggregate = query.result()
+            if aggregate is not None:
+                await send_chunk(writer, (encode({'coverage': aggregate}) + "\n").encode())
+        except (QueryError, HttpError) as e:
+            # Headers are already out; report in-band and close
+            await send_chunk(writer, (encode({'error': str(e), 'points_answered': count}) + "\n").encode())
+            await send_chunk(writer, b"")
+            raise ConnectionAbortedError()
+        await send_chunk(writer, b"")
+        return count
+
+    async def dispatch(self, request, writer):
+        if request.path == "/metrics":
+            await send(writer, 200, self.metrics())
+            return
+        if request.path == "/health":
+            await send(writer, 200, {'status': "ok", 'version': self.dataset.version})
+            return
+        if request.path == "/reload":
+            if request.method != "POST":
+                raise HttpError(405, "use POST /reload")
+            changed = await self.reload(force=True)
+            await send(writer, 200, {'reloaded': changed, 'version': self.dataset.version})
+            return
+        query_class = ENDPOINTS.get(request.path)
+        if query_class is None:
+            raise HttpError(404, f"unknown endpoint {request.path}")
+        if request.method not in ("GET", "POST"):
+            raise HttpError(405, f"{request.method} not allowed")
+
+        started = time.perf_counter()
+        points = 0
+        failed = True
+        try:
+            if 'ndjson' in request.headers.get('content-type', ''):
+                points = await self.answer_stream(request, query_class, writer)
+            else:
+                points = await self.answer_json(request, query_class, writer)
+            failed = False
+        finally:
+            self.stats[request.path].record(time.perf_counter() - started, points, failed)
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                parts = line.decode('latin-1').split()
+                if len(parts) != 3:
+                    await send(writer, 400, {'error': "malformed request line"}, close=True)
+                    break
+                method, target, http_version = parts
+                headers = {}
+                while True:
+                    header = await reader.readline()
+                    if header in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = header.decode('latin-1').partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                keep_alive = http_version == "HTTP/1.1" and headers.get('connection', '').lower() != "close"
+
+                request = Request(reader, method, target, headers)
+                try:
+                    await self.dispatch(request, writer)
+                except QueryError as e:
+                    await send(writer, 400, {'error': str(e)})
+                except HttpError as e:
+                    await send(writer, e.status, {'error': str(e)})
+                    if e.status == 413:
+                        break
+                await request.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        except Exception as e:
+            instrumentation.incr("server_errors")
+            print(f"Internal error: {type(e).__name__}: {e}")
+            try:
+                await send(writer, 500, {'error': "internal error"}, close=True)
+            except ConnectionError:
+                pass
+        finally:
+            writer.close()
+
+async def send(writer, status, body, close=False):
+    await send_raw(writer, status, encode(body).encode(), close)
+
+async def send_raw(writer, status, data, close=False):
+    head = (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(data)}\r\n" + ("Connection: close\r\n" if close else "") + "\r\n")
+    writer.write(head.encode() + data)
+    await writer.drain()
+
+async def send_chunk(writer, data):
+    # An empty chunk ends the response
+    writer.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+    await writer.drain()
+
+async def serve(service, host, port):
+    server = await asyncio.start_server(service.handle, host, port)
+    watcher = asyncio.create_task(service.watch()) if service.reload_interval > 0 else None
+    address = server.sockets[0].getsockname()
+    networks = ", ".join(f"{name} ({len(n)})" for name, n in service.dataset.networks.items())
+    print(f"Serving {networks} on http://{address[0]}:{address[1]} (dataset {service.dataset.version})")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if watcher:
+            watcher.cancel()
+        service.compute.shutdown(wait=False)
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP service for batched nearest / radius / coverage queries")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--network", action="append", type=parse_network, metavar="NAME=FILE",
+                        help="Facility network (repeatable; default: Amazon and Walmart US files)")
+    parser.add_argument("--min-precision", choices=warehouse_io.PRECISION_LEVELS, default="city",
+                        help="Ignore facilities geocoded more coarsely than this")
+    parser.add_argument("--reload-interval", type=float, default=RELOAD_INTERVAL,
+                        help="Seconds between checks for changed CSVs (0 = only POST /reload)")
+    parser.add_argument("--max-points", type=int, default=MAX_JSON_POINTS, help="Largest JSON batch accepted")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    specs = args.network or list(NETWORKS.items())
+    with instrumentation.session("proximity_service", args):
+        service = ProximityService(specs, args.min_precision, args.reload_interval, args.max_points)
+        try:
+            asyncio.run(serve(service, args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+import csv
+import heapq
+import os
+import xml.etree.ElementTree as ET
+import numpy as np
+
+import instrumentation
+from cache_utils import cache_path, digest, file_digest
+from spatial_index import GridIndex, haversine_km
+
+# Road network distance backend.
+# A local road file (OSM XML extract or a CSV edge list) is loaded once into a
+# compressed sparse row (CSR) graph. One multi-source Dijkstra from every
+# warehouse labels each road node with its nearest warehouse and the road
+# distance to it, so "nearest warehouse to P" becomes snap-to-node + lookup.
+
+# Points further than this from the road network fall back to straight-line distance
+MAX_SNAP_KM = 5.0
+SNAP_CELL_DEG = 0.05
+
+# OSM highway classes used for routing; footways, cycleways etc. are ignored
+DRIVABLE_HIGHWAYS = {
+    "motorway", "motorway_link", "trunk", "trunk_link", "primary", "primary_link",
+    "secondary", "secondary_link", "tertiary", "tertiary_link", "unclassified",
+    "residential", "service", "living_street", "road"
+}
+
+class RoadGraph:
+    def __init__(self, lats, lons, offsets, targets, weights, key=""):
+        self.key = key
+        self.lats = lats
+        self.lons = lons
+        self.offsets = offsets
+        self.targets = targets
+        self.weights = weights
+        self._node_index = None
+
+    @classmethod
+    def from_edges(cls, lats, lons, src, dst, weights):
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        src = np.asarray(src, dtype=np.int64)
+        order = np.argsort(src, kind='stable')
+        counts = np.bincount(src, minlength=len(lats))
+        offsets = np.zeros(len(lats) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        targets = np.asarray(dst, dtype=np.int32)[order]
+        weights = np.asarray(weights, dtype=np.float32)[order]
+        return cls(lats, lons, offsets, targets, weights)
+
+    @property
+    def node_count(self):
+        return len(self.lats)
+
+    @property
+    def edge_count(self):
+        return len(self.targets)
+
+    @property
+    def node_index(self):
+        if self._node_index is None:
+            self._node_index = GridIndex(self.lats, self.lons, cell_deg=SNAP_CELL_DEG)
+        return self._node_index
+
+    def snap(self, lat, lon):
+        # Nearest road node within MAX_SNAP_KM, else (-1, inf)
+        idx, dist = self.node_index.query_radius(lat, lon, MAX_SNAP_KM)
+        if len(idx) == 0:
+            return -1, float('inf')
+        best = int(np.argmin(dist))
+        return int(idx[best]), float(dist[best])
+
+def _parse_osm_xml(filename):
+    node_coords = {}
+    ways = []
+    for _, elem in ET.iterparse(filename, events=('end',)):
+        if elem.tag == 'node':
+            node_coords[elem.get('id')] = (float(elem.get('lat')), float(elem.get('lon')))
+            elem.clear()
+        elif elem.tag == 'way':
+            tags = {t.get('k'): t.get('v') for t in elem.findall('tag')}
+            if tags.get('highway') in DRIVABLE_HIGHWAYS:
+                refs = [nd.get('ref') for nd in elem.findall('nd')]
+                oneway = tags.get('oneway') in ('yes', 'true', '1')
+                ways.append((refs, oneway))
+            elem.clear()
+
+    ids = {}
+    lats, lons, src, dst = [], [], [], []
+    for refs, oneway in ways:
+        refs = [r for r in refs if r in node_coords]
+        for a, b in zip(refs, refs[1:]):
+            for ref in (a, b):
+                if ref not in ids:
+                    ids[ref] = len(lats)
+                    lats.append(node_coords[ref][0])
+                    lons.append(node_coords[ref][1])
+            src.append(ids[a])
+            dst.append(ids[b])
+            if not oneway:
+                src.append(ids[b])
+                dst.append(ids[a])
+    return lats, lons, src, dst
+
+def _parse_edge_csv(filename):
+    # Columns: from_lat, from_lon, to_lat, to_lon and optional oneway (1/0)
+    ids = {}
+    lats, lons, src, dst = [], [], [], []
+
+    def node_id(lat, lon):
+        key = (round(lat, 7), round(lon, 7))
+        if key not in ids:
+            ids[key] = len(lats)
+            lats.append(lat)
+            lons.append(lon)
+        return ids[key]
+
+    with open(filename, 'r') as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            try:
+                a = node_id(float(row['from_lat']), float(row['from_lon']))
+                b = node_id(float(row['to_lat']), float(row['to_lon']))
+            except ValueError:
+                continue
+            src.append(a)
+            dst.append(b)
+            if row.get('oneway', '0') not in ('1', 'yes', 'true'):
+                src.append(b)
+                dst.append(a)
+    return lats, lons, src, dst
+
+def load_road_network(filename):
+    key = file_digest(filename)
+    cached = cache_path("road_graphs", key, ".npz")
+    if os.path.exists(cached):
+        instrumentation.incr("cache_hits.road_graph")
+        data = np.load(cached)
+        return RoadGraph(data['lats'], data['lons'], data['offsets'], data['targets'],
+                         data['weights'], key=key)
+
+    instrumentation.incr("cache_misses.road_graph")
+    with instrumentation.timer("road_parse"):
+        if filename.endswith('.csv'):
+            lats, lons, src, dst = _parse_edge_csv(filename)
+        else:
+            lats, lons, src, dst = _parse_osm_xml(filename)
+
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    src = np.asarray(src, dtype=np.int64)
+    dst = np.asarray(dst, dtype=np.int64)
+    lengths = haversine_km(lats[src], lons[src], lats[dst], lons[dst])
+
+    graph = RoadGraph.from_edges(lats, lons, src, dst, lengths)
+    graph.key = key
+    np.savez(cached, lats=graph.lats, lons=graph.lons, offsets=graph.offsets,
+             targets=graph.targets, weights=graph.weights)
+    print(f"Loaded road network {filename}: {graph.node_count} nodes, {graph.edge_count} edges")
+    return graph
+
+def multi_source_dijkstra(graph, source_nodes, source_costs):
+    # Returns (dist, owner): road km from the closest source and that source's index
+    dist = np.full(graph.node_count, np.inf)
+    owner = np.full(graph.node_count, -1, dtype=np.int32)
+    offsets = graph.offsets
+    targets = graph.targets
+    weights = graph.weights
+
+    heap = []
+    for label, (node, cost) in enumerate(zip(source_nodes, source_costs)):
+        if node >= 0 and cost < dist[node]:
+            dist[node] = cost
+            owner[node] = label
+            heap.append((cost, node, label))
+    heapq.heapify(heap)
+
+    done = np.zeros(graph.node_count, dtype=bool)
+    while heap:
+        d, node, label = heapq.heappop(heap)
+        if done[node]:
+            continue
+        done[node] = True
+        start, end = offsets[node], offsets[node + 1]
+        for nxt, w in zip(targets[start:end].tolist(), weights[start:end].tolist()):
+            nd = d + w
+            if nd < dist[nxt]:
+                dist[nxt] = nd
+                owner[nxt] = label
+                heapq.heappush(heap, (nd, nxt, label))
+    return dist, owner
+
+class DistanceTable:
+    def __init__(self, graph, dist, owner):
+        self.graph = graph
+        self.dist = dist
+        self.owner = owner
+
+    def lookup(self, lat, lon):
+        # Road distance (plus straight-line access leg) to the nearest warehouse,
+        # or (inf, -1) when the point is off the network or unreachable.
+        node, snap_km = self.graph.snap(lat, lon)
+        if node < 0 or self.owner[node] < 0:
+            return float('inf'), -1
+        return float(self.dist[node]) + snap_km, int(self.owner[node])
+
+def build_distance_table(graph, lats, lons):
+    key = digest("road_table", graph.key, graph.node_count, graph.edge_count,
+                 [round(float(x), 7) for x in lats], [round(float(x), 7) for x in lons])
+    cached = cache_path("road_tables", key, ".npz")
+    if os.path.exists(cached):
+        instrumentation.incr("cache_hits.road_table")
+        data = np.load(cached)
+        return DistanceTable(graph, data['dist'], data['owner'])
+
+    source_nodes = []
+    source_costs = []
+    for lat, lon in zip(lats, lons):
+        # Warehouses off this network get node -1 and never become anyone's nearest
+        node, snap_km = graph.snap(lat, lon)
+        source_nodes.append(node)
+        source_costs.append(snap_km)
+
+    instrumentation.incr("cache_misses.road_table")
+    with instrumentation.timer("road_dijkstra"):
+        dist, owner = multi_source_dijkstra(graph, source_nodes, source_costs)
+    np.savez(cached, dist=dist, owner=owner)
+    return DistanceTable(graph, dist, owner)
@@ -0,0 +1,141 @@
+import argparse
+import csv
+import json
+import time
+import numpy as np
+
+import instrumentation
+from select_strategic_locations import SimpleKMeans, load_warehouses, METRICS, RANDOM_SEED, N_INIT
+from spatial_index import to_unit_vectors, great_circle_matrix_km
+
+OUTPUT_CSV = "amazon_strategic_hierarchy.csv"
+OUTPUT_JSON = "amazon_strategic_hierarchy.json"
+
+# (level name, clusters per parent). Each level only clusters the members of
+# one parent cluster from the level above, never the full dataset again.
+HIERARCHY_LEVELS = [
+    ("global", 5),
+    ("region", 4),
+    ("metro", 3)
+]
+
+def pick_hub(warehouses, members, centroid):
+    # Actual warehouse closest (great-circle) to the cluster centre
+    points = to_unit_vectors([warehouses[i]['Latitude'] for i in members],
+                             [warehouses[i]['Longitude'] for i in members])
+    center = to_unit_vectors([centroid[0]], [centroid[1]])
+    dist = great_circle_matrix_km(center, points)[0]
+    best = int(np.argmin(dist))
+    return members[best], float(dist[best])
+
+def build_hierarchy(warehouses, levels=HIERARCHY_LEVELS, metric="spherical", random_state=RANDOM_SEED, n_init=N_INIT):
+    nodes = []
+    timings = []
+    # Partitions to cluster at the current level: (parent node id, member indices)
+    partitions = [(None, list(range(len(warehouses))))]
+
+    for depth, (level_name, k) in enumerate(levels):
+        start = time.perf_counter()
+        next_partitions = []
+        level_nodes = 0
+
+        for parent_id, members in partitions:
+            coords = [(warehouses[i]['Latitude'], warehouses[i]['Longitude']) for i in members]
+            kmeans = SimpleKMeans(n_clusters=min(k, len(members)), metric=metric,
+                                  random_state=random_state, n_init=n_init)
+            kmeans.fit(coords)
+
+            groups = {}
+            for member, label in zip(members, kmeans.labels):
+                groups.setdefault(label, []).append(member)
+
+            for label in sorted(groups):
+                group = groups[label]
+                hub, _ = pick_hub(warehouses, group, kmeans.centroids[label])
+                node_id = f"{parent_id}.{label}" if parent_id is not None else str(label)
+                nodes.append({
+                    'level': level_name,
+                    'depth': depth,
+                    'id': node_id,
+                    'parent': parent_id,
+                    'hub': hub,
+                    'members': len(group)
+                })
+                level_nodes += 1
+                if len(group) > 1:
+                    next_partitions.append((node_id, group))
+
+        elapsed = time.perf_counter() - start
+        instrumentation.incr(f"hierarchy_nodes.{level_name}", level_nodes)
+        timings.append({'level': level_name, 'k': k, 'partitions': len(partitions),
+                        'nodes': level_nodes, 'seconds': round(elapsed, 6)})
+        print(f"Level {depth} ({level_name}): {len(partitions)} partitions -> {level_nodes} hubs in {elapsed:.3f}s")
+
+        partitions = next_partitions
+        if not partitions:
+            break
+
+    return nodes, timings
+
+def save_hierarchy(warehouses, nodes, timings, csv_file=OUTPUT_CSV, json_file=OUTPUT_JSON):
+    fieldnames = ['Level', 'NodeId', 'ParentId', 'Members', 'Name', 'Latitude', 'Longitude',
+                  'City', 'State', 'Country', 'Region']
+    with open(csv_file, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        for node in nodes:
+            wh = warehouses[node['hub']]
+            writer.writerow({
+                'Level': node['level'],
+                'NodeId': node['id'],
+                'ParentId': node['parent'] or "",
+                'Members': node['members'],
+                'Name': wh['Name'],
+                'Latitude': wh['Latitude'],
+                'Longitude': wh['Longitude'],
+                'City': wh['City'],
+                'State': wh['State'],
+                'Country': wh['Country'],
+                'Region': wh['Region']
+            })
+
+    # Nested tree: each node carries its hub and its children
+    by_id = {}
+    roots = []
+    for node in nodes:
+        wh = warehouses[node['hub']]
+        entry = {
+            'id': node['id'],
+            'level': node['level'],
+            'members': node['members'],
+            'hub': {k: wh[k] for k in ('Name', 'Latitude', 'Longitude', 'City', 'Country', 'Region')},
+            'children': []
+        }
+        by_id[node['id']] = entry
+        if node['parent'] is None:
+            roots.append(entry)
+        else:
+            by_id[node['parent']]['children'].append(entry)
+
+    with open(json_file, 'w') as f:
+        json.dump({'levels': timings, 'tree': roots}, f, indent=2, ensure_ascii=False)
+    print(f"Saved {len(nodes)} hierarchy nodes to {csv_file} and {json_file}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Select strategic locations as a global -> region -> metro hierarchy")
+    parser.add_argument("--metric", choices=METRICS, default="spherical", help="K-Means distance metric")
+    parser.add_argument("--seed", type=int, default=RANDOM_SEED, help="Random seed")
+    parser.add_argument("--n-init", type=int, default=N_INIT, help="K-Means restarts per cluster; lowest inertia is kept")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    with instrumentation.session("select_hierarchical_locations", args):
+        with instrumentation.timer("load"):
+            warehouses = [wh for items in load_warehouses().values() for wh in items]
+        print(f"Loaded {len(warehouses)} warehouses.")
+        with instrumentation.timer("hierarchy"):
+            nodes, timings = build_hierarchy(warehouses, metric=args.metric, random_state=args.seed, n_init=args.n_init)
+        save_hierarchy(warehouses, nodes, timings)
+
+if __name__ == "__main__":
+    main()
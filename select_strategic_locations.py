@@ -1,13 +1,27 @@
+import argparse
 import csv
 import glob
+import json
 import os
 import random
-import math
-from geopy.distance import geodesic
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+import numpy as np
+from coverage_selection import COVERAGE_RADIUS_KM, select_sites
+from distance import nearest_km
+from k_selection import K_CRITERIA, ClusterStats, best_k, embed, score_criteria
+from pairwise import pairwise_distances
+from spatial_index import to_unit_vectors, from_unit_vectors
+from cache_utils import cache_path, digest, file_digest
+from dedup import dedupe, find_duplicates
+import instrumentation
+import warehouse_io
 
 GLOBAL_DATA_DIR = "global_data"
 US_FILE = "amazon_warehouses_filled.csv"
 OUTPUT_FILE = "amazon_strategic_locations.csv"
+SETTINGS_FILE = "amazon_strategic_locations.json"  # Settings and code version OUTPUT_FILE was made with
 
 # Configuration
 LIMITS = {
@@ -16,92 +30,227 @@ LIMITS = {
     "default": 4
 }
 
+# Clustering metric: "euclidean" on raw lat/lon degrees, or "spherical"
+# (unit 3-D vectors, cosine assignment) which respects high latitudes and the antimeridian
+METRICS = ("euclidean", "spherical")
+
+# Reproducibility: fixed seed and number of K-Means restarts (best inertia wins)
+RANDOM_SEED = 42
+N_INIT = 10
+
+# Source files whose code decides the selected sites; their contents are part of the output cache key
+CODE_FILES = ["select_strategic_locations.py", "coverage_selection.py", "distance.py", "k_selection.py", "pairwise.py",
+              "spatial_index.py", "dedup.py", "warehouse_io.py", "road_network.py"]
+
+def code_version():
+    root = os.path.dirname(os.path.abspath(__file__))
+    return digest("code", [(name, file_digest(os.path.join(root, name))) for name in CODE_FILES])[:12]
+
+def restart_seeds(random_state, n_init):
+    rng = random.Random(random_state) if random_state is not None else random
+    return [rng.randrange(2**32) for _ in range(n_init)]
+
+def _fit_single(args):
+    n_clusters, max_iter, metric, seed, data, sample_weight = args
+    kmeans = SimpleKMeans(n_clusters, max_iter=max_iter, metric=metric, random_state=seed)
+    kmeans.fit(data, sample_weight)
+    return kmeans
+
+def _fit_worker(args):
+    # Pool entry point: also returns the worker's metrics for this fit, merged by the parent
+    instrumentation.reset()
+    return _fit_single(args), instrumentation.snapshot()
+
+@contextmanager
+def restart_pool(n_jobs, executor=None):
+    # Worker processes for K-Means restarts, started once and shared by every fit in the block
+    # (an executor passed in is reused as is); None when restarts run in this process
+    if executor is not None or n_jobs == 1:
+        yield executor
+        return
+    with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+        yield pool
+
 class SimpleKMeans:
-    def __init__(self, n_clusters, max_iter=100):
+    def __init__(self, n_clusters, max_iter=100, metric="euclidean", random_state=None, n_init=1, n_jobs=1,
+                 executor=None):
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric: {metric}")
         self.n_clusters = n_clusters
         self.max_iter = max_iter
+        self.metric = metric
+        self.random_state = random_state
+        self.n_init = n_init
+        self.n_jobs = n_jobs # Processes for restarts; None = all CPUs
+        self.executor = executor  # Shared restart_pool(); without one, each fit starts its own pool
         self.centroids = []
         self.clusters = []
+        self.labels = []  # Cluster index of each input point, in input order
+        self.inertia = 0.0
 
-    def fit(self, data):
+    def fit(self, data, sample_weight=None):
+        # sample_weight: optional per-point weights (e.g. geocoding precision); centroids become weighted means
         # Initialize centroids randomly from data points
         if len(data) <= self.n_clusters:
             self.centroids = data
             self.clusters = [[p] for p in data]
+            self.labels = list(range(len(data)))
+            self.inertia = 0.0
             return
 
-        self.centroids = random.sample(data, self.n_clusters)
+        if self.n_init > 1:
+            self._fit_restarts(data, sample_weight)
+            return
+
+        # Unseeded runs keep using the global random module
+        rng = random.Random(self.random_state) if self.random_state is not None else random
+
+        if self.metric == "spherical":
+            self._fit_spherical(data, rng, sample_weight)
+            self._compute_inertia(data, sample_weight)
+            return
+
+        self.centroids = rng.sample(data, self.n_clusters)
+        points = np.asarray(data, dtype=np.float64)
+        weights = np.ones(len(data)) if sample_weight is None else np.asarray(sample_weight, dtype=np.float64)
+        weighted = points * weights[:, None]
+        centers = np.asarray(self.centroids, dtype=np.float64)
         
         for _ in range(self.max_iter):
-            # Assign points to nearest centroid
-            self.clusters = [[] for _ in range(self.n_clusters)]
-            for point in data:
-                distances = [math.sqrt((point[0]-c[0])**2 + (point[1]-c[1])**2) for c in self.centroids]
-                closest_idx = distances.index(min(distances))
-                self.clusters[closest_idx].append(point)
+            instrumentation.incr("kmeans_iterations")
+            # Assign points to nearest centroid (the first one wins ties)
+            diff = points[:, None, :] - centers[None, :, :]
+            labels = np.argmin(np.sqrt(diff[..., 0] ** 2 + diff[..., 1] ** 2), axis=1)
             
-            # Update centroids
-            new_centroids = []
-            for i, cluster in enumerate(self.clusters):
-                if not cluster: # Handle empty cluster
-                    new_centroids.append(self.centroids[i])
-                    continue
-                
-                lat_sum = sum(p[0] for p in cluster)
-                lon_sum = sum(p[1] for p in cluster)
-                new_centroids.append((lat_sum/len(cluster), lon_sum/len(cluster)))
+            # Update centroids: weighted mean per cluster, accumulated in input order.
+            # Empty (or zero-weight) clusters keep their centroid.
+            sums = np.zeros_like(centers)
+            np.add.at(sums, labels, weighted)
+            totals = np.zeros(self.n_clusters)
+            np.add.at(totals, labels, weights)
+            new_centers = centers.copy()
+            filled = totals > 0
+            new_centers[filled] = sums[filled] / totals[filled, None]
             
             # Check convergence (simple check)
-            if new_centroids == self.centroids:
+            if np.array_equal(new_centers, centers):
+                break
+            centers = new_centers
+
+        self.centroids = [tuple(c) for c in centers.tolist()]
+        self.clusters = [[] for _ in range(self.n_clusters)]
+        for point, label in zip(data, labels.tolist()):
+            self.clusters[label].append(point)
+        self.labels = labels.tolist()
+        self._compute_inertia(data, sample_weight)
+
+    def _fit_restarts(self, data, sample_weight=None):
+        # Every restart has its own derived seed, so the winner does not depend on n_jobs
+        jobs = [(self.n_clusters, self.max_iter, self.metric, seed, data, sample_weight)
+                for seed in restart_seeds(self.random_state, self.n_init)]
+        with restart_pool(self.n_jobs, self.executor) as executor:
+            if executor is None:
+                runs = [_fit_single(job) for job in jobs]
+            else:
+                runs = []
+                for kmeans, metrics in executor.map(_fit_worker, jobs):
+                    instrumentation.merge(metrics)
+                    runs.append(kmeans)
+
+        best = min(range(len(runs)), key=lambda i: (runs[i].inertia, i))
+        self.centroids = runs[best].centroids
+        self.clusters = runs[best].clusters
+        self.labels = runs[best].labels
+        self.inertia = runs[best].inertia
+
+    def _compute_inertia(self, data, sample_weight=None):
+        # Sum of (weighted) squared distances to the assigned centroid (degrees^2, or squared chord length on the sphere)
+        if self.metric == "spherical":
+            points = to_unit_vectors([p[0] for p in data], [p[1] for p in data])
+            centers = to_unit_vectors([c[0] for c in self.centroids], [c[1] for c in self.centroids])
+            diff = points - centers[self.labels]
+        else:
+            points = np.asarray(data, dtype=np.float64)
+            diff = points - np.asarray(self.centroids, dtype=np.float64)[self.labels]
+        if sample_weight is None:
+            self.inertia = float((diff ** 2).sum())
+        else:
+            self.inertia = float(((diff ** 2).sum(axis=1) * np.asarray(sample_weight, dtype=np.float64)).sum())
+
+    def _fit_spherical(self, data, rng, sample_weight=None):
+        points = to_unit_vectors([p[0] for p in data], [p[1] for p in data])
+        weighted = points if sample_weight is None else points * np.asarray(sample_weight, dtype=np.float64)[:, None]
+        centers = points[rng.sample(range(len(data)), self.n_clusters)]
+        labels = None
+
+        for _ in range(self.max_iter):
+            instrumentation.incr("kmeans_iterations")
+            # Nearest centroid on the sphere = largest dot product
+            new_labels = np.argmax(points @ centers.T, axis=1)
+            if labels is not None and np.array_equal(new_labels, labels):
                 break
-            self.centroids = new_centroids
+            labels = new_labels
+
+            # Mean direction of each cluster; empty clusters keep their centroid
+            sums = np.zeros_like(centers)
+            np.add.at(sums, labels, weighted)
+            norms = np.linalg.norm(sums, axis=1)
+            filled = norms > 0
+            centers[filled] = sums[filled] / norms[filled, None]
+
+        self.clusters = [[] for _ in range(self.n_clusters)]
+        for point, label in zip(data, labels):
+            self.clusters[label].append(point)
+        self.labels = labels.tolist()
+        lat, lon = from_unit_vectors(centers)
+        self.centroids = list(zip(lat.tolist(), lon.tolist()))
 
     def predict(self, data):
         pass # Not needed for this use case
 
-def calculate_silhouette_score(data, clusters, centroids):
-    if len(clusters) < 2 or len(data) <= len(clusters):
-        return -1
-
-    scores = []
-    
-    # Flatten clusters to map points to their cluster index
-    point_to_cluster = {}
+def _silhouette(data, clusters, metric, weights=None, distances=None):
+    # a/b are (weighted) mean distances to the other members of a cluster and the
+    # score is the (weighted) mean of s(i). The pairwise distances are computed once
+    # per point list and shared by every k; each call only aggregates them by label.
+    label_of = {}
     for i, cluster in enumerate(clusters):
         for point in cluster:
-            point_to_cluster[point] = i
+            label_of[point] = i
+    labels = np.array([label_of[p] for p in data])
+    if distances is None:
+        distances = pairwise_distances(data, metric)
+    weights = np.ones(len(data)) if weights is None else np.asarray(weights, dtype=np.float64)
 
-    for point in data:
-        cluster_idx = point_to_cluster[point]
-        own_cluster = clusters[cluster_idx]
-        
-        # Calculate a (mean intra-cluster distance)
-        if len(own_cluster) > 1:
-            a = sum(math.sqrt((point[0]-p[0])**2 + (point[1]-p[1])**2) for p in own_cluster if p != point) / (len(own_cluster) - 1)
-        else:
-            a = 0
-            
-        # Calculate b (mean nearest-cluster distance)
-        b = float('inf')
-        for i, cluster in enumerate(clusters):
-            if i == cluster_idx:
-                continue
-            if not cluster:
-                continue
-            dist = sum(math.sqrt((point[0]-p[0])**2 + (point[1]-p[1])**2) for p in cluster) / len(cluster)
-            b = min(b, dist)
-            
-        if b == float('inf'): # Should not happen if k > 1
-            b = 0
+    k = len(clusters)
+    totals = np.bincount(labels, weights=weights, minlength=k)
+    sums = distances.cluster_sums(labels, k, weights)
 
-        score = (b - a) / max(a, b) if max(a, b) > 0 else 0
-        scores.append(score)
-        
-    return sum(scores) / len(scores)
+    rows = np.arange(len(data))
+    rest = totals[labels] - weights  # Weight of the rest of the point's own cluster
+    a = np.where(rest > 0, sums[rows, labels] / np.where(rest > 0, rest, 1.0), 0.0)
+    means = np.where(totals > 0, sums / np.where(totals > 0, totals, 1.0), np.inf)
+    means[rows, labels] = np.inf
+    b = means.min(axis=1)
+    b[np.isinf(b)] = 0.0
+
+    denom = np.maximum(a, b)
+    scores = np.where(denom > 0, (b - a) / np.where(denom > 0, denom, 1.0), 0.0)
+    total_weight = weights.sum()
+    return float((scores * weights).sum() / total_weight) if total_weight > 0 else 0.0
+
+def calculate_silhouette_score(data, clusters, centroids, metric="euclidean", sample_weight=None, distances=None):
+    # distances: PairwiseDistances for data (see pairwise.py); looked up or computed when omitted
+    if len(clusters) < 2 or len(data) <= len(clusters):
+        return -1
+
+    instrumentation.incr("silhouette_evaluations")
+    return _silhouette(data, clusters, metric, sample_weight, distances)
 
-def find_optimal_k(data, min_k=2, max_k=10):
-    best_k = min_k
-    best_score = -1
+def find_optimal_k(data, min_k=2, max_k=10, metric="euclidean", random_state=None, n_init=1, n_jobs=1,
+                   sample_weight=None, criterion="silhouette", compare=False, executor=None):
+    # criterion: one of K_CRITERIA (see k_selection.py); compare=True also scores and prints every other criterion
+    if criterion not in K_CRITERIA:
+        raise ValueError(f"Unknown k criterion: {criterion}")
     
     # Ensure limits are valid relative to data size
     # We need at least k points to have k clusters
@@ -120,131 +269,306 @@ def find_optimal_k(data, min_k=2, max_k=10):
     if effective_min == effective_max:
         return effective_min
 
-    for k in range(effective_min, effective_max + 1):
-        kmeans = SimpleKMeans(n_clusters=k)
-        kmeans.fit(data)
-        score = calculate_silhouette_score(data, kmeans.clusters, kmeans.centroids)
-        print(f"    k={k}: Silhouette Score = {score:.4f}")
-        
-        if score > best_score:
-            best_score = score
-            best_k = k
+    # Silhouette needs all pairwise distances (one matrix for all candidate k);
+    # the other criteria only per-cluster statistics
+    use_silhouette = criterion == "silhouette" or compare
+    distances = pairwise_distances(data, metric) if use_silhouette else None
+    points = embed(data, metric)
+
+    ks = list(range(effective_min, effective_max + 1))
+    stats = {}
+    silhouette = []
+    with restart_pool(n_jobs, executor) as executor:
+        for k in ks:
+            kmeans = SimpleKMeans(n_clusters=k, metric=metric, random_state=random_state, n_init=n_init,
+                                  n_jobs=n_jobs, executor=executor)
+            kmeans.fit(data, sample_weight)
+            stats[k] = ClusterStats(points, kmeans.labels, k, sample_weight)
+            if use_silhouette:
+                silhouette.append(calculate_silhouette_score(data, kmeans.clusters, kmeans.centroids, metric=metric,
+                                                             sample_weight=sample_weight, distances=distances))
+
+    scores = score_criteria(ks, stats)
+    if use_silhouette:
+        scores["silhouette"] = silhouette
+    for i, k in enumerate(ks):
+        if compare:
+            print(f"    k={k}: " + ", ".join(f"{c} {scores[c][i]:.4f}" for c in K_CRITERIA))
+        elif criterion == "silhouette":
+            print(f"    k={k}: Silhouette Score = {scores[criterion][i]:.4f}")
+        else:
+            print(f"    k={k}: {criterion} = {scores[criterion][i]:.4f}")
+    if compare:
+        picks = ", ".join(f"{c} {best_k(ks, scores[c])}" for c in K_CRITERIA)
+        print(f"    best k by criterion: {picks}")
             
-    return best_k
+    return best_k(ks, scores[criterion])
 
-def load_warehouses():
+def load_warehouses(weight_column=None, rejects=None):
+    # weight_column: optional CSV column (e.g. capacity) stored as each warehouse's 'Weight';
+    # rejects: optional warehouse_io.RejectLog receiving every rejected row
     warehouses_by_region = {}
     
     # Load Global Data
-    csv_files = glob.glob(os.path.join(GLOBAL_DATA_DIR, "*.csv"))
+    csv_files = sorted(glob.glob(os.path.join(GLOBAL_DATA_DIR, "*.csv")))
     for filename in csv_files:
         group = os.path.basename(filename).replace("amazon_", "").replace(".csv", "")
         if group not in warehouses_by_region:
             warehouses_by_region[group] = []
             
-        with open(filename, 'r') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                try:
-                    lat = float(row['Latitude'])
-                    lon = float(row['Longitude'])
-                    warehouses_by_region[group].append({
-                        'Name': row['Name'],
-                        'Latitude': lat,
-                        'Longitude': lon,
-                        'City': row['City'],
-                        'State': row['State'],
-                        'Country': row['Country'],
-                        'Region': group
-                    })
-                except ValueError:
-                    continue
+        # Rows with missing or out-of-range coordinates are reported by warehouse_io
+        rows, _ = warehouse_io.load_records(filename, rejects=rejects)
+        weights = _row_weights(rows, weight_column, filename)
+        for row, weight in zip(rows, weights):
+            warehouses_by_region[group].append({
+                'Name': row['Name'],
+                'Latitude': row['Latitude'],
+                'Longitude': row['Longitude'],
+                'City': row['City'],
+                'State': row['State'],
+                'Country': row['Country'],
+                'Region': group,
+                'Precision': row['Precision'],
+                'Weight': weight
+            })
 
     # Load US Data
     if os.path.exists(US_FILE):
         if "usa" not in warehouses_by_region:
             warehouses_by_region["usa"] = []
-        with open(US_FILE, 'r') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                try:
-                    lat = float(row['Latitude'])
-                    lon = float(row['Longitude'])
-                    warehouses_by_region["usa"].append({
-                        'Name': row['Name'],
-                        'Latitude': lat,
-                        'Longitude': lon,
-                        'City': row['City'],
-                        'State': row['State'],
-                        'Country': "USA",
-                        'Region': "usa"
-                    })
-                except ValueError:
-                    continue
+        rows, _ = warehouse_io.load_records(US_FILE, rejects=rejects)
+        weights = _row_weights(rows, weight_column, US_FILE)
+        for row, weight in zip(rows, weights):
+            warehouses_by_region["usa"].append({
+                'Name': row['Name'],
+                'Latitude': row['Latitude'],
+                'Longitude': row['Longitude'],
+                'City': row['City'],
+                'State': row['State'],
+                'Country': "USA",
+                'Region': "usa",
+                'Precision': row['Precision'],
+                'Weight': weight
+            })
                     
     return warehouses_by_region
 
-def select_strategic(warehouses_by_region):
+def _row_weights(rows, weight_column, filename):
+    if not weight_column:
+        return [1.0] * len(rows)
+    weights, invalid = warehouse_io.read_weights(rows, weight_column)
+    if invalid:
+        print(f"  Warning: {filename}: {invalid} rows without a valid '{weight_column}' weight, using 1.0")
+    return weights.tolist()
+
+def point_weights(items, use_weights=False, precision_weighting=False):
+    # Per-warehouse clustering weight: the loaded Weight column times the precision weight; None = unweighted
+    if not use_weights and not precision_weighting:
+        return None
+    return [(w.get('Weight', 1.0) if use_weights else 1.0) *
+            (warehouse_io.precision_weight(w) if precision_weighting else 1.0) for w in items]
+
+def select_strategic(warehouses_by_region, road_graph=None, method="kmeans", coverage_radius_km=COVERAGE_RADIUS_KM,
+                     metric="euclidean", random_state=None, n_init=1, n_jobs=1, use_weights=False,
+                     precision_weighting=False, k_criterion="silhouette", compare_k=False):
     selected_warehouses = []
     
-    for region, items in warehouses_by_region.items():
-        count = len(items)
+    # One pool of restart workers for the whole run instead of one per fit
+    with restart_pool(n_jobs) as executor:
+        for region, items in warehouses_by_region.items():
+            count = len(items)
         
-        # Define constraints based on region
-        if region in ["usa", "europe"]:
-            min_k = 4
-            max_k = 7
-        else:
-            min_k = 2
-            max_k = 4
+            # Define constraints based on region
+            if region in ["usa", "europe"]:
+                min_k = 4
+                max_k = 7
+            else:
+                min_k = 2
+                max_k = 4
             
-        # Prepare data for clustering
-        coords = [(w['Latitude'], w['Longitude']) for w in items]
+            # Prepare data for clustering
+            coords = [(w['Latitude'], w['Longitude']) for w in items]
+            # Large facilities count for more, city-centroid fallbacks for less
+            weights = point_weights(items, use_weights, precision_weighting)
         
-        # Determine optimal K
-        if count <= min_k:
-            optimal_k = count
-            print(f"Processing {region}: {count} locations (Too few for clustering, keeping all)")
-        else:
-            print(f"Processing {region}: {count} locations (Target k: {min_k}-{max_k})")
-            optimal_k = find_optimal_k(coords, min_k=min_k, max_k=max_k)
+            if method in ("coverage", "median"):
+                # Pick directly among the warehouses; k is the region's limit
+                k = min(count, LIMITS.get(region, LIMITS["default"]))
+                print(f"Processing {region}: {count} locations ({method} selection, k={k}, radius {coverage_radius_km} km)")
+                with instrumentation.timer("coverage_select"):
+                    picks, stats = select_sites([c[0] for c in coords], [c[1] for c in coords], k,
+                                                radius_km=coverage_radius_km, objective=method, weights=weights)
+                for idx in picks:
+                    selected_warehouses.append(items[idx])
+                    print(f"  -> Selected: {items[idx]['Name']} ({items[idx]['City']})")
+                print(f"  -> Objective score: {stats['score']:.3f} ({stats['evaluations']} gain evaluations)")
+                if stats['filled']:
+                    print(f"  -> {stats['filled']} sites added no {method} gain; picked farthest from the others instead")
+                continue
+        
+            # Determine optimal K
+            if count <= min_k:
+                optimal_k = count
+                print(f"Processing {region}: {count} locations (Too few for clustering, keeping all)")
+            else:
+                print(f"Processing {region}: {count} locations (Target k: {min_k}-{max_k})")
+                with instrumentation.timer("find_optimal_k"):
+                    optimal_k = find_optimal_k(coords, min_k=min_k, max_k=max_k, metric=metric,
+                                               random_state=random_state, n_init=n_init, n_jobs=n_jobs,
+                                               sample_weight=weights, criterion=k_criterion, compare=compare_k,
+                                               executor=executor)
         
-        print(f"  -> Selected optimal k={optimal_k}")
+            print(f"  -> Selected optimal k={optimal_k}")
         
-        # Run Custom K-Means with optimal K
-        kmeans = SimpleKMeans(n_clusters=optimal_k)
-        kmeans.fit(coords)
-        centers = kmeans.centroids
+            # Run Custom K-Means with optimal K
+            kmeans = SimpleKMeans(n_clusters=optimal_k, metric=metric, random_state=random_state, n_init=n_init,
+                                  n_jobs=n_jobs, executor=executor)
+            with instrumentation.timer("kmeans_fit"):
+                kmeans.fit(coords, weights)
+            centers = kmeans.centroids
         
-        # Find closest actual warehouse to each center
-        for center in centers:
-            min_dist = float('inf')
-            closest_wh = None
+            table = None
+            if road_graph is not None:
+                from road_network import build_distance_table
+                table = build_distance_table(road_graph, [w['Latitude'] for w in items], [w['Longitude'] for w in items])
+        
+            # Find closest actual warehouse to each center
+            item_lats = np.array([w['Latitude'] for w in items])
+            item_lons = np.array([w['Longitude'] for w in items])
+            for center in centers:
+                closest_wh = None
+            
+                if table is not None:
+                    # Nearest by road; centres off the network fall back to the exact geodesic
+                    _, owner = table.lookup(center[0], center[1])
+                    if owner >= 0:
+                        closest_wh = items[owner]
             
-            for wh in items:
-                dist = geodesic(center, (wh['Latitude'], wh['Longitude'])).km
-                if dist < min_dist:
-                    min_dist = dist
-                    closest_wh = wh
+                if closest_wh is None:
+                    nearest, _ = nearest_km(center[0], center[1], item_lats, item_lons)
+                    closest_wh = items[nearest] if nearest >= 0 else None
             
-            if closest_wh and closest_wh not in selected_warehouses:
-                selected_warehouses.append(closest_wh)
-                print(f"  -> Selected: {closest_wh['Name']} ({closest_wh['City']})")
+                if closest_wh and closest_wh not in selected_warehouses:
+                    selected_warehouses.append(closest_wh)
+                    print(f"  -> Selected: {closest_wh['Name']} ({closest_wh['City']})")
                 
     return selected_warehouses
 
-def save_strategic(warehouses):
+def save_strategic(warehouses, settings=None):
     with open(OUTPUT_FILE, 'w', newline='') as f:
         fieldnames = ['Name', 'Latitude', 'Longitude', 'City', 'State', 'Country', 'Region']
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction='ignore')
         writer.writeheader()
         writer.writerows(warehouses)
+    save_settings(settings)
     print(f"Saved {len(warehouses)} strategic locations to {OUTPUT_FILE}")
 
+def run_settings(args):
+    # Everything besides the input files that decides OUTPUT_FILE (unseeded runs never match)
+    return {'method': args.method, 'radius': args.radius, 'metric': args.metric,
+            'seed': args.seed if args.seed >= 0 else None, 'n_init': args.n_init, 'limits': LIMITS,
+            'dedup': args.dedup, 'min_precision': args.min_precision, 'precision_weighting': args.precision_weighting,
+            'weight_column': args.weight_column, 'k_criterion': args.k_criterion,
+            'road_network': args.road_network, 'code': code_version()}
+
+def save_settings(settings):
+    # Without settings the output's provenance is unknown, so a stale record must not survive
+    if settings is None:
+        if os.path.exists(SETTINGS_FILE):
+            os.remove(SETTINGS_FILE)
+        return
+    with open(SETTINGS_FILE, 'w') as f:
+        json.dump(settings, f, indent=2, sort_keys=True)
+
+def saved_settings():
+    try:
+        with open(SETTINGS_FILE) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Select strategic Amazon locations per region")
+    parser.add_argument("--road-network", help="Local road network file (.osm or edge-list .csv) for snapping centres by road distance")
+    parser.add_argument("--method", choices=["kmeans", "coverage", "median"], default="kmeans",
+                        help="kmeans: cluster centres snapped to warehouses; coverage/median: greedy max-coverage or p-median over warehouses")
+    parser.add_argument("--radius", type=float, default=COVERAGE_RADIUS_KM, help="Coverage radius in km for coverage/median")
+    parser.add_argument("--metric", choices=METRICS, default="euclidean",
+                        help="K-Means distance: raw lat/lon (euclidean) or great-circle on the sphere (spherical)")
+    parser.add_argument("--seed", type=int, default=RANDOM_SEED, help="Random seed (negative = unseeded, not cached)")
+    parser.add_argument("--n-init", type=int, default=N_INIT, help="K-Means restarts per fit; lowest inertia is kept")
+    parser.add_argument("--jobs", type=int, default=1, help="Processes used to run restarts in parallel (0 = all CPUs)")
+    parser.add_argument("--dedup", action="store_true", help="Drop duplicate and stacked records (see dedup.py) before selecting")
+    parser.add_argument("--min-precision", choices=warehouse_io.PRECISION_LEVELS, default="city",
+                        help="Exclude warehouses geocoded more coarsely than this (default: keep all)")
+    parser.add_argument("--precision-weighting", action="store_true",
+                        help="Weight warehouses by geocoding precision (city-centroid fallbacks count less)")
+    parser.add_argument("--weight-column", help="CSV column with a per-warehouse weight (e.g. capacity) for weighted K-Means/silhouette")
+    parser.add_argument("--k-criterion", choices=K_CRITERIA, default="silhouette",
+                        help="How k is chosen per region; all but silhouette cost O(N*k) instead of O(N^2)")
+    parser.add_argument("--compare-k", action="store_true", help="Also print every other k criterion's scores and pick")
+    parser.add_argument("--rejects", metavar="FILE", help="Write every row rejected while loading to this CSV")
+    instrumentation.add_arguments(parser)
+    return parser
+
 def main():
-    data = load_warehouses()
-    strategic = select_strategic(data)
-    save_strategic(strategic)
+    args = build_parser().parse_args()
+
+    with instrumentation.session("select_strategic_locations", args):
+        run(args)
+
+def run(args):
+    seed = args.seed if args.seed >= 0 else None
+    settings = run_settings(args)
+
+    # Seeded runs are deterministic, so the output is cached by input + settings + code hash
+    # (--compare-k and --rejects are run for their printout / reject file, so they always recompute)
+    cached = None
+    if seed is not None and not args.compare_k and not args.rejects:
+        inputs = sorted(glob.glob(os.path.join(GLOBAL_DATA_DIR, "*.csv")))
+        if os.path.exists(US_FILE):
+            inputs.append(US_FILE)
+        if args.road_network:
+            inputs.append(args.road_network)
+        key = digest("strategic", [(f, file_digest(f)) for f in inputs], sorted(settings.items()))
+        cached = cache_path("strategic", key, ".csv")
+        if os.path.exists(cached):
+            instrumentation.incr("cache_hits.strategic")
+            shutil.copyfile(cached, OUTPUT_FILE)
+            save_settings(settings)
+            print(f"Inputs unchanged; restored {OUTPUT_FILE} from cache")
+            return
+        instrumentation.incr("cache_misses.strategic")
+
+    road_graph = None
+    if args.road_network:
+        from road_network import load_road_network
+        road_graph = load_road_network(args.road_network)
+
+    with instrumentation.timer("load"), warehouse_io.open_rejects(args.rejects) as rejects:
+        data = load_warehouses(args.weight_column, rejects)
+    if args.min_precision != "city":
+        for region, items in data.items():
+            kept = [w for w in items if warehouse_io.meets_precision(w, args.min_precision)]
+            if len(kept) < len(items):
+                print(f"  {region}: excluded {len(items) - len(kept)} warehouses below {args.min_precision} precision")
+            data[region] = kept
+    if args.dedup:
+        # Stacked city-centroid points and repeated codes would otherwise pull centroids toward them
+        for region, items in data.items():
+            kept = dedupe(items, find_duplicates(items))
+            if len(kept) < len(items):
+                print(f"  {region}: dropped {len(items) - len(kept)} duplicate records")
+            data[region] = kept
+    with instrumentation.timer("select"):
+        strategic = select_strategic(data, road_graph=road_graph, method=args.method, coverage_radius_km=args.radius,
+                                     metric=args.metric, random_state=seed, n_init=args.n_init,
+                                     n_jobs=args.jobs or None, use_weights=bool(args.weight_column),
+                                     precision_weighting=args.precision_weighting, k_criterion=args.k_criterion,
+                                     compare_k=args.compare_k)
+    save_strategic(strategic, settings)
+    if cached:
+        shutil.copyfile(OUTPUT_FILE, cached)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,219 @@
+import argparse
+import glob
+import json
+import os
+import numpy as np
+from cache_utils import cache_path, digest, file_digest
+from demand_coverage import FacilityNetwork
+from select_strategic_locations import GLOBAL_DATA_DIR, US_FILE, load_warehouses
+import instrumentation
+import warehouse_io
+
+# Service areas: the region each warehouse serves, i.e. where it is the
+# nearest facility (a spherical Voronoi cell, rasterised). Every cell of a
+# lat/lon raster is assigned the warehouse nearest to its centre; the raster
+# is stored run-length encoded (one run per stretch of a row with the same
+# owner) and cached under .cache/ by a hash of the input CSVs. "Which
+# warehouse serves P" is then a binary search over the run starts. Answers
+# are exact except within about one cell of a boundary.
+
+GEOJSON_FILE = "service_areas.geojson"
+CELL_DEG = 0.25     # Lookup raster
+DISPLAY_DEG = 1.0   # Coarser raster used for the map overlay, to keep the GeoJSON small
+ROWS_PER_BLOCK = 64
+
+# Fill colours for the overlay; neighbours can repeat a colour, names are in the tooltip
+PALETTE = ["#e41a1c", "#377eb8", "#4daf4a", "#984ea3", "#ff7f00", "#ffff33",
+           "#a65628", "#f781bf", "#999999", "#66c2a5", "#fc8d62", "#8da0cb"]
+
+class ServiceAreas:
+    def __init__(self, facilities, cell_deg, starts, owners):
+        self.facilities = facilities  # [{'Name', 'Region', 'Latitude', 'Longitude'}]
+        self.cell_deg = cell_deg
+        self.n_rows = max(1, int(round(180.0 / cell_deg)))
+        self.n_cols = max(1, int(round(360.0 / cell_deg)))
+        self.starts = starts  # int64 flat cell index (row * n_cols + col) where each run begins
+        self.owners = owners  # int32 facility index of each run
+
+    @classmethod
+    def build(cls, facilities, cell_deg=CELL_DEG):
+        areas = cls(facilities, cell_deg, None, None)
+        network = FacilityNetwork("service", facilities)
+        row_deg = 180.0 / areas.n_rows
+        col_deg = 360.0 / areas.n_cols
+        lons = -180.0 + (np.arange(areas.n_cols) + 0.5) * col_deg
+        starts, owners = [], []
+        for row0 in range(0, areas.n_rows, ROWS_PER_BLOCK):
+            rows = np.arange(row0, min(row0 + ROWS_PER_BLOCK, areas.n_rows))
+            lat = np.repeat(-90.0 + (rows + 0.5) * row_deg, areas.n_cols)
+            lon = np.tile(lons, len(rows))
+            owner, _ = network.nearest(lat, lon)
+            # A run starts at every row start and wherever the owner changes
+            new_run = np.ones(len(owner), dtype=bool)
+            new_run[1:] = owner[1:] != owner[:-1]
+            new_run[::areas.n_cols] = True
+            at = np.flatnonzero(new_run)
+            starts.append(at + row0 * areas.n_cols)
+            owners.append(owner[at].astype(np.int32))
+        areas.starts = np.concatenate(starts)
+        areas.owners = np.concatenate(owners)
+        return areas
+
+    def cell_index(self, lats, lons):
+        rows = np.clip(np.floor((np.asarray(lats, dtype=np.float64) + 90.0) / 180.0 * self.n_rows), 0, self.n_rows - 1)
+        cols = np.floor((np.asarray(lons, dtype=np.float64) + 180.0) / 360.0 * self.n_cols) % self.n_cols
+        return rows.astype(np.int64) * self.n_cols + cols.astype(np.int64)
+
+    def lookup_many(self, lats, lons):
+        # Facility index serving each point: O(log runs) per point
+        cells = self.cell_index(lats, lons)
+        return self.owners[np.searchsorted(self.starts, cells, side='right') - 1]
+
+    def lookup(self, lat, lon):
+        return self.facilities[int(self.lookup_many([lat], [lon])[0])]
+
+    def cell_counts(self):
+        # Raster cells per facility (a rough, latitude-weighted area measure)
+        lengths = np.diff(np.append(self.starts, self.n_rows * self.n_cols))
+        return np.bincount(self.owners, weights=lengths, minlength=len(self.facilities)).astype(np.int64)
+
+    def to_geojson(self, display_deg=DISPLAY_DEG):
+        # One MultiPolygon feature per facility, made of row runs on a coarser raster;
+        # runs covering the same columns in consecutive rows are merged into one rectangle
+        n_rows = max(1, int(round(180.0 / display_deg)))
+        n_cols = max(1, int(round(360.0 / display_deg)))
+        row_deg = 180.0 / n_rows
+        col_deg = 360.0 / n_cols
+        col_lons = -180.0 + (np.arange(n_cols) + 0.5) * col_deg
+
+        rects = {}  # facility -> [[row_lo, row_hi, col_lo, col_hi]]
+        open_runs = {}  # (col_lo, col_hi, facility) -> rectangle still growing northwards
+        for row in range(n_rows):
+            lat = -90.0 + (row + 0.5) * row_deg
+            owner = self.lookup_many(np.full(n_cols, lat), col_lons)
+            edges = np.flatnonzero(np.diff(owner)) + 1
+            bounds = np.concatenate(([0], edges, [n_cols]))
+            still_open = {}
+            for lo, hi in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+                key = (lo, hi, int(owner[lo]))
+                rect = open_runs.get(key)
+                if rect is None:
+                    rect = [row, row + 1, lo, hi]
+                    rects.setdefault(key[2], []).append(rect)
+                else:
+                    rect[1] = row + 1
+                still_open[key] = rect
+            open_runs = still_open
+
+        features = []
+        for i, facility in enumerate(self.facilities):
+            polygons = []
+            for row_lo, row_hi, col_lo, col_hi in rects.get(i, []):
+                south = round(-90.0 + row_lo * row_deg, 4)
+                north = round(-90.0 + row_hi * row_deg, 4)
+                west = round(-180.0 + col_lo * col_deg, 4)
+                east = round(-180.0 + col_hi * col_deg, 4)
+                polygons.append([[[west, south], [east, south], [east, north], [west, north], [west, south]]])
+            if not polygons:
+                continue
+            features.append({
+                'type': "Feature",
+                'properties': {'name': facility['Name'], 'region': facility['Region'],
+                               'color': PALETTE[i % len(PALETTE)]},
+                'geometry': {'type': "MultiPolygon", 'coordinates': polygons},
+            })
+        return {'type': "FeatureCollection", 'features': features}
+
+def collect_facilities(warehouses_by_region, regions=None):
+    facilities = []
+    for region, items in warehouses_by_region.items():
+        if regions and region not in regions:
+            continue
+        for w in items:
+            facilities.append({'Name': w['Name'], 'Region': region,
+                               'Latitude': w['Latitude'], 'Longitude': w['Longitude']})
+    return facilities
+
+def input_files():
+    files = sorted(glob.glob(os.path.join(GLOBAL_DATA_DIR, "*.csv")))
+    if os.path.exists(US_FILE):
+        files.append(US_FILE)
+    return files
+
+def load_service_areas(cell_deg=CELL_DEG, regions=None, min_precision="city"):
+    # Raster cached by input hash; the facility list is reloaded, in the same order, from the CSVs
+    data = load_warehouses()
+    for region, items in data.items():
+        data[region] = [w for w in items if warehouse_io.meets_precision(w, min_precision)]
+    facilities = collect_facilities(data, regions)
+    if not facilities:
+        raise ValueError("no warehouses to build service areas from")
+
+    key = digest("service_areas", [(f, file_digest(f)) for f in input_files()], cell_deg,
+                 sorted(regions or []), min_precision)
+    cached = cache_path("service_areas", key, ".npz")
+    if os.path.exists(cached):
+        instrumentation.incr("cache_hits.service_areas")
+        stored = np.load(cached)
+        return ServiceAreas(facilities, cell_deg, stored['starts'], stored['owners'])
+
+    instrumentation.incr("cache_misses.service_areas")
+    with instrumentation.timer("service_area_raster"):
+        areas = ServiceAreas.build(facilities, cell_deg)
+    np.savez(cached, starts=areas.starts, owners=areas.owners)
+    return areas
+
+def save_geojson(areas, filename=GEOJSON_FILE, display_deg=DISPLAY_DEG):
+    with instrumentation.timer("service_area_geojson"):
+        collection = areas.to_geojson(display_deg)
+    with open(filename, 'w') as f:
+        json.dump(collection, f, separators=(',', ':'))
+    return collection
+
+def add_overlay(m, geojson, name="Service areas"):
+    # One GeoJson layer for all cells; geojson is a dict or a file path
+    import folium
+    if isinstance(geojson, str):
+        with open(geojson, 'r') as f:
+            geojson = json.load(f)
+    folium.GeoJson(
+        geojson,
+        name=name,
+        style_function=lambda feature: {'fillColor': feature['properties']['color'], 'color': feature['properties']['color'],
+                                        'weight': 0, 'fillOpacity': 0.25},
+        tooltip=folium.GeoJsonTooltip(fields=['name', 'region'], aliases=['Warehouse', 'Region']),
+    ).add_to(m)
+    folium.LayerControl().add_to(m)
+    return m
+
+def main():
+    parser = argparse.ArgumentParser(description="Nearest-warehouse service areas with fast point lookup")
+    parser.add_argument("--cell-deg", type=float, default=CELL_DEG, help="Lookup raster cell size in degrees")
+    parser.add_argument("--display-deg", type=float, default=DISPLAY_DEG, help="Cell size of the GeoJSON overlay")
+    parser.add_argument("--region", action="append", help="Only warehouses of this region (repeatable, e.g. usa)")
+    parser.add_argument("--min-precision", choices=warehouse_io.PRECISION_LEVELS, default="city",
+                        help="Ignore warehouses geocoded more coarsely than this")
+    parser.add_argument("--output", default=GEOJSON_FILE, help="GeoJSON overlay file")
+    parser.add_argument("--lookup", type=float, nargs=2, action="append", metavar=("LAT", "LON"),
+                        help="Print the warehouse serving this point (repeatable)")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    with instrumentation.session("service_areas", args):
+        with instrumentation.timer("load"):
+            areas = load_service_areas(args.cell_deg, args.region, args.min_precision)
+        counts = areas.cell_counts()
+        print(f"{len(areas.facilities)} warehouses, {areas.n_rows}x{areas.n_cols} raster, "
+              f"{len(areas.starts)} runs ({(areas.starts.nbytes + areas.owners.nbytes) / 1e6:.1f} MB)")
+        print(f"  {int((counts > 0).sum())} warehouses own at least one cell")
+
+        collection = save_geojson(areas, args.output, args.display_deg)
+        print(f"Service areas saved to {args.output} ({len(collection['features'])} features, "
+              f"{os.path.getsize(args.output) / 1e6:.1f} MB)")
+
+        for lat, lon in args.lookup or []:
+            facility = areas.lookup(lat, lon)
+            print(f"  ({lat}, {lon}) -> {facility['Name']} ({facility['Region']})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+import argparse
+import csv
+import glob
+import json
+import os
+import shutil
+import time
+import numpy as np
+from cache_utils import digest, file_digest
+from dedup import normalize_key, record_key
+from spatial_index import haversine_km
+import instrumentation
+import warehouse_io
+
+# Versioned warehouse datasets and network-change diffs.
+# A snapshot records the content hash of every tracked CSV; the files
+# themselves are stored once each under objects/ by hash, so unchanged files
+# cost nothing and old versions are never overwritten. The log is
+# append-only. Diffs skip files whose hash did not change and compare the rest
+# through dict indexes keyed on (brand, code) -- or the name when there is no
+# code -- so each region diff is linear in its size. Every region whose file
+# changed is rerun (strategic selection, and the US overlap analysis for the
+# US and Walmart lists), even when nothing opened, closed or moved: a small
+# coordinate shift or another column still changes the results.
+
+SNAPSHOT_DIR = "snapshots"
+LOG_FILE = "log.jsonl"
+REPORT_FILE = "snapshot_diff.csv"
+GLOBAL_DATA_DIR = "global_data"
+US_FILE = "amazon_warehouses_filled.csv"
+WALMART_FILE = "walmart_warehouses.csv"
+MOVE_THRESHOLD_KM = 0.5  # Smaller coordinate changes are geocoding noise, not a move
+
+def tracked_files():
+    files = sorted(glob.glob(os.path.join(GLOBAL_DATA_DIR, "*.csv")))
+    return [f for f in [US_FILE, WALMART_FILE] if os.path.exists(f)] + files
+
+def region_of(path):
+    if path == US_FILE:
+        return "usa"
+    if path == WALMART_FILE:
+        return "walmart"
+    return os.path.basename(path).replace("amazon_", "").replace(".csv", "")
+
+class SnapshotStore:
+    def __init__(self, root=SNAPSHOT_DIR):
+        self.root = root
+        self.log_file = os.path.join(root, LOG_FILE)
+
+    def snapshots(self):
+        if not os.path.exists(self.log_file):
+            return []
+        with open(self.log_file, 'r') as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def get(self, ref):
+        # ref: snapshot id (or unique prefix), "latest", or "previous"
+        entries = self.snapshots()
+        if ref in ("latest", "previous"):
+            offset = 1 if ref == "latest" else 2
+            if len(entries) < offset:
+                raise ValueError(f"no {ref} snapshot in {self.root}")
+            return entries[-offset]
+        matches = [e for e in entries if e['id'].startswith(ref)]
+        if not matches or len({e['id'] for e in matches}) > 1:
+            raise ValueError(f"snapshot '{ref}' is {'ambiguous' if matches else 'unknown'}")
+        return matches[-1]
+
+    def object_path(self, content_hash):
+        return os.path.join(self.root, "objects", content_hash[:2], content_hash + ".csv")
+
+    def put_object(self, filename):
+        content_hash = file_digest(filename)
+        path = self.object_path(content_hash)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            shutil.copyfile(filename, path + ".tmp")
+            os.replace(path + ".tmp", path)
+            instrumentation.incr("snapshot_objects_written")
+        return content_hash
+
+    def take(self, files, label=""):
+        # Returns (entry, created); identical content to the latest snapshot is not recorded again
+        manifest = {f: self.put_object(f) for f in files}
+        snapshot_id = digest("snapshot", sorted(manifest.items()))[:12]
+        entries = self.snapshots()
+        if entries and entries[-1]['id'] == snapshot_id:
+            return entries[-1], False
+        entry = {'id': snapshot_id, 'created': time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                 'label': label, 'parent': entries[-1]['id'] if entries else None, 'files': manifest}
+        os.makedirs(self.root, exist_ok=True)
+        with open(self.log_file, 'a') as f:
+            f.write(json.dumps(entry, sort_keys=True) + "\n")
+        return entry, True
+
+def facility_index(filename):
+    # key -> record; repeated keys within a file get an occurrence number so none is lost
+    index = {}
+    if filename is None:
+        return index
+    records, _ = warehouse_io.load_records(filename)
+    for record in records:
+        key = record_key(record) or ("", normalize_key(record.get('Name', '')))
+        n = 0
+        while (key, n) in index:
+            n += 1
+        index[(key, n)] = record
+    return index
+
+def diff_indexes(old, new, move_km=MOVE_THRESHOLD_KM):
+    opened = [new[k] for k in new.keys() - old.keys()]
+    closed = [old[k] for k in old.keys() - new.keys()]
+    common = sorted(old.keys() & new.keys())
+    moved = []
+    if common:
+        old_lat = np.array([old[k]['Latitude'] for k in common])
+        old_lon = np.array([old[k]['Longitude'] for k in common])
+        new_lat = np.array([new[k]['Latitude'] for k in common])
+        new_lon = np.array([new[k]['Longitude'] for k in common])
+        dist = haversine_km(old_lat, old_lon, new_lat, new_lon)
+        for i in np.flatnonzero(dist > move_km):
+            moved.append((old[common[i]], new[common[i]], float(dist[i])))
+    return {'opened': opened, 'closed': closed, 'moved': moved}
+
+def diff_snapshots(store, old_entry, new_entry, move_km=MOVE_THRESHOLD_KM):
+    # region -> diff, for every region whose file content changed (or that appeared / disappeared);
+    # the diff may be empty when only sub-threshold moves or other columns changed
+    diffs = {}
+    old_files, new_files = old_entry['files'], new_entry['files']
+    for path in sorted(old_files.keys() | new_files.keys()):
+        old_hash, new_hash = old_files.get(path), new_files.get(path)
+        if old_hash == new_hash:
+            instrumentation.incr("snapshot_files_unchanged")
+            continue
+        with instrumentation.timer("snapshot_diff"):
+            old = facility_index(store.object_path(old_hash) if old_hash else None)
+            new = facility_index(store.object_path(new_hash) if new_hash else None)
+            diffs[region_of(path)] = diff_indexes(old, new, move_km)
+    return diffs
+
+def write_report(diffs, filename):
+    with open(filename, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Change', 'Region', 'Name', 'City', 'OldLatitude', 'OldLongitude', 'Latitude', 'Longitude', 'MovedKm'])
+        for region, diff in sorted(diffs.items()):
+            for r in diff['opened']:
+                writer.writerow(['opened', region, r.get('Name', ''), r.get('City', ''), '', '', r['Latitude'], r['Longitude'], ''])
+            for r in diff['closed']:
+                writer.writerow(['closed', region, r.get('Name', ''), r.get('City', ''), r['Latitude'], r['Longitude'], '', '', ''])
+            for old, new, km in diff['moved']:
+                writer.writerow(['moved', region, new.get('Name', ''), new.get('City', ''), old['Latitude'], old['Longitude'],
+                                 new['Latitude'], new['Longitude'], round(km, 3)])
+
+def print_diffs(diffs):
+    if not diffs:
+        print("No file changes.")
+        return
+    for region, diff in sorted(diffs.items()):
+        if not any(diff.values()):
+            print(f"  {region}: file changed, no facility opened, closed or moved more than the threshold")
+            continue
+        print(f"  {region}: {len(diff['opened'])} opened, {len(diff['closed'])} closed, {len(diff['moved'])} moved")
+
+def rerun_strategic(regions):
+    # Each region is clustered on its own with the same seed, so rerunning only the changed
+    # regions and keeping the other rows gives the same file as a full run -- provided the
+    # existing rows were made with the same settings and code. Otherwise everything is rerun.
+    import select_strategic_locations as strategic
+
+    args = strategic.build_parser().parse_args([])
+    settings = strategic.run_settings(args)
+    if not os.path.exists(strategic.OUTPUT_FILE) or strategic.saved_settings() != settings:
+        print(f"  {strategic.OUTPUT_FILE} was made with other settings or code; rerunning all regions")
+        strategic.run(args)
+        return
+
+    data = strategic.load_warehouses()
+    affected = [r for r in data if r in regions]
+    selected = strategic.select_strategic({r: data[r] for r in affected}, random_state=args.seed, n_init=args.n_init)
+    existing = {}
+    with open(strategic.OUTPUT_FILE, 'r', newline='') as f:
+        for row in csv.DictReader(f):
+            existing.setdefault(row['Region'], []).append(row)
+    merged = []
+    for region in data:
+        if region in regions:
+            merged.extend(w for w in selected if w['Region'] == region)
+        else:
+            merged.extend(existing.get(region, []))
+    strategic.save_strategic(merged, settings)
+
+def rerun_overlap():
+    import analyze_locations
+    analyze_locations.run(argparse.Namespace(road_network=None, min_precision="city",
+                                             precision_weighting=False, density=False, rejects=None))
+
+def rerun_affected(diffs):
+    regions = set(diffs)
+    amazon = regions - {"walmart"}
+    if amazon:
+        print(f"\nRerunning strategic selection for: {', '.join(sorted(amazon))}")
+        with instrumentation.timer("rerun_strategic"):
+            rerun_strategic(amazon)
+    if regions & {"usa", "walmart"}:
+        print("\nRerunning US overlap analysis")
+        with instrumentation.timer("rerun_overlap"):
+            rerun_overlap()
+    if not amazon and not regions & {"usa", "walmart"}:
+        print("Nothing to rerun.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Versioned warehouse snapshots, diffs and incremental reruns")
+    parser.add_argument("--store", default=SNAPSHOT_DIR, help="Snapshot store directory")
+    instrumentation.add_arguments(parser)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    take = commands.add_parser("snapshot", help="Record the current warehouse CSVs")
+    take.add_argument("--label", default="", help="Free-text note stored with the snapshot")
+
+    commands.add_parser("list", help="List snapshots")
+
+    diff = commands.add_parser("diff", help="Opened/closed/moved facilities between two snapshots")
+    diff.add_argument("old", nargs="?", default="previous")
+    diff.add_argument("new", nargs="?", default="latest")
+    diff.add_argument("--move-km", type=float, default=MOVE_THRESHOLD_KM, help="Minimum distance that counts as a move")
+    diff.add_argument("--report", default=REPORT_FILE, help="CSV listing every change")
+
+    update = commands.add_parser("update", help="Snapshot, diff against the previous snapshot and rerun affected regions")
+    update.add_argument("--label", default="")
+    update.add_argument("--move-km", type=float, default=MOVE_THRESHOLD_KM)
+    update.add_argument("--report", default=REPORT_FILE)
+    args = parser.parse_args()
+
+    store = SnapshotStore(args.store)
+    with instrumentation.session("snapshots", args):
+        if args.command == "list":
+            for entry in store.snapshots():
+                print(f"{entry['id']}  {entry['created']}  {len(entry['files'])} files  {entry['label']}")
+            return
+
+        if args.command in ("snapshot", "update"):
+            previous = store.snapshots()[-1:]
+            entry, created = store.take(tracked_files(), args.label)
+            print(f"Snapshot {entry['id']} {'recorded' if created else 'unchanged (same content as latest)'}")
+            if args.command == "snapshot":
+                return
+            if not previous:
+                print("First snapshot; nothing to compare with.")
+                return
+            old, new = previous[0], entry
+        else:
+            old, new = store.get(args.old), store.get(args.new)
+
+        diffs = diff_snapshots(store, old, new, args.move_km)
+        print(f"Changes {old['id']} -> {new['id']}:")
+        print_diffs(diffs)
+        write_report(diffs, args.report)
+        print(f"Report saved to {args.report}")
+        if args.command == "update" and diffs:
+            rerun_affected(diffs)
+
+if __name__ == "__main__":
+    main()
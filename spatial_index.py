@@ -0,0 +1,111 @@
+import math
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEG = math.pi * EARTH_RADIUS_KM / 180.0
+HALF_CIRCUMFERENCE_KM = math.pi * EARTH_RADIUS_KM
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    # Works on scalars or numpy arrays (broadcasting)
+    lat1 = np.radians(lat1)
+    lat2 = np.radians(lat2)
+    dlat = lat2 - lat1
+    dlon = np.radians(lon2) - np.radians(lon1)
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def to_unit_vectors(lats, lons):
+    # (N, 3) points on the unit sphere
+    lat = np.radians(np.asarray(lats, dtype=np.float64))
+    lon = np.radians(np.asarray(lons, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
+
+def from_unit_vectors(vectors):
+    vectors = np.asarray(vectors, dtype=np.float64)
+    norm = np.linalg.norm(vectors, axis=1)
+    norm[norm == 0] = 1.0
+    lat = np.degrees(np.arcsin(np.clip(vectors[:, 2] / norm, -1.0, 1.0)))
+    lon = np.degrees(np.arctan2(vectors[:, 1], vectors[:, 0]))
+    return lat, lon
+
+def great_circle_matrix_km(vectors_a, vectors_b):
+    # Pairwise great-circle distances from unit vectors via dot products
+    return EARTH_RADIUS_KM * np.arccos(np.clip(vectors_a @ vectors_b.T, -1.0, 1.0))
+
+class GridIndex:
+    # Bucket points into fixed lat/lon cells; longitude wraps at the antimeridian.
+    def __init__(self, lats, lons, cell_deg=0.5):
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+        self.cell_deg = cell_deg
+        self.n_rows = int(math.ceil(180.0 / cell_deg)) + 1
+        self.n_cols = int(math.ceil(360.0 / cell_deg))
+
+        rows, cols = self._cells(self.lats, self.lons)
+        keys = rows * self.n_cols + cols
+        self.order = np.argsort(keys, kind='stable')
+        uniq, starts, counts = np.unique(keys[self.order], return_index=True, return_counts=True)
+        self.cells = {int(k): (int(s), int(s + c)) for k, s, c in zip(uniq, starts, counts)}
+
+    def __len__(self):
+        return len(self.lats)
+
+    def _cells(self, lats, lons):
+        rows = np.floor((np.asarray(lats) + 90.0) / self.cell_deg).astype(np.int64)
+        cols = np.floor((np.asarray(lons) + 180.0) / self.cell_deg).astype(np.int64) % self.n_cols
+        return rows, cols
+
+    def candidates(self, lat, lon, radius_km):
+        # Indices of all points in cells that may lie within radius_km of (lat, lon)
+        if radius_km >= HALF_CIRCUMFERENCE_KM / 2:
+            return np.arange(len(self.lats))
+
+        radius_deg = radius_km / KM_PER_DEG
+        row_lo = int(math.floor((max(lat - radius_deg, -90.0) + 90.0) / self.cell_deg))
+        row_hi = int(math.floor((min(lat + radius_deg, 90.0) + 90.0) / self.cell_deg))
+
+        # Longitude half-width of a spherical cap; the cap covers a pole -> all columns
+        if abs(lat) + radius_deg >= 90.0:
+            col_range = range(self.n_cols)
+        else:
+            ratio = math.sin(math.radians(radius_deg)) / math.cos(math.radians(lat))
+            dlon = math.degrees(math.asin(min(1.0, ratio)))
+            span = int(math.ceil(dlon / self.cell_deg)) + 1
+            if 2 * span + 1 >= self.n_cols:
+                col_range = range(self.n_cols)
+            else:
+                col = int(math.floor((lon + 180.0) / self.cell_deg))
+                col_range = [(col + d) % self.n_cols for d in range(-span, span + 1)]
+
+        chunks = []
+        for row in range(row_lo, row_hi + 1):
+            base = row * self.n_cols
+            for col in col_range:
+                cell = self.cells.get(base + col)
+                if cell:
+                    chunks.append(self.order[cell[0]:cell[1]])
+        if not chunks:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(chunks)
+
+    def query_radius(self, lat, lon, radius_km):
+        idx = self.candidates(lat, lon, radius_km)
+        if len(idx) == 0:
+            return idx, np.empty(0)
+        dist = haversine_km(lat, lon, self.lats[idx], self.lons[idx])
+        mask = dist <= radius_km
+        return idx[mask], dist[mask]
+
+    def nearest(self, lat, lon):
+        # Grow the search radius until something is found; anything outside the
+        # radius is farther than what is inside, so the first hit set is exact.
+        if len(self.lats) == 0:
+            return -1, float('inf')
+        radius = self.cell_deg * KM_PER_DEG
+        while True:
+            idx, dist = self.query_radius(lat, lon, radius)
+            if len(idx):
+                best = int(np.argmin(dist))
+                return int(idx[best]), float(dist[best])
+            radius *= 2
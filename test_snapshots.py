@@ -0,0 +1,44 @@
+import csv
+import os
+import shutil
+import select_strategic_locations as strategic
+import snapshots
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def _move_first(filename, dlat):
+    with open(filename, 'r', newline='') as f:
+        rows = list(csv.DictReader(f))
+    rows[0]['Latitude'] = f"{float(rows[0]['Latitude']) + dlat:.7f}"
+    with open(filename, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+def _read(filename):
+    with open(filename, 'rb') as f:
+        return f.read()
+
+def test_partial_rerun_matches_full_run_after_small_move(tmp_path, monkeypatch):
+    shutil.copytree(os.path.join(ROOT_DIR, snapshots.GLOBAL_DATA_DIR), tmp_path / snapshots.GLOBAL_DATA_DIR)
+    monkeypatch.chdir(tmp_path)
+    args = strategic.build_parser().parse_args([])
+    strategic.run(args)
+    before = _read(strategic.OUTPUT_FILE)
+    store = snapshots.SnapshotStore()
+    old, _ = store.take(snapshots.tracked_files())
+
+    # ~330 m: below MOVE_THRESHOLD_KM, so the diff lists no move, but the centroid still shifts
+    egypt = os.path.join(snapshots.GLOBAL_DATA_DIR, "amazon_egypt.csv")
+    _move_first(egypt, 0.003)
+    new, _ = store.take(snapshots.tracked_files())
+    diffs = snapshots.diff_snapshots(store, old, new)
+    assert list(diffs) == ["egypt"]
+    assert not any(diffs["egypt"].values())
+
+    snapshots.rerun_affected(diffs)
+    partial = _read(strategic.OUTPUT_FILE)
+    assert partial != before
+    # The partial rerun does not fill the cache, so this is a real full run on the new inputs
+    strategic.run(args)
+    assert partial == _read(strategic.OUTPUT_FILE)
@@ -0,0 +1,120 @@
+import argparse
+import os
+import sys
+
+import instrumentation
+from pipeline import Pipeline, Stage
+from warehouse_paths import ARCHIVE_DIR, FILTERED_FILE, FILTERED_MAP, GLOBAL_MAP
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT_DIR, ARCHIVE_DIR))
+
+# Raw source lists (not all of them are checked in; stages without raw input keep their outputs)
+AMAZON_US_RAW = "amazon_warehouses_1.csv"
+WALMART_RAW = os.path.join(ARCHIVE_DIR, "walmart_warehouses.txt")
+GLOBAL_RAW = os.path.join(ARCHIVE_DIR, "amazon_global_raw.txt")
+
+US_FILE = "amazon_warehouses_filled.csv"
+WALMART_FILE = "walmart_warehouses.csv"
+GLOBAL_FILES = os.path.join("global_data", "*.csv")
+GEOCODER = "nominatim"  # Pipeline resource held by the geocoding stages
+
+def build_pipeline(seed):
+    import analyze_locations
+    import fill_missing_coordinates
+    import filter_warehouses
+    import geocode_walmart
+    import map_filtered_warehouses
+    import map_global_warehouses
+    import map_strategic_locations
+    import process_global_warehouses
+    import select_hierarchical_locations
+    import select_strategic_locations as strategic
+
+    amazon_inputs = [US_FILE, GLOBAL_FILES]
+
+    def run_filter(results):
+        warehouses = [wh for items in results["load_amazon"].values() for wh in items]
+        kept = filter_warehouses.filter_warehouses(warehouses)
+        filter_warehouses.save_filtered(kept, FILTERED_FILE)
+        return kept
+
+    def run_strategic(results):
+        # Same result as select_strategic_locations.py --seed <seed>, so it records the same settings
+        args = strategic.build_parser().parse_args(["--seed", str(seed)])
+        selected = strategic.select_strategic(results["load_amazon"], random_state=seed, n_init=args.n_init)
+        strategic.save_strategic(selected, strategic.run_settings(args))
+        return selected
+
+    def run_hierarchy(results):
+        warehouses = [wh for items in results["load_amazon"].values() for wh in items]
+        nodes, timings = select_hierarchical_locations.build_hierarchy(warehouses, random_state=seed)
+        select_hierarchical_locations.save_hierarchy(warehouses, nodes, timings)
+        return nodes
+
+    return Pipeline([
+        # Geocoding: independent of each other, but they share Nominatim's 1 request/s limit
+        # and the geocode cache file, so they run one at a time
+        Stage("geocode_amazon_us", lambda r: fill_missing_coordinates.main(AMAZON_US_RAW, US_FILE),
+              inputs=[AMAZON_US_RAW], outputs=[US_FILE], resource=GEOCODER),
+        Stage("geocode_walmart", lambda r: geocode_walmart.main(WALMART_RAW, WALMART_FILE),
+              inputs=[WALMART_RAW], outputs=[WALMART_FILE], resource=GEOCODER),
+        Stage("geocode_global", lambda r: process_global_warehouses.main(GLOBAL_RAW),
+              inputs=[GLOBAL_RAW], outputs=[GLOBAL_FILES], resource=GEOCODER),
+
+        # Amazon data is loaded once and handed to the analysis stages in memory
+        Stage("load_amazon", lambda r: strategic.load_warehouses(),
+              deps=["geocode_amazon_us", "geocode_global"], inputs=amazon_inputs,
+              load=strategic.load_warehouses),
+        Stage("filter", run_filter, deps=["load_amazon"], inputs=amazon_inputs, outputs=[FILTERED_FILE]),
+        Stage("strategic", run_strategic, deps=["load_amazon"], inputs=amazon_inputs,
+              outputs=[strategic.OUTPUT_FILE]),
+        Stage("hierarchy", run_hierarchy, deps=["load_amazon"], inputs=amazon_inputs,
+              outputs=[select_hierarchical_locations.OUTPUT_CSV, select_hierarchical_locations.OUTPUT_JSON]),
+
+        # Maps
+        Stage("map_global", lambda r: map_global_warehouses.main(GLOBAL_MAP),
+              deps=["geocode_amazon_us", "geocode_global"], inputs=amazon_inputs, outputs=[GLOBAL_MAP]),
+        Stage("map_filtered", lambda r: map_filtered_warehouses.main(FILTERED_FILE, FILTERED_MAP),
+              deps=["filter"], inputs=[FILTERED_FILE], outputs=[FILTERED_MAP]),
+        Stage("map_strategic", lambda r: map_strategic_locations.render_map(),
+              deps=["strategic"], inputs=[strategic.OUTPUT_FILE], outputs=[map_strategic_locations.OUTPUT_MAP]),
+
+        # US Amazon vs Walmart overlap
+        Stage("analyze", lambda r: analyze_locations.run(argparse.Namespace(road_network=None, min_precision="city",
+                                                                             precision_weighting=False, density=False,
+                                                                             rejects=None)),
+              deps=["geocode_amazon_us", "geocode_walmart"], inputs=[US_FILE, WALMART_FILE],
+              outputs=[analyze_locations.OUTPUT_MAP]),
+    ])
+
+def main():
+    parser = argparse.ArgumentParser(prog="warehouse-analysis", description="Run the warehouse analysis pipeline")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run stages (and whatever they depend on) that are out of date")
+    run_parser.add_argument("stages", nargs="*", help="Target stages (default: all)")
+    run_parser.add_argument("--force", action="store_true", help="Rerun the target stages (all stages if none given) even if up to date")
+    run_parser.add_argument("--dry-run", action="store_true", help="Only show which stages would run")
+    run_parser.add_argument("--jobs", type=int, default=4, help="Stages run concurrently")
+    run_parser.add_argument("--seed", type=int, default=42, help="Random seed for clustering stages")
+    instrumentation.add_arguments(run_parser)
+
+    commands.add_parser("list", help="List stages with their dependencies and outputs")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        pipeline = build_pipeline(seed=42)
+        for name in pipeline.order:
+            stage = pipeline.stages[name]
+            deps = ", ".join(stage.deps) or "-"
+            outputs = ", ".join(stage.outputs) or "(in memory)"
+            print(f"{name:20s} deps: {deps:40s} outputs: {outputs}")
+        return
+
+    with instrumentation.session("warehouse_analysis", args):
+        pipeline = build_pipeline(seed=args.seed)
+        pipeline.run(args.stages or None, force=args.force, max_workers=args.jobs, dry_run=args.dry_run)
+
+if __name__ == "__main__":
+    main()
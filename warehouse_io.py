@@ -0,0 +1,211 @@
+import csv
+import itertools
+from collections import Counter
+from contextlib import contextmanager
+import numpy as np
+
+# Chunked CSV loading with coordinate validation.
+# Rows are read in fixed-size blocks; the latitude/longitude columns of a block
+# are parsed in one numpy call, range-checked, and the valid rows are yielded
+# as arrays. Rejected rows are never dropped silently: each one is counted in
+# a LoadReport with its row number and reason, and with a RejectLog every
+# rejected row is also written out as it is found.
+
+CHUNK_SIZE = 100_000
+MAX_EXAMPLES = 20
+
+# Geocoding precision written by the geocoders (archive/geocoding.py), best to worst,
+# and the weight a point gets when analyses down-weight coarse positions
+PRECISION_LEVELS = ["address", "postcode", "city"]
+PRECISION_WEIGHTS = {"address": 1.0, "postcode": 0.75, "city": 0.25}
+STACK_DECIMALS = 5
+
+class Chunk:
+    def __init__(self, lat, lon, columns, row_numbers):
+        self.lat = lat                  # float64 array
+        self.lon = lon                  # float64 array
+        self.columns = columns          # column name -> list of strings
+        self.row_numbers = row_numbers  # 1-based data row numbers (header excluded)
+
+    def __len__(self):
+        return len(self.lat)
+
+    def records(self):
+        # Row dicts with parsed coordinates, for code that works row by row
+        names = list(self.columns)
+        for i in range(len(self.lat)):
+            record = {name: self.columns[name][i] for name in names}
+            record['Latitude'] = float(self.lat[i])
+            record['Longitude'] = float(self.lon[i])
+            yield record
+
+class RejectLog:
+    # CSV of every rejected row, shared by all files of a run
+    def __init__(self, filename):
+        self.filename = filename
+        self.file = open(filename, 'w', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(['File', 'Row', 'Reason', 'Value'])
+        self.count = 0
+
+    def write(self, source, row_number, reason, value):
+        self.writer.writerow([source, row_number, reason, value])
+        self.count += 1
+
+    def close(self):
+        self.file.close()
+
+@contextmanager
+def open_rejects(filename):
+    # RejectLog for an optional --rejects FILE; None when no file was asked for
+    if filename is None:
+        yield None
+        return
+    rejects = RejectLog(filename)
+    try:
+        yield rejects
+    finally:
+        rejects.close()
+        print(f"{rejects.count} rejected rows written to {filename}")
+
+class LoadReport:
+    def __init__(self, filename, rejects=None):
+        self.filename = filename
+        self.rejects = rejects  # Optional RejectLog receiving every rejected row
+        self.accepted = 0
+        self.reasons = Counter()
+        self.examples = []  # (row number, reason, raw value) for the first MAX_EXAMPLES rejects
+
+    @property
+    def rejected(self):
+        return sum(self.reasons.values())
+
+    def reject(self, row_number, reason, value):
+        self.reasons[reason] += 1
+        if len(self.examples) < MAX_EXAMPLES:
+            self.examples.append((row_number, reason, value))
+        if self.rejects is not None:
+            self.rejects.write(self.filename, row_number, reason, value)
+
+    def summary(self):
+        if not self.rejected:
+            return f"{self.filename}: {self.accepted} rows loaded"
+        reasons = ", ".join(f"{reason} ({count})" for reason, count in self.reasons.most_common())
+        return f"{self.filename}: {self.accepted} rows loaded, {self.rejected} rejected: {reasons}"
+
+def _parse_column(values):
+    # Vectorized float parse; only falls back to per-value parsing for blocks with junk
+    stripped = np.char.strip(np.asarray(values, dtype=str))
+    parsed = np.full(len(stripped), np.nan)
+    empty = stripped == ''
+    bad = np.zeros(len(stripped), dtype=bool)
+    try:
+        parsed[~empty] = stripped[~empty].astype(np.float64)
+    except ValueError:
+        for i in np.flatnonzero(~empty):
+            try:
+                parsed[i] = float(stripped[i])
+            except ValueError:
+                bad[i] = True
+    return parsed, empty, bad
+
+def _validate(report, row_numbers, values, parsed, empty, bad, label, limit, valid):
+    # Rejects failing rows that are still valid (one reason per row) and clears them in `valid`
+    checks = [
+        (empty, f"missing {label}"),
+        (bad, f"unparseable {label}"),
+        (~empty & ~bad & ~np.isfinite(parsed), f"non-finite {label}"),
+        (np.isfinite(parsed) & (np.abs(parsed) > limit), f"{label} out of range"),
+    ]
+    for mask, reason in checks:
+        mask = mask & valid
+        for i in np.flatnonzero(mask):
+            report.reject(int(row_numbers[i]), reason, values[i])
+        valid &= ~mask
+
+def iter_chunks(filename, chunk_size=CHUNK_SIZE, lat_col='Latitude', lon_col='Longitude', report=None):
+    if report is None:
+        report = LoadReport(filename)
+    with open(filename, 'r', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        if lat_col not in header or lon_col not in header:
+            raise ValueError(f"{filename}: missing '{lat_col}'/'{lon_col}' columns")
+        lat_i = header.index(lat_col)
+        lon_i = header.index(lon_col)
+        width = len(header)
+
+        row_number = 0
+        while True:
+            block = list(itertools.islice(reader, chunk_size))
+            if not block:
+                break
+            numbers = np.arange(row_number + 1, row_number + len(block) + 1)
+            row_number += len(block)
+
+            # Short rows are rejected, then padded so every column has one value per row
+            valid = np.array([len(r) >= width for r in block])
+            if not valid.all():
+                for i in np.flatnonzero(~valid):
+                    report.reject(int(numbers[i]), "short row", ",".join(block[i]))
+                block = [r + [''] * (width - len(r)) if len(r) < width else r for r in block]
+            lat_raw = [r[lat_i] for r in block]
+            lon_raw = [r[lon_i] for r in block]
+
+            lat, lat_empty, lat_bad = _parse_column(lat_raw)
+            lon, lon_empty, lon_bad = _parse_column(lon_raw)
+            _validate(report, numbers, lat_raw, lat, lat_empty, lat_bad, "latitude", 90.0, valid)
+            _validate(report, numbers, lon_raw, lon, lon_empty, lon_bad, "longitude", 180.0, valid)
+
+            keep = np.flatnonzero(valid)
+            report.accepted += len(keep)
+            if len(keep) == 0:
+                continue
+            columns = {name: [block[i][j] for i in keep] for j, name in enumerate(header)
+                       if j not in (lat_i, lon_i)}
+            yield Chunk(lat[keep], lon[keep], columns, numbers[keep])
+
+def assign_precision(records, lat_key='Latitude', lon_key='Longitude'):
+    # Files geocoded before the Precision column existed: a coordinate shared by
+    # several facilities is almost always a city-centroid fallback
+    missing = [r for r in records if r.get('Precision') not in PRECISION_LEVELS]
+    if not missing:
+        return records
+    stacks = Counter((round(r[lat_key], STACK_DECIMALS), round(r[lon_key], STACK_DECIMALS)) for r in records)
+    for r in missing:
+        point = (round(r[lat_key], STACK_DECIMALS), round(r[lon_key], STACK_DECIMALS))
+        r['Precision'] = "city" if stacks[point] > 1 else "address"
+    return records
+
+def meets_precision(record, min_precision):
+    return PRECISION_LEVELS.index(record['Precision']) <= PRECISION_LEVELS.index(min_precision)
+
+def precision_weight(record):
+    return PRECISION_WEIGHTS[record['Precision']]
+
+def parse_weights(values, default=1.0):
+    # Blank, unparseable or negative values get `default`. Returns (weights, invalid count).
+    if len(values) == 0:
+        return np.empty(0), 0
+    parsed, empty, bad = _parse_column(values)
+    invalid = empty | bad | ~np.isfinite(parsed) | (parsed < 0)
+    parsed[invalid] = default
+    return parsed, int(invalid.sum())
+
+def read_weights(records, column, default=1.0):
+    # Per-row weights (capacity, throughput, ...) from a CSV column
+    return parse_weights([r.get(column) or '' for r in records], default)
+
+def load_records(filename, chunk_size=CHUNK_SIZE, lat_col='Latitude', lon_col='Longitude', rejects=None):
+    # All valid rows as dicts (each with a Precision) plus the LoadReport;
+    # prints a summary when rows were rejected
+    report = LoadReport(filename, rejects)
+    records = []
+    for chunk in iter_chunks(filename, chunk_size, lat_col, lon_col, report):
+        records.extend(chunk.records())
+    assign_precision(records)
+    if report.rejected:
+        print(f"  Warning: {report.summary()}")
+    return records, report
@@ -0,0 +1,10 @@
+import os
+
+# Files the warehouse_analysis.py pipeline keeps under archive/, relative to the
+# repository root. Kept apart from both the pipeline and the map code so either
+# can import them without importing the other.
+
+ARCHIVE_DIR = "archive"
+FILTERED_FILE = os.path.join(ARCHIVE_DIR, "amazon_global_filtered.csv")
+GLOBAL_MAP = os.path.join(ARCHIVE_DIR, "amazon_global_map.html")
+FILTERED_MAP = os.path.join(ARCHIVE_DIR, "amazon_global_filtered_map.html")